@@ -0,0 +1,243 @@
+"""
+Бенчмарк задержки вызовов Database
+
+Сравнивает открытие нового подключения на каждый вызов (как было раньше)
+с пулом долгоживущих подключений, запись оценок отдельными транзакциями
+с групповой фиксацией, статистику класса по ученикам с одним запросом
+к агрегатам и отчёты по всей школе построчно с колоночной аналитикой NumPy.
+Работает на временной базе.
+
+Запуск: python bench_db.py
+"""
+
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from config import ROLE_TEACHER
+from database import Database, AsyncDatabase
+from utils import analytics, statistics
+
+
+class PerCallDatabase(Database):
+    """Прежнее поведение: новое подключение на каждый вызов, настройки по умолчанию"""
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def seed(database: Database, grades_per_student: int = 200):
+    """Заполнение базы: учитель, предмет, ученик с оценками"""
+    teacher_id = 1
+    database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+    subject_id = database.add_subject('Математика', teacher_id)
+    student_id = database.add_student('Ученик', '9А')
+    today = datetime.now().strftime('%Y-%m-%d')
+    for i in range(grades_per_student):
+        database.add_grade(student_id, subject_id, i % 10 + 1, teacher_id, today)
+    return teacher_id, subject_id, student_id
+
+
+def measure(func, iterations: int) -> float:
+    """Средняя задержка одного вызова в микросекундах"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def bench_connection_pool(iterations: int = 2000):
+    print("🔌 Подключение на вызов vs пул подключений (мкс на вызов)\n")
+    print(f"{'метод':<22}{'до':>10}{'после':>10}{'ускорение':>12}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, cls in (('before', PerCallDatabase), ('after', Database)):
+            database = cls(Path(tmp) / f'{label}.db')
+            teacher_id, subject_id, student_id = seed(database)
+            today = datetime.now().strftime('%Y-%m-%d')
+            results[label] = {
+                'get_user': measure(lambda: database.get_user(teacher_id), iterations),
+                'get_student_grades': measure(lambda: database.get_student_grades(student_id), iterations),
+                'add_grade': measure(
+                    lambda: database.add_grade(student_id, subject_id, 7, teacher_id, today),
+                    iterations // 4
+                ),
+            }
+            database.close()
+
+    for method in results['before']:
+        before = results['before'][method]
+        after = results['after'][method]
+        print(f"{method:<22}{before:>10.1f}{after:>10.1f}{before / after:>11.1f}x")
+
+
+async def run_writers(async_db: AsyncDatabase, write, writers: int, grades_per_writer: int) -> float:
+    """Конкурентные писатели; возвращает число оценок в секунду"""
+    async def writer():
+        for i in range(grades_per_writer):
+            await write(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(writers)))
+    return writers * grades_per_writer / (time.perf_counter() - start)
+
+
+def bench_group_commit(writers: int = 50, grades_per_writer: int = 40):
+    print(f"\n✏️  Запись оценок: {writers} конкурентных писателей (оценок в секунду)\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'writes.db')
+        teacher_id, subject_id, student_id = seed(database, grades_per_student=0)
+        today = datetime.now().strftime('%Y-%m-%d')
+        async_db = AsyncDatabase(database)
+
+        def single(i):
+            # Отдельная транзакция на каждую оценку
+            return async_db.run(database.add_grade, student_id, subject_id, i % 10 + 1,
+                                teacher_id, today, write=True)
+
+        def batched(i):
+            return async_db.add_grade(student_id, subject_id, i % 10 + 1, teacher_id, today)
+
+        before = asyncio.run(run_writers(async_db, single, writers, grades_per_writer))
+        after = asyncio.run(run_writers(async_db, batched, writers, grades_per_writer))
+        async_db.close()
+
+    print(f"{'транзакция на оценку':<28}{before:>10.0f}")
+    print(f"{'групповая фиксация':<28}{after:>10.0f}")
+    print(f"{'ускорение':<28}{after / before:>9.1f}x")
+
+
+def seed_school(database: Database, students: int, grades_per_student: int):
+    """Школа из students учеников по grades_per_student оценок (вставка пачками)"""
+    teacher_id = 1
+    database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+    subject_ids = [database.add_subject(f'Предмет {i}', teacher_id) for i in range(10)]
+    rng = random.Random(1)
+    with database.connection() as conn:
+        conn.executemany(
+            'INSERT INTO students (full_name, class_name) VALUES (?, ?)',
+            [(f'Ученик {i}', f'{5 + i % 7}{"АБВ"[i % 3]}') for i in range(students)]
+        )
+        student_ids = [row[0] for row in conn.execute('SELECT student_id FROM students')]
+        conn.executemany(
+            'INSERT INTO grades (student_id, subject_id, grade, date, teacher_id) VALUES (?, ?, ?, ?, ?)',
+            [(student_id, rng.choice(subject_ids), rng.randint(1, 10),
+              f'2024-{rng.randint(9, 12):02d}-{rng.randint(1, 28):02d}', teacher_id)
+             for student_id in student_ids for _ in range(grades_per_student)]
+        )
+        conn.commit()
+    database.rebuild_grade_aggregates()
+
+
+def legacy_class_statistics(database: Database, class_name: str = None):
+    """Прежняя статистика класса: все ученики, затем два запроса на каждого"""
+    students = database.get_all_students()
+    if class_name:
+        students = [s for s in students if s['class_name'] == class_name]
+    rankings = []
+    for student in students:
+        grades = database.get_student_grades(student['student_id'])
+        with database.connection() as conn:
+            subjects = conn.execute('SELECT * FROM subjects ORDER BY name').fetchall()
+        subject_averages = {}
+        for subject in subjects:
+            subject_grades = [g for g in grades if g['subject_id'] == subject['subject_id']]
+            if subject_grades:
+                subject_averages[subject['name']] = statistics.calculate_average_grade(subject_grades)
+        rankings.append({
+            'student_id': student['student_id'],
+            'full_name': student['full_name'],
+            'average': statistics.calculate_average_grade(grades),
+            'total_grades': len(grades),
+        })
+    rankings.sort(key=lambda x: x['average'], reverse=True)
+    return {'total_students': len(students), 'student_rankings': rankings}
+
+
+def bench_class_statistics(students: int = 2000, grades_per_student: int = 200):
+    print(f"\n📊 Статистика школы: {students} учеников × {grades_per_student} оценок (мс на вызов)\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'stats.db')
+        seed_school(database, students, grades_per_student)
+        statistics.db, original_db = database, statistics.db
+        try:
+            start = time.perf_counter()
+            legacy = legacy_class_statistics(database)
+            before = (time.perf_counter() - start) * 1000
+            after = measure(statistics.get_class_statistics, 10) / 1000
+            assert statistics.get_class_statistics() == legacy
+        finally:
+            statistics.db = original_db
+        database.close()
+
+    print(f"{'запросы на каждого ученика':<30}{before:>10.1f}")
+    print(f"{'один запрос к агрегатам':<30}{after:>10.1f}")
+    print(f"{'ускорение':<30}{before / after:>9.1f}x")
+
+
+def legacy_grade_report(database: Database, by: str):
+    """Отчёт построчно в Python: все оценки списком, группировка словарём"""
+    key = {'subject': 'subject_id', 'teacher': 'teacher_id', 'student': 'student_id'}[by]
+    with database.connection() as conn:
+        rows = conn.execute('SELECT * FROM grades').fetchall()
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key], []).append(row['grade'])
+    return {k: (len(v), sum(v) / len(v), sorted(v)[len(v) // 2]) for k, v in groups.items()}
+
+
+def bench_analytics(students: int = 5000, grades_per_student: int = 200):
+    total = students * grades_per_student
+    print(f"\n🧮 Отчёты по школе: {total:,} оценок (мс)\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'analytics.db')
+        seed_school(database, students, grades_per_student)
+        analytics.db, original_db = database, analytics.db
+        analytics._frame = None
+        try:
+            start = time.perf_counter()
+            legacy_grade_report(database, 'subject')
+            legacy = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            analytics.get_frame()
+            load = (time.perf_counter() - start) * 1000
+            reports = {by: measure(lambda: analytics.grade_report(by), 5) / 1000 for by in analytics.GROUP_BY}
+
+            # Новая оценка: снимок дочитывает одну строку вместо полной загрузки
+            database.add_grade(1, 1, 7, 1, '2024-12-01')
+            start = time.perf_counter()
+            analytics.get_frame()
+            append = (time.perf_counter() - start) * 1000
+        finally:
+            analytics.db = original_db
+            analytics._frame = None
+        database.close()
+
+    print(f"{'построчно в Python (subject)':<34}{legacy:>10.1f}")
+    print(f"{'загрузка снимка':<34}{load:>10.1f}")
+    print(f"{'дозагрузка после add_grade':<34}{append:>10.1f}")
+    for by, elapsed in reports.items():
+        print(f"{'отчёт по ' + by:<34}{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    bench_connection_pool()
+    bench_group_commit()
+    bench_class_statistics()
+    bench_analytics()
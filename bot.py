@@ -8,8 +8,10 @@ from aiogram.types import Message
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN, ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT
-from database import db
+from database import adb
 from keyboards import get_teacher_menu, get_parent_menu, get_student_menu
+from utils.outbox import OutboxWorker
+from utils.reminders import DeadlineScheduler
 
 # Import handlers
 from handlers import teacher, parent, student
@@ -37,7 +39,9 @@ main_router = Router()
 @main_router.message(CommandStart())
 async def cmd_start(message: Message):
     """Обработка команды /start"""
-    user = db.get_user(message.from_user.id)
+    # Пользователь снова пишет боту - уведомления ему возобновляются
+    await adb.unsuppress_chat(message.from_user.id)
+    user = await adb.get_user(message.from_user.id)
     
     if user:
         # Пользователь уже зарегистрирован
@@ -58,18 +62,18 @@ async def cmd_start(message: Message):
 @main_router.message(F.text, ~F.text.startswith('/'))
 async def handle_registration(message: Message):
     """Обработка регистрации нового пользователя"""
-    user = db.get_user(message.from_user.id)
+    user = await adb.get_user(message.from_user.id)
     
     if user:
         # Пользователь уже зарегистрирован, игнорируем
         return
     
     # Проверка, первый ли это пользователь
-    is_first = db.is_first_user()
+    is_first = await adb.is_first_user()
     role = ROLE_TEACHER if is_first else ROLE_PARENT
     
     # Регистрация пользователя
-    success = db.add_user(
+    success = await adb.add_user(
         user_id=message.from_user.id,
         username=message.from_user.username,
         full_name=message.text,
@@ -98,7 +102,7 @@ async def handle_registration(message: Message):
 @main_router.message(Command("help"))
 async def cmd_help(message: Message):
     """Справка по командам"""
-    user = db.get_user(message.from_user.id)
+    user = await adb.get_user(message.from_user.id)
     
     if not user:
         await message.answer("Пожалуйста, сначала зарегистрируйтесь с помощью /start")
@@ -175,12 +179,23 @@ async def main():
     dp.include_router(parent.router)
     dp.include_router(student.router)
     
+    # Доставка уведомлений из очереди notification_outbox
+    outbox_worker = OutboxWorker(bot)
+    outbox_worker.start()
+    
+    # Напоминания о дедлайнах домашних заданий
+    deadline_scheduler = DeadlineScheduler()
+    deadline_scheduler.start()
+    
     logger.info("Bot started")
     
     try:
         await dp.start_polling(bot)
     finally:
+        await deadline_scheduler.stop()
+        await outbox_worker.stop()
         await bot.session.close()
+        adb.close()
 
 
 if __name__ == '__main__':
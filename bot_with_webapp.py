@@ -15,8 +15,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from config import BOT_TOKEN, ROLE_ADMIN, ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT
-from database import db
+from database import adb
 from keyboards import get_admin_menu, get_teacher_menu, get_parent_menu, get_student_menu
+from utils.outbox import OutboxWorker
+from utils.reminders import DeadlineScheduler
 
 # Import handlers
 from handlers import teacher, parent, student, admin
@@ -60,12 +62,14 @@ async def logging_middleware(handler, event, data):
 @main_router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext):
     """Обработка команды /start"""
-    user = db.get_user(message.from_user.id)
+    # Пользователь снова пишет боту - уведомления ему возобновляются
+    await adb.unsuppress_chat(message.from_user.id)
+    user = await adb.get_user(message.from_user.id)
     
     if user:
         # Пользователь уже зарегистрирован
         role = user['role']
-        is_admin = db.is_admin(message.from_user.id)
+        is_admin = await adb.is_admin(message.from_user.id)
         
         if is_admin:
             await message.answer(
@@ -81,15 +85,15 @@ async def cmd_start(message: Message, state: FSMContext):
             )
     else:
         # Проверяем, первый ли это пользователь
-        if db.is_first_user():
+        if await adb.is_first_user():
             # Первый пользователь становится админом
-            db.add_user(
+            await adb.add_user(
                 message.from_user.id,
                 message.from_user.username,
                 message.from_user.full_name or "Администратор",
                 ROLE_ADMIN
             )
-            db.make_admin(message.from_user.id)
+            await adb.make_admin(message.from_user.id)
             
             await message.answer(
                 "👑 <b>Система инициализирована!</b>\n\n"
@@ -112,11 +116,11 @@ async def process_invite_code(message: Message, state: FSMContext):
     """Обработка кода приглашения"""
     code = message.text.strip().upper()
     
-    invite_data = db.use_invite_code(code, message.from_user.id)
+    invite_data = await adb.use_invite_code(code, message.from_user.id)
     
     if invite_data:
         # Регистрируем пользователя
-        db.add_user(
+        await adb.add_user(
             message.from_user.id,
             message.from_user.username,
             invite_data['full_name'],
@@ -141,7 +145,7 @@ async def process_invite_code(message: Message, state: FSMContext):
 @main_router.message(Command("help"))
 async def cmd_help(message: Message):
     """Справка по командам"""
-    user = db.get_user(message.from_user.id)
+    user = await adb.get_user(message.from_user.id)
     
     if not user:
         await message.answer("Пожалуйста, сначала зарегистрируйтесь с помощью /start")
@@ -220,6 +224,14 @@ async def main():
     dp.include_router(parent.router)
     dp.include_router(student.router)
     
+    # Доставка уведомлений из очереди notification_outbox
+    outbox_worker = OutboxWorker(bot)
+    outbox_worker.start()
+    
+    # Напоминания о дедлайнах домашних заданий
+    deadline_scheduler = DeadlineScheduler()
+    deadline_scheduler.start()
+    
     # Create webapp server
     webapp_app, host, port = create_webapp_server(host='0.0.0.0', port=8080)
     
@@ -233,8 +245,11 @@ async def main():
     try:
         await dp.start_polling(bot)
     finally:
+        await deadline_scheduler.stop()
+        await outbox_worker.stop()
         await bot.session.close()
         await webapp_runner.cleanup()
+        adb.close()
 
 
 if __name__ == '__main__':
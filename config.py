@@ -12,8 +12,35 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 BASE_DIR = Path(__file__).parent
 DATABASE_PATH = BASE_DIR / 'school_bot.db'
 
+# SQLite Connection Pool
+DB_BUSY_TIMEOUT = 10.0  # Секунды ожидания разблокировки базы
+DB_JOURNAL_MODE = 'WAL'  # Читатели не блокируют писателя
+DB_SYNCHRONOUS = 'NORMAL'  # В режиме WAL безопасно и заметно быстрее FULL
+DB_CACHE_SIZE_KB = 16384  # Кеш страниц на одно подключение (16 МБ)
+DB_MMAP_SIZE = 256 * 1024 * 1024  # Отображение файла базы в память (256 МБ)
+DB_READER_THREADS = 4  # Потоки-читатели асинхронного фасада (писатель всегда один)
+
+# Group Commit
+GRADE_BATCH_MAX_ROWS = 100  # Максимум записей оценок в одной транзакции
+GRADE_BATCH_WINDOW_MS = 0  # Доп. ожидание попутных записей при простое писателя (0 - без ожидания)
+
+# In-process Caches
+USER_CACHE_SIZE = 10000  # Пользователей в кеше get_user/is_admin
+USER_CACHE_TTL = 300  # Секунды жизни записи (страховка от изменений из других процессов)
+STATS_CACHE_SIZE = 10000  # Учеников в кеше агрегатов статистики
+STATS_CACHE_TTL = 300  # Секунды жизни записи (страховка от записей из других процессов)
+LEADERBOARD_SIZE = 10  # Мест в кешируемых рейтингах учеников
+LEADERBOARD_TTL = 300  # Секунды жизни рейтинга (страховка от записей из других процессов)
+
+# Reports and Export
+REPORT_WORKERS = os.cpu_count() or 1  # Процессы генерации табелей (классы делятся между ними)
+REPORTS_DIR = BASE_DIR / 'reports'  # Папка табелей
+EXPORT_BATCH_SIZE = 5000  # Строк журнала в одной пачке выгрузки
+
 # WebApp Configuration
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'https://your-webapp-url.com')
+API_MAX_PAGE_SIZE = 200  # Максимальный limit постраничных списков REST API
+API_MAX_BATCH_SIZE = 5000  # Максимум учеников в одном запросе /api/statistics/batch
 
 # Grading System
 MIN_GRADE = 1
@@ -21,6 +48,26 @@ MAX_GRADE = 10
 
 # Notification Settings
 DEADLINE_REMINDER_DAYS = 1  # Напоминание за 1 день до дедлайна
+BROADCAST_RATE = 25  # Сообщений в секунду при рассылке (лимит Telegram - около 30)
+BROADCAST_BURST = 5  # Сообщений, которые можно отправить сразу без ожидания
+BROADCAST_CONCURRENCY = 10  # Одновременных запросов к Telegram при рассылке
+BROADCAST_MAX_RETRIES = 3  # Повторов при сетевых ошибках и RetryAfter
+
+# Notification Outbox
+OUTBOX_BATCH_SIZE = 100  # Уведомлений, захватываемых воркером за раз
+OUTBOX_POLL_INTERVAL = 1.0  # Секунд между проверками пустой очереди
+OUTBOX_LEASE = 300  # Секунд, через которые незавершённая отправка (упавший процесс) повторяется
+OUTBOX_MAX_ATTEMPTS = 5  # Попыток отправки до отказа
+OUTBOX_RETRY_DELAY = 30  # Задержка перед повтором, секунд (удваивается с каждой попыткой)
+OUTBOX_RETENTION_DAYS = 7  # Сколько дней хранить доставленные уведомления
+NOTIFY_GRADE_WINDOW = 60  # Секунд: новые оценки одному получателю за это время приходят одним сообщением
+
+# At-risk Detection
+AT_RISK_ALPHA = 0.3  # Вес новой оценки в скользящем среднем (EWMA) ученика по предмету
+AT_RISK_DROP = 2.0  # Ученик в зоне риска, когда EWMA ниже его среднего по предмету на столько баллов
+AT_RISK_RECOVERY = 1.0  # Зона риска снимается, когда отставание EWMA не больше этого значения
+AT_RISK_WINDOW_DAYS = 30  # Окно подсчёта последних оценок
+AT_RISK_MIN_GRADES = 3  # Минимум оценок в окне, чтобы сработало оповещение
 
 # Roles
 ROLE_ADMIN = 'admin'
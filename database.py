@@ -1,189 +1,278 @@
+import asyncio
+import functools
 import sqlite3
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from config import DATABASE_PATH, ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT, LINK_PENDING
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Sequence, Set, Tuple
+from migrations import migrate, fill_grade_aggregates, fill_grade_histograms
+from utils.cache import LRUCache, MISSING
+from utils.trends import advance_trend
+from config import (
+    DATABASE_PATH, ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT, LINK_PENDING,
+    DB_BUSY_TIMEOUT, DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+    DB_READER_THREADS, GRADE_BATCH_MAX_ROWS, GRADE_BATCH_WINDOW_MS,
+    USER_CACHE_SIZE, USER_CACHE_TTL, STATS_CACHE_SIZE, STATS_CACHE_TTL, EXPORT_BATCH_SIZE,
+    NOTIFY_GRADE_WINDOW
+)
 
 logger = logging.getLogger(__name__)
 
+# Ключи постраничной выдачи: столбцы сортировки, последний столбец уникален
+PAGE_KEYS = {
+    'students': ('class_name', 'full_name', 'student_id'),
+    'grades': ('date', 'grade_id'),
+    'homework': ('deadline', 'homework_id'),
+    'invites': ('created_at', 'code_id'),
+    'users': ('full_name', 'user_id'),
+}
+
+# Виды уведомлений, которые копятся у получателя окно в секундах и
+# отправляются одним сообщением (claim_notifications захватывает их вместе)
+NOTIFICATION_WINDOWS = {'new_grade': NOTIFY_GRADE_WINDOW}
+
+# Столбцы выгрузки журнала (Database.iter_grades)
+EXPORT_COLUMNS = (
+    'grade_id', 'date', 'class_name', 'student_id', 'student_name',
+    'subject_id', 'subject_name', 'grade', 'teacher_id', 'comment',
+)
+
+
+def _keyset_clause(columns: Sequence[str], after: Sequence[Any],
+                   descending: bool = False) -> Tuple[str, List[Any]]:
+    """WHERE-условие «строго после ключа after» для сортировки по columns
+
+    Без NULL в ключе используется сравнение кортежей, которое SQLite
+    обслуживает индексом. NULL в SQLite стоит первым при ASC и последним
+    при DESC, поэтому ключ с NULL раскрывается в явные условия.
+    """
+    after = list(after)
+    if len(after) != len(columns):
+        raise ValueError(f"Page key must have {len(columns)} values")
+
+    if None not in after:
+        op = '<' if descending else '>'
+        return f"({', '.join(columns)}) {op} ({', '.join('?' * len(columns))})", after
+
+    terms, params = [], []
+    for i, (column, value) in enumerate(zip(columns, after)):
+        if value is None:
+            # При DESC после NULL по этому столбцу ничего нет
+            if descending:
+                continue
+            condition, condition_params = f'{column} IS NOT NULL', []
+        elif descending:
+            condition, condition_params = f'({column} < ? OR {column} IS NULL)', [value]
+        else:
+            condition, condition_params = f'{column} > ?', [value]
+        prefix = [f'{c} IS ?' for c in columns[:i]]
+        terms.append('(' + ' AND '.join(prefix + [condition]) + ')')
+        params.extend(after[:i] + condition_params)
+    return '(' + (' OR '.join(terms) or '0') + ')', params
+
 
 class Database:
-    def __init__(self, db_path: Path = DATABASE_PATH):
+    def __init__(self, db_path: Path = DATABASE_PATH, read_only: bool = False, lazy: bool = False):
         self.db_path = db_path
-        self.init_db()
+        # Только чтение (например, в процессах генерации отчётов): схема не
+        # мигрируется, подключения открываются с mode=ro
+        self.read_only = read_only
+        # Версия схемы после миграции; None - база ещё не открывалась.
+        # lazy откладывает открытие и миграцию до первого подключения
+        self._schema_lock = threading.Lock()
+        self._schema_version: Optional[int] = None
+        # Пул подключений: одно долгоживущее подключение на поток
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._pool: List[sqlite3.Connection] = []
+        # Кеш get_user/is_admin; сбрасывается методами, изменяющими пользователя
+        self._user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        # Кеш get_grade_aggregates (основа статистики ученика); запись сбрасывается
+        # изменением оценок ученика, весь кеш - удалением предмета
+        self._stats_cache = LRUCache(STATS_CACHE_SIZE, STATS_CACHE_TTL)
+        # Справочник предметов, классов и назначений; перестраивается лениво,
+        # когда catalog_version расходится с версией собранного справочника
+        self._catalog_lock = threading.Lock()
+        self._catalog: Optional[Dict[str, Any]] = None
+        self.catalog_version = 0
+        # Счётчики зафиксированных записей в grades (для кешей аналитики):
+        # grades_version растёт при любой записи, grades_rewrites - только при
+        # изменении или удалении уже существующих оценок
+        self._grades_lock = threading.Lock()
+        self.grades_version = 0
+        self.grades_rewrites = 0
+        # Подписчики на изменения оценок и состава классов (кеши рейтингов и статистики)
+        self._grade_listeners: List[Callable[[Dict[str, Set[Any]]], None]] = []
+        # Получатели, заблокировавшие бота или удалившие аккаунт (копия
+        # notification_suppressions); загружается при первом обращении
+        self._suppressed_lock = threading.Lock()
+        self._suppressed: Optional[Set[int]] = None
+        # Подписчики на новые домашние задания (планировщик напоминаний)
+        self._homework_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        if not lazy:
+            self.init_db()
 
-    def get_connection(self):
-        """Создает подключение к базе данных"""
-        # check_same_thread=False нужен, так как мы используем asyncio.to_thread
-        # timeout=10 увеличивает время ожидания разблокировки базы
-        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10.0)
+    def open_connection(self) -> sqlite3.Connection:
+        """Открывает новое подключение с настройками из config.py"""
+        # check_same_thread=False нужен, чтобы close() мог закрыть подключения других потоков
+        # timeout увеличивает время ожидания разблокировки базы
+        if self.read_only:
+            conn = sqlite3.connect(f'{Path(self.db_path).resolve().as_uri()}?mode=ro', uri=True,
+                                   check_same_thread=False, timeout=DB_BUSY_TIMEOUT)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=DB_BUSY_TIMEOUT)
+            conn.execute(f'PRAGMA journal_mode = {DB_JOURNAL_MODE}')
         conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA synchronous = {DB_SYNCHRONOUS}')
+        # Отрицательное значение cache_size задаётся в килобайтах
+        conn.execute(f'PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}')
         return conn
 
-    def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
+    def get_connection(self) -> sqlite3.Connection:
+        """Возвращает подключение текущего потока (открывается один раз)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.open_connection()
+            self._local.conn = conn
+            with self._pool_lock:
+                self._pool.append(conn)
+        if self._schema_version is None and not self.read_only:
+            self._migrate(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Подключение из пула; незавершённая транзакция откатывается при выходе"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
 
-        # Таблица пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                full_name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def close(self):
+        """Закрытие всех подключений пула"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+        self._local = threading.local()
 
-        # Таблица учеников
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS students (
-                student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                full_name TEXT NOT NULL,
-                class_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        ''')
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счётчики внутренних кешей для метрик"""
+        return {
+            'user_cache': self._user_cache.stats(),
+            'stats_cache': self._stats_cache.stats(),
+            'catalog': {'version': self.catalog_version, 'built': self._catalog is not None},
+            'suppressed_chats': {'size': len(self._suppressed) if self._suppressed is not None else None},
+        }
 
-        # Таблица связей родитель-ученик
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parent_student_links (
-                link_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                parent_id INTEGER NOT NULL,
-                student_id INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                approved_at TIMESTAMP,
-                approved_by INTEGER,
-                FOREIGN KEY (parent_id) REFERENCES users(user_id),
-                FOREIGN KEY (student_id) REFERENCES students(student_id),
-                FOREIGN KEY (approved_by) REFERENCES users(user_id)
-            )
-        ''')
+    def init_db(self):
+        """Приведение схемы базы данных к актуальной версии"""
+        if self.read_only:
+            return
+        with self.connection() as conn:
+            self._migrate(conn)
 
-        # Таблица предметов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS subjects (
-                subject_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                teacher_id INTEGER NOT NULL,
-                max_grade INTEGER DEFAULT 10,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (teacher_id) REFERENCES users(user_id)
-            )
-        ''')
+    def _migrate(self, conn: sqlite3.Connection):
+        """Миграция схемы один раз на экземпляр"""
+        with self._schema_lock:
+            if self._schema_version is not None:
+                return
+            self._schema_version = migrate(conn)
+        logger.info(f"Database initialized successfully (schema version {self._schema_version})")
 
-        # Таблица оценок
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS grades (
-                grade_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                subject_id INTEGER NOT NULL,
-                grade INTEGER NOT NULL,
-                date DATE NOT NULL,
-                comment TEXT,
-                teacher_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_id) REFERENCES students(student_id),
-                FOREIGN KEY (subject_id) REFERENCES subjects(subject_id),
-                FOREIGN KEY (teacher_id) REFERENCES users(user_id)
-            )
-        ''')
+    # ============ CATALOG ============
 
-        # Таблица домашних заданий
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS homework (
-                homework_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                subject_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                file_id TEXT,
-                deadline TIMESTAMP,
-                created_by INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (subject_id) REFERENCES subjects(subject_id),
-                FOREIGN KEY (created_by) REFERENCES users(user_id)
-            )
-        ''')
+    def _invalidate_catalog(self):
+        """Сброс справочника после изменения предметов, классов или назначений"""
+        with self._catalog_lock:
+            self.catalog_version += 1
+            self._catalog = None
 
-        # === НОВЫЕ ТАБЛИЦЫ ДЛЯ ПОЛНОЦЕННОЙ ШКОЛЫ ===
-        
-        # Таблица классов (9А, 10Б и т.д.)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS classes (
-                class_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица назначений учителей (кто какой предмет в каком классе ведет)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS teaching_assignments (
-                assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                teacher_id INTEGER NOT NULL,
-                class_id INTEGER NOT NULL,
-                subject_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(teacher_id, class_id, subject_id),
-                FOREIGN KEY (teacher_id) REFERENCES users(user_id),
-                FOREIGN KEY (class_id) REFERENCES classes(class_id),
-                FOREIGN KEY (subject_id) REFERENCES subjects(subject_id)
-            )
-        ''')
-        
-        # Таблица пригласительных кодов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS invite_codes (
-                code_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT NOT NULL UNIQUE,
-                role TEXT NOT NULL,
-                full_name TEXT NOT NULL,
-                target_data TEXT,
-                is_used BOOLEAN DEFAULT 0,
-                used_by INTEGER,
-                created_by INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                used_at TIMESTAMP,
-                FOREIGN KEY (used_by) REFERENCES users(user_id),
-                FOREIGN KEY (created_by) REFERENCES users(user_id)
-            )
-        ''')
-        
-        # Добавляем колонку target_data если её нет
-        try:
-            cursor.execute('ALTER TABLE invite_codes ADD COLUMN target_data TEXT')
-        except:
-            pass  # Колонка уже существует
-        
-        # Добавляем колонку is_admin в таблицу users (если еще нет)
-        try:
-            cursor.execute('ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT 0')
-        except:
-            pass  # Колонка уже существует
+    def _get_catalog(self) -> Dict[str, Any]:
+        """Справочник: словари предметов, классов и назначений по id"""
+        catalog = self._catalog
+        if catalog is not None and catalog['version'] == self.catalog_version:
+            return catalog
 
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully")
+        with self._catalog_lock:
+            version = self.catalog_version
+            if self._catalog is not None and self._catalog['version'] == version:
+                return self._catalog
+            with self.connection() as conn:
+                # Все три таблицы читаются из одного снимка базы
+                conn.execute('BEGIN')
+                subjects = conn.execute('SELECT * FROM subjects ORDER BY name').fetchall()
+                classes = conn.execute('SELECT * FROM classes ORDER BY name').fetchall()
+                assignments = conn.execute('SELECT * FROM teaching_assignments').fetchall()
+                conn.rollback()
+            catalog = {
+                'version': version,
+                'subjects': {row['subject_id']: dict(row) for row in subjects},
+                'classes': {row['class_id']: dict(row) for row in classes},
+                'assignments': {row['assignment_id']: dict(row) for row in assignments},
+            }
+            self._catalog = catalog
+        return catalog
+
+    def _grades_changed(self, rewrite: bool = False, touched: Iterable[Tuple[int, int]] = (),
+                        students: Iterable[int] = (), at_risk: Iterable[Dict[str, Any]] = ()):
+        """Отметка о зафиксированной записи в grades (rewrite - не только вставки)
+
+        touched - пары (student_id, subject_id) изменённых оценок, students -
+        ученики, изменённые целиком (например, удалённые), at_risk - оповещения
+        о входе в зону риска; передаются подписчикам.
+        """
+        with self._grades_lock:
+            self.grades_version += 1
+            if rewrite:
+                self.grades_rewrites += 1
+        touched = list(touched)
+        students = {s for s, _ in touched} | set(students)
+        for student_id in students:
+            self._stats_cache.invalidate(student_id)
+        self._notify_grade_listeners(students=students, subjects={s for _, s in touched}, at_risk=at_risk)
+
+    def add_grades_listener(self, listener: Callable[[Dict[str, Set[Any]]], None]):
+        """Подписка на зафиксированные изменения оценок и состава классов
+
+        listener получает {'students': set, 'subjects': set, 'classes': set,
+        'at_risk': list} - id учеников и предметов с изменившимися оценками,
+        классы, в которые добавлены ученики, и оповещения о зоне риска
+        ({'student_id', 'subject_id', 'ewma', 'average', 'grade'}).
+        Вызывается в потоке, выполнившем запись.
+        """
+        self._grade_listeners.append(listener)
+
+    def _notify_grade_listeners(self, students: Iterable[int] = (), subjects: Iterable[int] = (),
+                                classes: Iterable[str] = (), at_risk: Iterable[Dict[str, Any]] = ()):
+        change = {'students': set(students), 'subjects': set(subjects), 'classes': set(classes),
+                  'at_risk': list(at_risk)}
+        for listener in self._grade_listeners:
+            try:
+                listener(change)
+            except Exception as e:
+                logger.error(f"Error in grades listener: {e}")
 
     # ============ USER METHODS ============
     
     def add_user(self, user_id: int, username: Optional[str], full_name: str, role: str) -> bool:
         """Добавление нового пользователя"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, ?)',
-                (user_id, username, full_name, role)
-            )
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, ?)',
+                    (user_id, username, full_name, role)
+                )
+                conn.commit()
+            self._user_cache.invalidate(user_id)
             logger.info(f"User {user_id} added with role {role}")
             return True
         except sqlite3.IntegrityError:
@@ -191,31 +280,36 @@ class Database:
             return False
 
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Получение информации о пользователе"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
-        return dict(row) if row else None
+        """Получение информации о пользователе (через кеш пользователей)"""
+        user = self._user_cache.get(user_id)
+        if user is MISSING:
+            generation = self._user_cache.generation
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+                row = cursor.fetchone()
+            user = dict(row) if row else None
+            # Незарегистрированные пользователи тоже кешируются (как None)
+            self._user_cache.set(user_id, user, generation)
+        # Копия, чтобы вызывающий код не изменил закешированный словарь
+        return dict(user) if user else None
 
     def is_first_user(self) -> bool:
         """Проверка, является ли это первым пользователем"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) as count FROM users')
-        count = cursor.fetchone()['count']
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) as count FROM users')
+            count = cursor.fetchone()['count']
         return count == 0
 
     def update_user_role(self, user_id: int, role: str) -> bool:
         """Обновление роли пользователя"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('UPDATE users SET role = ? WHERE user_id = ?', (role, user_id))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE users SET role = ? WHERE user_id = ?', (role, user_id))
+                conn.commit()
+            self._user_cache.invalidate(user_id)
             return True
         except Exception as e:
             logger.error(f"Error updating user role: {e}")
@@ -226,15 +320,15 @@ class Database:
     def add_student(self, full_name: str, class_name: str, user_id: Optional[int] = None) -> Optional[int]:
         """Добавление ученика"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO students (user_id, full_name, class_name) VALUES (?, ?, ?)',
-                (user_id, full_name, class_name)
-            )
-            student_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO students (user_id, full_name, class_name) VALUES (?, ?, ?)',
+                    (user_id, full_name, class_name)
+                )
+                student_id = cursor.lastrowid
+                conn.commit()
+            self._notify_grade_listeners(students=[student_id], classes=[class_name] if class_name else [])
             logger.info(f"Student {full_name} added with ID {student_id}")
             return student_id
         except Exception as e:
@@ -243,29 +337,35 @@ class Database:
 
     def get_student(self, student_id: int) -> Optional[Dict[str, Any]]:
         """Получение информации об ученике"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM students WHERE student_id = ?', (student_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM students WHERE student_id = ?', (student_id,))
+            row = cursor.fetchone()
         return dict(row) if row else None
 
-    def get_all_students(self) -> List[Dict[str, Any]]:
-        """Получение списка всех учеников"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM students ORDER BY class_name, full_name')
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_students(self, limit: Optional[int] = None,
+                         after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Получение списка учеников (постранично: limit и ключ after из PAGE_KEYS)"""
+        query, params = 'SELECT * FROM students', []
+        if after:
+            condition, params = _keyset_clause(PAGE_KEYS['students'], after)
+            query += f' WHERE {condition}'
+        query += ' ORDER BY class_name, full_name, student_id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
     def get_student_by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получение ученика по user_id"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM students WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM students WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
         return dict(row) if row else None
 
     # ============ PARENT-STUDENT LINK METHODS ============
@@ -273,15 +373,14 @@ class Database:
     def create_link_request(self, parent_id: int, student_id: int) -> Optional[int]:
         """Создание запроса на связь родитель-ученик"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO parent_student_links (parent_id, student_id, status) VALUES (?, ?, ?)',
-                (parent_id, student_id, LINK_PENDING)
-            )
-            link_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO parent_student_links (parent_id, student_id, status) VALUES (?, ?, ?)',
+                    (parent_id, student_id, LINK_PENDING)
+                )
+                link_id = cursor.lastrowid
+                conn.commit()
             logger.info(f"Link request created: parent {parent_id} -> student {student_id}")
             return link_id
         except Exception as e:
@@ -290,31 +389,29 @@ class Database:
 
     def get_pending_links(self) -> List[Dict[str, Any]]:
         """Получение всех pending запросов на связь"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT l.*, u.full_name as parent_name, s.full_name as student_name
-            FROM parent_student_links l
-            JOIN users u ON l.parent_id = u.user_id
-            JOIN students s ON l.student_id = s.student_id
-            WHERE l.status = 'pending'
-            ORDER BY l.requested_at DESC
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT l.*, u.full_name as parent_name, s.full_name as student_name
+                FROM parent_student_links l
+                JOIN users u ON l.parent_id = u.user_id
+                JOIN students s ON l.student_id = s.student_id
+                WHERE l.status = 'pending'
+                ORDER BY l.requested_at DESC
+            ''')
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
     def approve_link(self, link_id: int, teacher_id: int) -> bool:
         """Одобрение связи родитель-ученик"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE parent_student_links SET status = ?, approved_at = ?, approved_by = ? WHERE link_id = ?',
-                ('approved', datetime.now(), teacher_id, link_id)
-            )
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'UPDATE parent_student_links SET status = ?, approved_at = ?, approved_by = ? WHERE link_id = ?',
+                    ('approved', datetime.now(), teacher_id, link_id)
+                )
+                conn.commit()
             logger.info(f"Link {link_id} approved by teacher {teacher_id}")
             return True
         except Exception as e:
@@ -324,54 +421,114 @@ class Database:
     def reject_link(self, link_id: int, teacher_id: int) -> bool:
         """Отклонение связи родитель-ученик"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE parent_student_links SET status = ?, approved_by = ? WHERE link_id = ?',
-                ('rejected', teacher_id, link_id)
-            )
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'UPDATE parent_student_links SET status = ?, approved_by = ? WHERE link_id = ?',
+                    ('rejected', teacher_id, link_id)
+                )
+                conn.commit()
             logger.info(f"Link {link_id} rejected by teacher {teacher_id}")
             return True
         except Exception as e:
             logger.error(f"Error rejecting link: {e}")
             return False
 
+    def get_student_parents(self, student_id: int) -> List[Dict[str, Any]]:
+        """Получение родителей ученика (только approved)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*
+                FROM parent_student_links l
+                JOIN users u ON u.user_id = l.parent_id
+                WHERE l.student_id = ? AND l.status = 'approved'
+                ORDER BY u.full_name
+            ''', (student_id,))
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
     def get_parent_students(self, parent_id: int) -> List[Dict[str, Any]]:
         """Получение учеников родителя (только approved)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.*
-            FROM students s
-            JOIN parent_student_links l ON s.student_id = l.student_id
-            WHERE l.parent_id = ? AND l.status = 'approved'
-        ''', (parent_id,))
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.*
+                FROM students s
+                JOIN parent_student_links l ON s.student_id = l.student_id
+                WHERE l.parent_id = ? AND l.status = 'approved'
+            ''', (parent_id,))
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+    def get_notification_recipients(self, subject_id: Optional[int] = None,
+                                    class_name: Optional[str] = None) -> List[int]:
+        """Telegram id учеников и их родителей (approved) без повторов
+
+        Аудитория: классы, в которых ведётся предмет subject_id (по
+        teaching_assignments), один класс class_name или вся школа. Если у
+        предмета нет назначений, уведомляется вся школа.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            query, params = self._recipients_query(cursor, subject_id, class_name)
+            cursor.execute(query, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _recipients_query(self, cursor: sqlite3.Cursor, subject_id: Optional[int] = None,
+                          class_name: Optional[str] = None) -> Tuple[str, tuple]:
+        """Запрос получателей get_notification_recipients (столбец chat_id)"""
+        if subject_id is not None and cursor.execute(
+            'SELECT 1 FROM teaching_assignments WHERE subject_id = ? LIMIT 1', (subject_id,)
+        ).fetchone() is None:
+            subject_id = None
+
+        if subject_id is not None:
+            audience = '''
+                SELECT student_id, user_id FROM students
+                WHERE class_name IN (
+                    SELECT c.name FROM teaching_assignments ta
+                    JOIN classes c ON c.class_id = ta.class_id
+                    WHERE ta.subject_id = ?
+                )
+            '''
+            params = (subject_id,)
+        elif class_name is not None:
+            audience = 'SELECT student_id, user_id FROM students WHERE class_name = ?'
+            params = (class_name,)
+        else:
+            audience = 'SELECT student_id, user_id FROM students'
+            params = ()
+
+        return f'''
+            WITH audience AS ({audience})
+            SELECT user_id AS chat_id FROM audience WHERE user_id IS NOT NULL
+            UNION
+            SELECT l.parent_id
+            FROM audience a
+            JOIN parent_student_links l ON l.student_id = a.student_id
+            WHERE l.status = 'approved'
+        ''', params
+
     # ============ SUBJECT METHODS ============
     
     def add_subject(self, name: str, teacher_id: int, max_grade: int = 10) -> Optional[int]:
         """Добавление предмета (с проверкой на дубликат)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            # Проверка на дубликат
-            cursor.execute('SELECT subject_id FROM subjects WHERE LOWER(name) = LOWER(?)', (name,))
-            if cursor.fetchone():
-                conn.close()
-                logger.warning(f"Subject '{name}' already exists")
-                return None
-            cursor.execute(
-                'INSERT INTO subjects (name, teacher_id, max_grade) VALUES (?, ?, ?)',
-                (name, teacher_id, max_grade)
-            )
-            subject_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Проверка на дубликат
+                cursor.execute('SELECT subject_id FROM subjects WHERE LOWER(name) = LOWER(?)', (name,))
+                if cursor.fetchone():
+                    logger.warning(f"Subject '{name}' already exists")
+                    return None
+                cursor.execute(
+                    'INSERT INTO subjects (name, teacher_id, max_grade) VALUES (?, ?, ?)',
+                    (name, teacher_id, max_grade)
+                )
+                subject_id = cursor.lastrowid
+                conn.commit()
+            self._invalidate_catalog()
             logger.info(f"Subject {name} added with ID {subject_id}, max_grade={max_grade}")
             return subject_id
         except Exception as e:
@@ -380,24 +537,27 @@ class Database:
 
     def get_all_subjects(self, teacher_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Получение всех предметов (опционально фильтр по учителю)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        if teacher_id:
-            cursor.execute('SELECT * FROM subjects WHERE teacher_id = ? ORDER BY name', (teacher_id,))
-        else:
-            cursor.execute('SELECT * FROM subjects ORDER BY name')
-        rows = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+        subjects = self._get_catalog()['subjects'].values()
+        return [
+            dict(subject) for subject in subjects
+            if not teacher_id or subject['teacher_id'] == teacher_id
+        ]
+
+    def get_subject(self, subject_id: int) -> Optional[Dict[str, Any]]:
+        """Получение предмета по ID из справочника"""
+        subject = self._get_catalog()['subjects'].get(subject_id)
+        return dict(subject) if subject else None
 
     def delete_subject(self, subject_id: int) -> bool:
         """Удаление предмета"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM subjects WHERE subject_id = ?', (subject_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM subjects WHERE subject_id = ?', (subject_id,))
+                conn.commit()
+            self._invalidate_catalog()
+            # Статистика учеников содержит названия предметов
+            self._stats_cache.clear()
             return True
         except Exception as e:
             logger.error(f"Error deleting subject: {e}")
@@ -407,146 +567,818 @@ class Database:
     
     def add_grade(self, student_id: int, subject_id: int, grade: int, 
                   teacher_id: int, date: str, comment: Optional[str] = None) -> Optional[int]:
-        """Добавление оценки"""
+        """Добавление оценки (уведомление ученику и родителям ставится в очередь той же транзакцией)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO grades (student_id, subject_id, grade, date, comment, teacher_id) VALUES (?, ?, ?, ?, ?, ?)',
-                (student_id, subject_id, grade, date, comment, teacher_id)
-            )
-            grade_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            alerts = []
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                grade_id = self._insert_grade(cursor, student_id, subject_id, grade, teacher_id, date, comment, alerts)
+                conn.commit()
+            self._grades_changed(touched=[(student_id, subject_id)], at_risk=alerts)
             logger.info(f"Grade {grade} added for student {student_id}")
             return grade_id
         except Exception as e:
             logger.error(f"Error adding grade: {e}")
             return None
 
-    def get_student_grades(self, student_id: int) -> List[Dict[str, Any]]:
-        """Получение всех оценок ученика"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+    def get_student_grades(self, student_id: int, limit: Optional[int] = None,
+                           after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Получение оценок ученика, новые первыми (постранично: limit и after)"""
+        conditions, params = ['g.student_id = ?'], [student_id]
+        if after:
+            condition, after_params = _keyset_clause(
+                [f'g.{column}' for column in PAGE_KEYS['grades']], after, descending=True
+            )
+            conditions.append(condition)
+            params.extend(after_params)
+        query = f'''
             SELECT g.*, s.name as subject_name
             FROM grades g
             JOIN subjects s ON g.subject_id = s.subject_id
-            WHERE g.student_id = ?
-            ORDER BY g.date DESC
-        ''', (student_id,))
-        rows = cursor.fetchall()
-        conn.close()
+            WHERE {' AND '.join(conditions)}
+            ORDER BY g.date DESC, g.grade_id DESC
+        '''
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
     def get_grades_by_subject(self, student_id: int, subject_id: int) -> List[Dict[str, Any]]:
         """Получение оценок ученика по предмету"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM grades
-            WHERE student_id = ? AND subject_id = ?
-            ORDER BY date DESC
-        ''', (student_id, subject_id))
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM grades
+                WHERE student_id = ? AND subject_id = ?
+                ORDER BY date DESC
+            ''', (student_id, subject_id))
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
     def update_grade(self, grade_id: int, grade: int, comment: Optional[str] = None) -> bool:
         """Обновление оценки"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE grades SET grade = ?, comment = ? WHERE grade_id = ?',
-                (grade, comment, grade_id)
-            )
-            conn.commit()
-            conn.close()
+            touched = set()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                self._update_grade(cursor, grade_id, grade, comment, touched)
+                conn.commit()
+            self._grades_changed(rewrite=True, touched=touched)
             logger.info(f"Grade {grade_id} updated to {grade}")
             return True
         except Exception as e:
             logger.error(f"Error updating grade: {e}")
             return False
 
+    def apply_grade_writes(self, operations: List[Dict[str, Any]]) -> List[Any]:
+        """Пакетная запись оценок одной транзакцией (групповая фиксация)
+
+        Каждая операция - словарь {'op': 'add' | 'update', 'args': {...}} с
+        аргументами add_grade или update_grade. Результаты возвращаются в том
+        же порядке: grade_id или None для 'add', True или False для 'update'.
+        Если какая-то операция падает, пакет повторяется с точкой сохранения
+        на каждую операцию, чтобы ошибка одной не отменяла остальные.
+        """
+        touched, alerts = set(), []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                results = [self._apply_grade_write(cursor, operation, touched, alerts) for operation in operations]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                touched.clear()
+                alerts.clear()
+                results = self._apply_grade_writes_isolated(conn, operations, touched, alerts)
+        self._grades_changed(rewrite=any(operation['op'] == 'update' for operation in operations),
+                             touched=touched, at_risk=alerts)
+        logger.info(f"Committed batch of {len(operations)} grade writes")
+        return results
+
+    def _apply_grade_writes_isolated(self, conn: sqlite3.Connection, operations: List[Dict[str, Any]],
+                                     touched: Set[Tuple[int, int]], alerts: List[Dict[str, Any]]) -> List[Any]:
+        """Пакет с точкой сохранения на каждую операцию"""
+        results = []
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        for operation in operations:
+            cursor.execute('SAVEPOINT grade_write')
+            alerts_before = len(alerts)
+            try:
+                result = self._apply_grade_write(cursor, operation, touched, alerts)
+                cursor.execute('RELEASE grade_write')
+            except Exception as e:
+                cursor.execute('ROLLBACK TO grade_write')
+                cursor.execute('RELEASE grade_write')
+                # Оповещение откатанной операции не отправляется
+                del alerts[alerts_before:]
+                logger.error(f"Error in batched grade {operation['op']}: {e}")
+                result = None if operation['op'] == 'add' else False
+            results.append(result)
+        conn.commit()
+        return results
+
+    def _apply_grade_write(self, cursor: sqlite3.Cursor, operation: Dict[str, Any],
+                           touched: Set[Tuple[int, int]], alerts: List[Dict[str, Any]]) -> Any:
+        args = operation['args']
+        if operation['op'] == 'add':
+            grade_id = self._insert_grade(cursor, alerts=alerts, **args)
+            touched.add((args['student_id'], args['subject_id']))
+            return grade_id
+        return self._update_grade(cursor, touched=touched, **args)
+
+    def _insert_grade(self, cursor: sqlite3.Cursor, student_id: int, subject_id: int, grade: int,
+                      teacher_id: int, date: str, comment: Optional[str] = None,
+                      alerts: Optional[List[Dict[str, Any]]] = None) -> int:
+        """Вставка оценки и обновление её агрегата, гистограмм и тренда в текущей транзакции
+
+        Оповещение о входе ученика в зону риска добавляется в alerts.
+        """
+        cursor.execute(
+            'INSERT INTO grades (student_id, subject_id, grade, date, comment, teacher_id) VALUES (?, ?, ?, ?, ?, ?)',
+            (student_id, subject_id, grade, date, comment, teacher_id)
+        )
+        grade_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO grade_aggregates
+                (student_id, subject_id, grade_sum, grade_count, min_grade, max_grade,
+                 last_grade, last_date, last_grade_id)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT (student_id, subject_id) DO UPDATE SET
+                grade_sum = grade_sum + excluded.grade_sum,
+                grade_count = grade_count + 1,
+                min_grade = MIN(min_grade, excluded.min_grade),
+                max_grade = MAX(max_grade, excluded.max_grade),
+                last_grade = IIF(excluded.last_date >= last_date, excluded.last_grade, last_grade),
+                last_grade_id = IIF(excluded.last_date >= last_date, excluded.last_grade_id, last_grade_id),
+                last_date = MAX(last_date, excluded.last_date)
+        ''', (student_id, subject_id, grade, grade, grade, grade, date, grade_id))
+        self._count_grade(cursor, student_id, subject_id, grade, 1)
+        alert = self._advance_grade_trend(cursor, student_id, subject_id, grade, date)
+        if alert and alerts is not None:
+            alerts.append(alert)
+        self._enqueue_grade_notification(cursor, grade_id, student_id, subject_id, grade, date, comment)
+        return grade_id
+
+    def _enqueue_grade_notification(self, cursor: sqlite3.Cursor, grade_id: int, student_id: int,
+                                    subject_id: int, grade: int, date: str, comment: Optional[str]):
+        """Уведомление о новой оценке ученику и его родителям в очередь отправки"""
+        row = cursor.execute('''
+            SELECT st.full_name, sub.name FROM students st, subjects sub
+            WHERE st.student_id = ? AND sub.subject_id = ?
+        ''', (student_id, subject_id)).fetchone()
+        if not row:
+            return
+        payload = {'grade_id': grade_id, 'student_id': student_id, 'student_name': row[0],
+                   'subject_name': row[1], 'grade': grade, 'date': date, 'comment': comment}
+        self._enqueue_notifications(cursor, 'new_grade', payload, '''
+            SELECT user_id AS chat_id FROM students WHERE student_id = ? AND user_id IS NOT NULL
+            UNION
+            SELECT parent_id FROM parent_student_links WHERE student_id = ? AND status = 'approved'
+        ''', (student_id, student_id))
+
+    def _enqueue_notifications(self, cursor: sqlite3.Cursor, kind: str, payload: Dict[str, Any],
+                               recipients: str, params: Sequence[Any]):
+        """Строки notification_outbox для получателей из запроса recipients (столбец chat_id)
+
+        Недоступные получатели (notification_suppressions) пропускаются.
+        """
+        cursor.execute(f'''
+            INSERT INTO notification_outbox (chat_id, kind, payload, available_at)
+            SELECT chat_id, ?, ?, datetime('now', ?) FROM ({recipients})
+            WHERE chat_id NOT IN (SELECT chat_id FROM notification_suppressions)
+        ''', (kind, json.dumps(payload, ensure_ascii=False), f'+{NOTIFICATION_WINDOWS.get(kind, 0)} seconds', *params))
+
+    def _advance_grade_trend(self, cursor: sqlite3.Cursor, student_id: int, subject_id: int,
+                             grade: int, date: str) -> Optional[Dict[str, Any]]:
+        """Обновление скользящего состояния (ученик, предмет)
+
+        Если ученик вошёл в зону риска, оповещение родителям и учителю
+        предмета ставится в очередь той же транзакцией и возвращается.
+        """
+        row = cursor.execute(
+            'SELECT ewma, window_days, at_risk FROM grade_trends WHERE student_id = ? AND subject_id = ?',
+            (student_id, subject_id)
+        ).fetchone()
+        aggregate = cursor.execute(
+            'SELECT grade_sum, grade_count FROM grade_aggregates WHERE student_id = ? AND subject_id = ?',
+            (student_id, subject_id)
+        ).fetchone()
+        average = aggregate['grade_sum'] / aggregate['grade_count']
+        state = dict(row, window_days=json.loads(row['window_days'])) if row else None
+        state, entered = advance_trend(state, grade, date, average)
+        cursor.execute('''
+            INSERT OR REPLACE INTO grade_trends (student_id, subject_id, ewma, window_days, window_count, at_risk)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (student_id, subject_id, state['ewma'], json.dumps(state['window_days']),
+              sum(state['window_days'].values()), state['at_risk']))
+        if not entered:
+            return None
+        alert = {'student_id': student_id, 'subject_id': subject_id, 'ewma': round(state['ewma'], 2),
+                 'average': round(average, 2), 'grade': grade}
+        self._enqueue_at_risk_notification(cursor, alert)
+        return alert
+
+    def _enqueue_at_risk_notification(self, cursor: sqlite3.Cursor, alert: Dict[str, Any]):
+        """Оповещение о зоне риска родителям ученика и учителю предмета в очередь отправки"""
+        row = cursor.execute('''
+            SELECT st.full_name, sub.name FROM students st, subjects sub
+            WHERE st.student_id = ? AND sub.subject_id = ?
+        ''', (alert['student_id'], alert['subject_id'])).fetchone()
+        if not row:
+            return
+        payload = dict(alert, student_name=row[0], subject_name=row[1])
+        self._enqueue_notifications(cursor, 'at_risk', payload, '''
+            SELECT parent_id AS chat_id FROM parent_student_links WHERE student_id = ? AND status = 'approved'
+            UNION
+            SELECT teacher_id FROM subjects WHERE subject_id = ? AND teacher_id IS NOT NULL
+        ''', (alert['student_id'], alert['subject_id']))
+
+    def _update_grade(self, cursor: sqlite3.Cursor, grade_id: int, grade: int,
+                      comment: Optional[str] = None, touched: Optional[Set[Tuple[int, int]]] = None) -> bool:
+        """Обновление оценки, пересчёт её агрегата и гистограмм в текущей транзакции"""
+        row = cursor.execute(
+            'SELECT student_id, subject_id, grade FROM grades WHERE grade_id = ?', (grade_id,)
+        ).fetchone()
+        if not row:
+            return True
+        cursor.execute('UPDATE grades SET grade = ?, comment = ? WHERE grade_id = ?', (grade, comment, grade_id))
+        self._refresh_grade_aggregate(cursor, row['student_id'], row['subject_id'])
+        if row['grade'] != grade:
+            self._count_grade(cursor, row['student_id'], row['subject_id'], row['grade'], -1)
+            self._count_grade(cursor, row['student_id'], row['subject_id'], grade, 1)
+        if touched is not None:
+            touched.add((row['student_id'], row['subject_id']))
+        return True
+
+    def _count_grade(self, cursor: sqlite3.Cursor, student_id: int, subject_id: int, grade: int, delta: int):
+        """Изменение счётчика оценки в гистограммах школы и класса ученика"""
+        cursor.execute('''
+            INSERT INTO grade_histograms (scope, subject_id, grade, grade_count)
+            SELECT '', ?, ?, ?
+            UNION ALL
+            SELECT class_name, ?, ?, ? FROM students WHERE student_id = ? AND class_name IS NOT NULL
+            ON CONFLICT (scope, subject_id, grade) DO UPDATE SET
+                grade_count = grade_count + excluded.grade_count
+        ''', (subject_id, grade, delta, subject_id, grade, delta, student_id))
+
+    def _refresh_grade_aggregate(self, cursor: sqlite3.Cursor, student_id: int, subject_id: int):
+        """Пересчёт одной строки grade_aggregates по оценкам ученика за предмет"""
+        cursor.execute(
+            'DELETE FROM grade_aggregates WHERE student_id = ? AND subject_id = ?',
+            (student_id, subject_id)
+        )
+        fill_grade_aggregates(cursor, 'WHERE student_id = ? AND subject_id = ?', (student_id, subject_id))
+
+    def get_grade_aggregates(self, student_id: int) -> List[Dict[str, Any]]:
+        """Агрегаты оценок ученика по предметам (в порядке названий предметов, через кеш)"""
+        aggregates = self._stats_cache.get(student_id)
+        if aggregates is MISSING:
+            generation = self._stats_cache.generation
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT a.*, s.name as subject_name
+                    FROM grade_aggregates a
+                    JOIN subjects s ON a.subject_id = s.subject_id
+                    WHERE a.student_id = ?
+                    ORDER BY s.name
+                ''', (student_id,))
+                aggregates = [dict(row) for row in cursor.fetchall()]
+            self._stats_cache.set(student_id, aggregates, generation)
+        return [dict(aggregate) for aggregate in aggregates]
+
+    def get_grade_histogram(self, subject_id: int, class_name: Optional[str] = None) -> Dict[int, int]:
+        """Число оценок каждого значения по предмету в классе (или во всей школе)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT grade, grade_count FROM grade_histograms
+                WHERE scope = ? AND subject_id = ? AND grade_count > 0
+                ORDER BY grade
+            ''', (class_name or '', subject_id))
+            rows = cursor.fetchall()
+        return {row['grade']: row['grade_count'] for row in rows}
+
+    def get_grade_trends(self, student_id: int) -> List[Dict[str, Any]]:
+        """Скользящее состояние оценок ученика по предметам (EWMA, окно, зона риска)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT t.*, s.name as subject_name
+                FROM grade_trends t
+                JOIN subjects s ON t.subject_id = s.subject_id
+                WHERE t.student_id = ?
+                ORDER BY s.name
+            ''', (student_id,))
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_weekly_grades(self, since: str, student_id: Optional[int] = None,
+                          subject_ids: Optional[Sequence[int]] = None,
+                          class_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Сумма и число оценок по предметам и неделям ('%Y-W%W') начиная с даты since
+
+        Фильтр по ученику или по классу (через его учеников) и, при необходимости,
+        по списку предметов; период задаётся диапазоном по индексу (ученик, дата).
+        """
+        conditions, params = ['g.date >= ?'], [since]
+        if student_id is not None:
+            conditions.append('g.student_id = ?')
+            params.append(student_id)
+        if class_name is not None:
+            conditions.append('g.student_id IN (SELECT student_id FROM students WHERE class_name = ?)')
+            params.append(class_name)
+        if subject_ids is not None:
+            conditions.append('g.subject_id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(list(subject_ids)))
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT g.subject_id, s.name as subject_name, strftime('%Y-W%W', g.date) as week,
+                       SUM(g.grade) as grade_sum, COUNT(*) as grade_count
+                FROM grades g
+                JOIN subjects s ON g.subject_id = s.subject_id
+                WHERE {' AND '.join(conditions)}
+                GROUP BY g.subject_id, week
+                ORDER BY s.name, g.subject_id, week
+            ''', params)
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_grade_aggregates_batch(self, student_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Агрегаты оценок нескольких учеников (по ученику, затем по предмету)
+
+        Ученики, которых нет в кеше, читаются одним запросом.
+        """
+        by_student = {}
+        for student_id in sorted(set(student_ids)):
+            by_student[student_id] = self._stats_cache.get(student_id)
+        missing = [student_id for student_id, aggregates in by_student.items() if aggregates is MISSING]
+        if missing:
+            generation = self._stats_cache.generation
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Список id передаётся одним JSON-параметром, без ограничения на число переменных
+                cursor.execute('''
+                    SELECT a.*, s.name as subject_name
+                    FROM grade_aggregates a
+                    JOIN subjects s ON a.subject_id = s.subject_id
+                    WHERE a.student_id IN (SELECT value FROM json_each(?))
+                    ORDER BY a.student_id, s.name
+                ''', (json.dumps(missing),))
+                rows = cursor.fetchall()
+            for student_id in missing:
+                by_student[student_id] = []
+            for row in rows:
+                by_student[row['student_id']].append(dict(row))
+            for student_id in missing:
+                self._stats_cache.set(student_id, by_student[student_id], generation)
+        return [dict(aggregate) for aggregates in by_student.values() for aggregate in aggregates]
+
+    def get_student_rankings(self, class_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Сумма и число оценок каждого ученика класса (или школы) одним запросом"""
+        condition = 'WHERE st.class_name = ?' if class_name else ''
+        params = (class_name,) if class_name else ()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Группировка и порядок по idx_students_class_name: проход по индексу без сортировки
+            cursor.execute(f'''
+                SELECT st.student_id, st.full_name, st.class_name,
+                       COALESCE(SUM(a.grade_sum), 0) as grade_sum,
+                       COALESCE(SUM(a.grade_count), 0) as grade_count
+                FROM students st
+                LEFT JOIN grade_aggregates a ON a.student_id = st.student_id
+                    AND EXISTS (SELECT 1 FROM subjects s WHERE s.subject_id = a.subject_id)
+                {condition}
+                GROUP BY st.class_name, st.full_name, st.student_id
+                ORDER BY st.class_name, st.full_name, st.student_id
+            ''', params)
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_subject_rankings(self, subject_id: int) -> List[Dict[str, Any]]:
+        """Сумма и число оценок по предмету у каждого ученика, получавшего по нему оценки"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT st.student_id, st.full_name, st.class_name, a.grade_sum, a.grade_count
+                FROM grade_aggregates a
+                JOIN students st ON st.student_id = a.student_id
+                WHERE a.subject_id = ?
+                ORDER BY st.class_name, st.full_name, st.student_id
+            ''', (subject_id,))
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_student_class_sizes(self) -> List[Dict[str, Any]]:
+        """Названия классов учеников (включая None) и число учеников в каждом"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT class_name, COUNT(*) as student_count
+                FROM students
+                GROUP BY class_name
+                ORDER BY class_name
+            ''')
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_term_grades(self, class_name: Optional[str], start: str, end: str) -> List[Dict[str, Any]]:
+        """Сумма и число оценок учеников класса по предметам и неделям за период [start, end]"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT g.student_id, g.subject_id, s.name as subject_name,
+                       strftime('%Y-W%W', g.date) as week,
+                       SUM(g.grade) as grade_sum, COUNT(*) as grade_count
+                FROM grades g
+                JOIN subjects s ON g.subject_id = s.subject_id
+                WHERE g.student_id IN (SELECT student_id FROM students WHERE class_name IS ?)
+                  AND g.date BETWEEN ? AND ?
+                GROUP BY g.student_id, g.subject_id, week
+                ORDER BY g.student_id, s.name, g.subject_id, week
+            ''', (class_name, start, end))
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_grades(self, class_name: Optional[str] = None, start: Optional[str] = None,
+                    end: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+        """Оценки школы или класса за период пачками по batch_size строк (столбцы EXPORT_COLUMNS)
+
+        Выгрузка читается через fetchmany на отдельном подключении, поэтому
+        память не зависит от размера журнала, а следующую пачку можно
+        запрашивать из любого потока. Подключение закрывается, когда генератор
+        исчерпан или закрыт.
+        """
+        conditions, params = [], []
+        if class_name is not None:
+            conditions.append('g.student_id IN (SELECT student_id FROM students WHERE class_name = ?)')
+            params.append(class_name)
+        if start:
+            conditions.append('g.date >= ?')
+            params.append(start)
+        if end:
+            conditions.append('g.date <= ?')
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        conn = self.open_connection()
+        try:
+            cursor = conn.execute(f'''
+                SELECT g.grade_id, g.date, st.class_name, g.student_id, st.full_name,
+                       g.subject_id, s.name, g.grade, g.teacher_id, g.comment
+                FROM grades g
+                JOIN students st ON st.student_id = g.student_id
+                LEFT JOIN subjects s ON s.subject_id = g.subject_id
+                {where}
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+        finally:
+            conn.close()
+
+    def get_grade_columns(self, after_grade_id: int = 0) -> Tuple[str, ...]:
+        """Оценки существующих предметов по столбцам для колоночной аналитики
+
+        Каждый столбец (grade_id, student_id, subject_id, teacher_id, grade, day)
+        возвращается одной строкой чисел через запятую: так SQLite собирает
+        значения сам, без создания объекта Python на каждую ячейку. day - номер
+        дня от 1970-01-01. after_grade_id позволяет дочитать только новые оценки.
+        Оценки с датой, которую SQLite не разбирает, пропускаются: group_concat
+        пропускает NULL, и столбец day оказался бы короче остальных.
+        """
+        with self.connection() as conn:
+            row = conn.execute('''
+                SELECT group_concat(g.grade_id), group_concat(g.student_id), group_concat(g.subject_id),
+                       group_concat(g.teacher_id), group_concat(g.grade),
+                       group_concat(CAST(julianday(g.date) - 2440587.5 AS INTEGER))
+                FROM grades g
+                JOIN subjects s ON g.subject_id = s.subject_id
+                WHERE g.grade_id > ? AND julianday(g.date) IS NOT NULL
+            ''', (after_grade_id,)).fetchone()
+        return tuple(value or '' for value in row)
+
+    def rebuild_grade_aggregates(self) -> int:
+        """Пересоздание grade_aggregates и grade_histograms из grades; возвращает число строк агрегатов"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('DELETE FROM grade_aggregates')
+            fill_grade_aggregates(cursor)
+            cursor.execute('DELETE FROM grade_histograms')
+            fill_grade_histograms(cursor)
+            count = cursor.execute('SELECT COUNT(*) FROM grade_aggregates').fetchone()[0]
+            conn.commit()
+        self._stats_cache.clear()
+        logger.info(f"Grade aggregates rebuilt: {count} rows")
+        return count
+
     # ============ HOMEWORK METHODS ============
     
     def add_homework(self, subject_id: int, title: str, description: str,
                      teacher_id: int, deadline: Optional[str] = None, 
                      file_id: Optional[str] = None) -> Optional[int]:
-        """Добавление домашнего задания"""
+        """Добавление домашнего задания (уведомления ученикам ставятся в очередь той же транзакцией)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO homework (subject_id, title, description, file_id, deadline, created_by) VALUES (?, ?, ?, ?, ?, ?)',
-                (subject_id, title, description, file_id, deadline, teacher_id)
-            )
-            homework_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO homework (subject_id, title, description, file_id, deadline, created_by) VALUES (?, ?, ?, ?, ?, ?)',
+                    (subject_id, title, description, file_id, deadline, teacher_id)
+                )
+                homework_id = cursor.lastrowid
+                subject = cursor.execute('SELECT name FROM subjects WHERE subject_id = ?', (subject_id,)).fetchone()
+                if subject:
+                    payload = {'homework_id': homework_id, 'subject_name': subject['name'],
+                               'title': title, 'deadline': deadline}
+                    self._enqueue_notifications(cursor, 'new_homework', payload,
+                                                *self._recipients_query(cursor, subject_id))
+                conn.commit()
             logger.info(f"Homework {title} added with ID {homework_id}")
+            for listener in self._homework_listeners:
+                try:
+                    listener({'homework_id': homework_id, 'deadline': deadline})
+                except Exception as e:
+                    logger.error(f"Error in homework listener: {e}")
             return homework_id
         except Exception as e:
             logger.error(f"Error adding homework: {e}")
             return None
 
-    def get_all_homework(self, subject_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Получение всех домашних заданий (опционально фильтр по предмету)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        if subject_id:
-            cursor.execute('''
-                SELECT h.*, s.name as subject_name
-                FROM homework h
-                JOIN subjects s ON h.subject_id = s.subject_id
-                WHERE h.subject_id = ?
-                ORDER BY h.deadline ASC
-            ''', (subject_id,))
-        else:
-            cursor.execute('''
-                SELECT h.*, s.name as subject_name
-                FROM homework h
-                JOIN subjects s ON h.subject_id = s.subject_id
-                ORDER BY h.deadline ASC
-            ''')
-        rows = cursor.fetchall()
-        conn.close()
+    def add_homework_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Подписка на новые домашние задания
+
+        listener получает {'homework_id', 'deadline'} после фиксации задания
+        в потоке, выполнившем запись.
+        """
+        self._homework_listeners.append(listener)
+
+    def get_pending_reminders(self, after: str) -> List[Dict[str, Any]]:
+        """Задания с дедлайном позже after, напоминание о которых ещё не отправлено"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT homework_id, deadline FROM homework
+                WHERE reminder_sent_at IS NULL AND deadline > ?
+                ORDER BY deadline
+            ''', (after,)).fetchall()
         return [dict(row) for row in rows]
 
-    def get_homework(self, homework_id: int) -> Optional[Dict[str, Any]]:
-        """Получение конкретного домашнего задания"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+    def enqueue_deadline_reminder(self, homework_id: int) -> bool:
+        """Отметка о напоминании и его постановка в очередь уведомлений одной транзакцией
+
+        Возвращает False, если напоминание уже отправлено или задания нет:
+        повторный вызов (например, после перезапуска) ничего не отправляет.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE homework SET reminder_sent_at = CURRENT_TIMESTAMP
+                    WHERE homework_id = ? AND reminder_sent_at IS NULL
+                ''', (homework_id,))
+                if not cursor.rowcount:
+                    return False
+                homework = cursor.execute('''
+                    SELECT h.subject_id, h.title, h.deadline, s.name AS subject_name
+                    FROM homework h
+                    JOIN subjects s ON h.subject_id = s.subject_id
+                    WHERE h.homework_id = ?
+                ''', (homework_id,)).fetchone()
+                if homework:
+                    payload = {'homework_id': homework_id, 'subject_name': homework['subject_name'],
+                               'title': homework['title'], 'deadline': homework['deadline']}
+                    self._enqueue_notifications(cursor, 'deadline_reminder', payload,
+                                                *self._recipients_query(cursor, homework['subject_id']))
+                conn.commit()
+            logger.info(f"Deadline reminder for homework {homework_id} queued")
+            return True
+        except Exception as e:
+            logger.error(f"Error queueing deadline reminder: {e}")
+            return False
+
+    def get_all_homework(self, subject_id: Optional[int] = None, limit: Optional[int] = None,
+                         after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Получение домашних заданий (опционально фильтр по предмету, постранично)"""
+        conditions, params = [], []
+        if subject_id:
+            conditions.append('h.subject_id = ?')
+            params.append(subject_id)
+        if after:
+            condition, after_params = _keyset_clause(
+                [f'h.{column}' for column in PAGE_KEYS['homework']], after
+            )
+            conditions.append(condition)
+            params.extend(after_params)
+        query = '''
             SELECT h.*, s.name as subject_name
             FROM homework h
             JOIN subjects s ON h.subject_id = s.subject_id
-            WHERE h.homework_id = ?
-        ''', (homework_id,))
-        row = cursor.fetchone()
-        conn.close()
+        '''
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += ' ORDER BY h.deadline ASC, h.homework_id ASC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    def get_homework(self, homework_id: int) -> Optional[Dict[str, Any]]:
+        """Получение конкретного домашнего задания"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT h.*, s.name as subject_name
+                FROM homework h
+                JOIN subjects s ON h.subject_id = s.subject_id
+                WHERE h.homework_id = ?
+            ''', (homework_id,))
+            row = cursor.fetchone()
         return dict(row) if row else None
 
+    # ============ NOTIFICATION OUTBOX ============
+
+    def claim_notifications(self, limit: int, lease: int) -> List[Dict[str, Any]]:
+        """Захват до limit уведомлений, готовых к отправке, на lease секунд
+
+        Захваченные строки получают статус 'sending'. Если результат не
+        отмечен до конца аренды (например, процесс упал во время отправки),
+        строки снова становятся доступны для захвата. Вместе с готовым
+        уведомлением вида из NOTIFICATION_WINDOWS захватываются и все
+        накопленные уведомления того же вида для этого получателя, даже если
+        их окно ещё не закончилось.
+        """
+        claim = f"status = 'sending', attempts = attempts + 1, available_at = datetime('now', '+{int(lease)} seconds')"
+        returning = 'RETURNING outbox_id, chat_id, kind, payload, attempts'
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                rows = cursor.execute(f'''
+                    UPDATE notification_outbox SET {claim}
+                    WHERE outbox_id IN (
+                        SELECT outbox_id FROM notification_outbox
+                        WHERE status IN ('pending', 'sending') AND available_at <= datetime('now')
+                        ORDER BY available_at
+                        LIMIT ?
+                    )
+                    {returning}
+                ''', (limit,)).fetchall()
+                for kind in NOTIFICATION_WINDOWS:
+                    chat_ids = sorted({row['chat_id'] for row in rows if row['kind'] == kind})
+                    if chat_ids:
+                        rows += cursor.execute(f'''
+                            UPDATE notification_outbox SET {claim}
+                            WHERE chat_id IN (SELECT value FROM json_each(?)) AND kind = ? AND status = 'pending'
+                            {returning}
+                        ''', (json.dumps(chat_ids), kind)).fetchall()
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error claiming notifications: {e}")
+            return []
+        notifications = [dict(row) for row in rows]
+        for notification in notifications:
+            notification['payload'] = json.loads(notification['payload'])
+        notifications.sort(key=lambda n: n['outbox_id'])
+        return notifications
+
+    def finish_notifications(self, delivered: Sequence[int] = (), retries: Sequence[Tuple[int, int, str]] = (),
+                             failed: Sequence[Tuple[int, str]] = (), suppressed: Sequence[int] = ()) -> bool:
+        """Результат отправки захваченных уведомлений
+
+        delivered - id доставленных, retries - (id, задержка в секундах,
+        ошибка) для повторной попытки, failed - (id, ошибка) для отказа,
+        suppressed - id не отправленных получателям из notification_suppressions.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE notification_outbox SET status = 'delivered', delivered_at = CURRENT_TIMESTAMP
+                    WHERE outbox_id = ? AND status = 'sending'
+                ''', [(outbox_id,) for outbox_id in delivered])
+                cursor.executemany('''
+                    UPDATE notification_outbox
+                    SET status = 'pending', available_at = datetime('now', ?), last_error = ?
+                    WHERE outbox_id = ? AND status = 'sending'
+                ''', [(f'+{int(delay)} seconds', error, outbox_id) for outbox_id, delay, error in retries])
+                cursor.executemany('''
+                    UPDATE notification_outbox SET status = 'failed', last_error = ?
+                    WHERE outbox_id = ? AND status = 'sending'
+                ''', [(error, outbox_id) for outbox_id, error in failed])
+                cursor.executemany('''
+                    UPDATE notification_outbox SET status = 'suppressed'
+                    WHERE outbox_id = ? AND status = 'sending'
+                ''', [(outbox_id,) for outbox_id in suppressed])
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error finishing notifications: {e}")
+            return False
+
+    def purge_notifications(self, days: int) -> int:
+        """Удаление доставленных, отклонённых и пропущенных уведомлений старше days дней"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # available_at завершённой строки - конец её последней аренды
+                cursor.execute('''
+                    DELETE FROM notification_outbox
+                    WHERE status IN ('delivered', 'failed', 'suppressed') AND available_at < datetime('now', ?)
+                ''', (f'-{int(days)} days',))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error purging notifications: {e}")
+            return 0
+
+    def get_suppressed_chats(self) -> Set[int]:
+        """Получатели, которым уведомления не отправляются (из памяти)"""
+        suppressed = self._suppressed
+        if suppressed is None:
+            with self._suppressed_lock:
+                if self._suppressed is None:
+                    with self.connection() as conn:
+                        rows = conn.execute('SELECT chat_id FROM notification_suppressions').fetchall()
+                    self._suppressed = {row[0] for row in rows}
+                suppressed = self._suppressed
+        return suppressed
+
+    def suppress_chats(self, chat_ids: Iterable[int], reason: str = 'blocked') -> bool:
+        """Отметка получателей недоступными (заблокировали бота, удалили аккаунт)"""
+        chat_ids = set(chat_ids)
+        if not chat_ids:
+            return True
+        try:
+            with self.connection() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO notification_suppressions (chat_id, reason) VALUES (?, ?)',
+                    [(chat_id, reason) for chat_id in chat_ids]
+                )
+                conn.commit()
+            with self._suppressed_lock:
+                # Новое множество вместо изменения: читатели не видят его частично
+                self._suppressed = None if self._suppressed is None else self._suppressed | chat_ids
+            logger.info(f"Suppressed notifications for {len(chat_ids)} chats: {reason}")
+            return True
+        except Exception as e:
+            logger.error(f"Error suppressing chats: {e}")
+            return False
+
+    def unsuppress_chat(self, chat_id: int) -> bool:
+        """Снятие отметки (пользователь снова написал боту)"""
+        try:
+            # Обычный /start пользователя без отметки не пишет в базу
+            if chat_id not in self.get_suppressed_chats():
+                return True
+            with self.connection() as conn:
+                conn.execute('DELETE FROM notification_suppressions WHERE chat_id = ?', (chat_id,))
+                conn.commit()
+            with self._suppressed_lock:
+                self._suppressed = None if self._suppressed is None else self._suppressed - {chat_id}
+            return True
+        except Exception as e:
+            logger.error(f"Error unsuppressing chat: {e}")
+            return False
+
+    def get_outbox_stats(self) -> Dict[str, int]:
+        """Число уведомлений в очереди по статусам"""
+        with self.connection() as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM notification_outbox GROUP BY status'
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
     # ============ ADMIN METHODS ============
     
     def is_first_user(self) -> bool:
         """Проверка, является ли БД пустой (для создания первого админа)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) as count FROM users')
-        count = cursor.fetchone()['count']
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) as count FROM users')
+            count = cursor.fetchone()['count']
         return count == 0
     
     def make_admin(self, user_id: int) -> bool:
         """Назначить пользователя админом"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
+                conn.commit()
+            self._user_cache.invalidate(user_id)
             return True
         except Exception as e:
             logger.error(f"Error making user admin: {e}")
@@ -562,12 +1394,12 @@ class Database:
     def create_class(self, name: str) -> Optional[int]:
         """Создать класс"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO classes (name) VALUES (?)', (name,))
-            class_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('INSERT INTO classes (name) VALUES (?)', (name,))
+                class_id = cursor.lastrowid
+                conn.commit()
+            self._invalidate_catalog()
             return class_id
         except sqlite3.IntegrityError:
             logger.warning(f"Class {name} already exists")
@@ -575,27 +1407,22 @@ class Database:
     
     def get_all_classes(self) -> List[Dict[str, Any]]:
         """Получить все классы"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM classes ORDER BY name')
-        rows = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+        return [dict(cls) for cls in self._get_catalog()['classes'].values()]
     
     # --- Управление назначениями ---
     
     def assign_teacher(self, teacher_id: int, class_id: int, subject_id: int) -> Optional[int]:
         """Назначить учителя на предмет в классе"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO teaching_assignments (teacher_id, class_id, subject_id)
-                VALUES (?, ?, ?)
-            ''', (teacher_id, class_id, subject_id))
-            assignment_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO teaching_assignments (teacher_id, class_id, subject_id)
+                    VALUES (?, ?, ?)
+                ''', (teacher_id, class_id, subject_id))
+                assignment_id = cursor.lastrowid
+                conn.commit()
+            self._invalidate_catalog()
             return assignment_id
         except sqlite3.IntegrityError:
             logger.warning(f"Assignment already exists")
@@ -603,19 +1430,17 @@ class Database:
     
     def get_teacher_assignments(self, teacher_id: int) -> List[Dict[str, Any]]:
         """Получить все назначения учителя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT ta.*, c.name as class_name, s.name as subject_name
-            FROM teaching_assignments ta
-            JOIN classes c ON ta.class_id = c.class_id
-            JOIN subjects s ON ta.subject_id = s.subject_id
-            WHERE ta.teacher_id = ?
-            ORDER BY c.name, s.name
-        ''', (teacher_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+        catalog = self._get_catalog()
+        assignments = []
+        for assignment in catalog['assignments'].values():
+            cls = catalog['classes'].get(assignment['class_id'])
+            subject = catalog['subjects'].get(assignment['subject_id'])
+            # Назначения удалённых классов и предметов не показываются (как при JOIN)
+            if assignment['teacher_id'] != teacher_id or not cls or not subject:
+                continue
+            assignments.append({**assignment, 'class_name': cls['name'], 'subject_name': subject['name']})
+        assignments.sort(key=lambda a: (a['class_name'], a['subject_name']))
+        return assignments
     
     # --- Управление приглашениями ---
     
@@ -638,15 +1463,14 @@ class Database:
         """
         code = self.generate_invite_code()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            target_json = json.dumps(target_data) if target_data else None
-            cursor.execute('''
-                INSERT INTO invite_codes (code, role, full_name, target_data, created_by)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (code, role, full_name, target_json, created_by))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                target_json = json.dumps(target_data) if target_data else None
+                cursor.execute('''
+                    INSERT INTO invite_codes (code, role, full_name, target_data, created_by)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (code, role, full_name, target_json, created_by))
+                conn.commit()
             logger.info(f"Created invite code {code} for {role} {full_name}")
             return code
         except Exception as e:
@@ -662,67 +1486,66 @@ class Database:
         - Для student: привязывается user_id к записи student
         - Для admin: устанавливается is_admin=1
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        # Проверяем код
-        cursor.execute('''
-            SELECT * FROM invite_codes 
-            WHERE code = ? AND is_used = 0
-        ''', (code,))
-        invite = cursor.fetchone()
+            # Проверяем код
+            cursor.execute('''
+                SELECT * FROM invite_codes 
+                WHERE code = ? AND is_used = 0
+            ''', (code,))
+            invite = cursor.fetchone()
         
-        if not invite:
-            conn.close()
-            return None
+            if not invite:
+                return None
         
-        invite_dict = dict(invite)
-        role = invite_dict['role']
-        full_name = invite_dict['full_name']
-        target_data = json.loads(invite_dict['target_data']) if invite_dict.get('target_data') else {}
+            invite_dict = dict(invite)
+            role = invite_dict['role']
+            full_name = invite_dict['full_name']
+            target_data = json.loads(invite_dict['target_data']) if invite_dict.get('target_data') else {}
         
-        # Создаём пользователя
-        try:
-            cursor.execute(
-                'INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, ?)',
-                (user_id, username, full_name, role)
-            )
-        except sqlite3.IntegrityError:
-            # Пользователь уже существует - обновляем роль
-            cursor.execute('UPDATE users SET role = ? WHERE user_id = ?', (role, user_id))
+            # Создаём пользователя
+            try:
+                cursor.execute(
+                    'INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, ?)',
+                    (user_id, username, full_name, role)
+                )
+            except sqlite3.IntegrityError:
+                # Пользователь уже существует - обновляем роль
+                cursor.execute('UPDATE users SET role = ? WHERE user_id = ?', (role, user_id))
         
-        # Обрабатываем в зависимости от роли
-        if role == 'parent' and target_data.get('student_ids'):
-            # Создаём связи с учениками (сразу approved!)
-            for student_id in target_data['student_ids']:
-                try:
-                    cursor.execute('''
-                        INSERT INTO parent_student_links (parent_id, student_id, status, approved_at)
-                        VALUES (?, ?, 'approved', CURRENT_TIMESTAMP)
-                    ''', (user_id, student_id))
-                except sqlite3.IntegrityError:
-                    pass  # Связь уже существует
+            # Обрабатываем в зависимости от роли
+            if role == 'parent' and target_data.get('student_ids'):
+                # Создаём связи с учениками (сразу approved!)
+                for student_id in target_data['student_ids']:
+                    try:
+                        cursor.execute('''
+                            INSERT INTO parent_student_links (parent_id, student_id, status, approved_at)
+                            VALUES (?, ?, 'approved', CURRENT_TIMESTAMP)
+                        ''', (user_id, student_id))
+                    except sqlite3.IntegrityError:
+                        pass  # Связь уже существует
         
-        elif role == 'student' and target_data.get('student_id'):
-            # Привязываем Telegram к записи ученика
-            cursor.execute(
-                'UPDATE students SET user_id = ? WHERE student_id = ?',
-                (user_id, target_data['student_id'])
-            )
+            elif role == 'student' and target_data.get('student_id'):
+                # Привязываем Telegram к записи ученика
+                cursor.execute(
+                    'UPDATE students SET user_id = ? WHERE student_id = ?',
+                    (user_id, target_data['student_id'])
+                )
         
-        elif role == 'admin':
-            # Устанавливаем флаг админа
-            cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
+            elif role == 'admin':
+                # Устанавливаем флаг админа
+                cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
         
-        # Помечаем код как использованный
-        cursor.execute('''
-            UPDATE invite_codes 
-            SET is_used = 1, used_by = ?, used_at = CURRENT_TIMESTAMP
-            WHERE code = ?
-        ''', (user_id, code))
+            # Помечаем код как использованный
+            cursor.execute('''
+                UPDATE invite_codes 
+                SET is_used = 1, used_by = ?, used_at = CURRENT_TIMESTAMP
+                WHERE code = ?
+            ''', (user_id, code))
         
-        conn.commit()
-        conn.close()
+            conn.commit()
+        self._user_cache.invalidate(user_id)
         
         return {
             'role': role,
@@ -730,27 +1553,33 @@ class Database:
             'target_data': target_data
         }
     
-    def get_all_invites(self, include_used: bool = False) -> List[Dict[str, Any]]:
-        """Получить все приглашения"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        if include_used:
-            cursor.execute('''
-                SELECT ic.*, u.full_name as created_by_name
-                FROM invite_codes ic
-                LEFT JOIN users u ON ic.created_by = u.user_id
-                ORDER BY ic.created_at DESC
-            ''')
-        else:
-            cursor.execute('''
-                SELECT ic.*, u.full_name as created_by_name
-                FROM invite_codes ic
-                LEFT JOIN users u ON ic.created_by = u.user_id
-                WHERE ic.is_used = 0
-                ORDER BY ic.created_at DESC
-            ''')
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_invites(self, include_used: bool = False, limit: Optional[int] = None,
+                        after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Получить приглашения, новые первыми (постранично: limit и after)"""
+        conditions, params = [], []
+        if not include_used:
+            conditions.append('ic.is_used = 0')
+        if after:
+            condition, after_params = _keyset_clause(
+                [f'ic.{column}' for column in PAGE_KEYS['invites']], after, descending=True
+            )
+            conditions.append(condition)
+            params.extend(after_params)
+        query = '''
+            SELECT ic.*, u.full_name as created_by_name
+            FROM invite_codes ic
+            LEFT JOIN users u ON ic.created_by = u.user_id
+        '''
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += ' ORDER BY ic.created_at DESC, ic.code_id DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         result = []
         for row in rows:
             d = dict(row)
@@ -763,38 +1592,36 @@ class Database:
     
     def get_all_teachers(self) -> List[Dict[str, Any]]:
         """Получить всех учителей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT u.*, 
-                   (SELECT COUNT(*) FROM teaching_assignments ta WHERE ta.teacher_id = u.user_id) as assignments_count
-            FROM users u
-            WHERE u.role = 'teacher'
-            ORDER BY u.full_name
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*, 
+                       (SELECT COUNT(*) FROM teaching_assignments ta WHERE ta.teacher_id = u.user_id) as assignments_count
+                FROM users u
+                WHERE u.role = 'teacher'
+                ORDER BY u.full_name
+            ''')
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def get_all_admins(self) -> List[Dict[str, Any]]:
         """Получить всех админов"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM users WHERE is_admin = 1 ORDER BY full_name
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM users WHERE is_admin = 1 ORDER BY full_name
+            ''')
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def remove_admin(self, user_id: int) -> bool:
         """Снять права админа"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('UPDATE users SET is_admin = 0 WHERE user_id = ?', (user_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE users SET is_admin = 0 WHERE user_id = ?', (user_id,))
+                conn.commit()
+            self._user_cache.invalidate(user_id)
             return True
         except Exception as e:
             logger.error(f"Error removing admin: {e}")
@@ -802,60 +1629,57 @@ class Database:
     
     def get_classes_with_student_count(self) -> List[Dict[str, Any]]:
         """Получить все классы с количеством учеников"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT c.*, 
-                   (SELECT COUNT(*) FROM students s WHERE s.class_name = c.name) as student_count
-            FROM classes c
-            ORDER BY c.name
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.*, 
+                       (SELECT COUNT(*) FROM students s WHERE s.class_name = c.name) as student_count
+                FROM classes c
+                ORDER BY c.name
+            ''')
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def get_students_by_class_name(self, class_name: str) -> List[Dict[str, Any]]:
-        """Получить учеников по названию класса"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.*, 
-                   CASE WHEN s.user_id IS NOT NULL THEN 1 ELSE 0 END as has_telegram
-            FROM students s
-            WHERE s.class_name = ?
-            ORDER BY s.full_name
-        ''', (class_name,))
-        rows = cursor.fetchall()
-        conn.close()
+        """Получить учеников по названию класса (None - ученики без класса)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.*, 
+                       CASE WHEN s.user_id IS NOT NULL THEN 1 ELSE 0 END as has_telegram
+                FROM students s
+                WHERE s.class_name IS ?
+                ORDER BY s.full_name
+            ''', (class_name,))
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def get_all_assignments(self) -> List[Dict[str, Any]]:
         """Получить все назначения учителей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT ta.*, 
-                   c.name as class_name, 
-                   s.name as subject_name,
-                   u.full_name as teacher_name
-            FROM teaching_assignments ta
-            JOIN classes c ON ta.class_id = c.class_id
-            JOIN subjects s ON ta.subject_id = s.subject_id
-            JOIN users u ON ta.teacher_id = u.user_id
-            ORDER BY u.full_name, c.name, s.name
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ta.*, 
+                       c.name as class_name, 
+                       s.name as subject_name,
+                       u.full_name as teacher_name
+                FROM teaching_assignments ta
+                JOIN classes c ON ta.class_id = c.class_id
+                JOIN subjects s ON ta.subject_id = s.subject_id
+                JOIN users u ON ta.teacher_id = u.user_id
+                ORDER BY u.full_name, c.name, s.name
+            ''')
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def delete_assignment(self, assignment_id: int) -> bool:
         """Удалить назначение учителя"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM teaching_assignments WHERE assignment_id = ?', (assignment_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM teaching_assignments WHERE assignment_id = ?', (assignment_id,))
+                conn.commit()
+            self._invalidate_catalog()
             return True
         except Exception as e:
             logger.error(f"Error deleting assignment: {e}")
@@ -864,11 +1688,11 @@ class Database:
     def delete_class(self, class_id: int) -> bool:
         """Удалить класс"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM classes WHERE class_id = ?', (class_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM classes WHERE class_id = ?', (class_id,))
+                conn.commit()
+            self._invalidate_catalog()
             return True
         except Exception as e:
             logger.error(f"Error deleting class: {e}")
@@ -877,31 +1701,191 @@ class Database:
     def delete_student(self, student_id: int) -> bool:
         """Удалить ученика"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            # Удаляем связи с родителями
-            cursor.execute('DELETE FROM parent_student_links WHERE student_id = ?', (student_id,))
-            # Удаляем оценки
-            cursor.execute('DELETE FROM grades WHERE student_id = ?', (student_id,))
-            # Удаляем ученика
-            cursor.execute('DELETE FROM students WHERE student_id = ?', (student_id,))
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Удаляем связи с родителями
+                cursor.execute('DELETE FROM parent_student_links WHERE student_id = ?', (student_id,))
+                # Удаляем оценки и их агрегаты; оценки вычитаются из гистограмм школы и класса
+                cursor.execute('''
+                    INSERT INTO grade_histograms (scope, subject_id, grade, grade_count)
+                    SELECT sc.scope, g.subject_id, g.grade, -COUNT(*)
+                    FROM grades g
+                    JOIN (SELECT '' AS scope
+                          UNION ALL
+                          SELECT class_name FROM students WHERE student_id = ? AND class_name IS NOT NULL) sc
+                    WHERE g.student_id = ?
+                    GROUP BY sc.scope, g.subject_id, g.grade
+                    ON CONFLICT (scope, subject_id, grade) DO UPDATE SET
+                        grade_count = grade_count + excluded.grade_count
+                ''', (student_id, student_id))
+                deleted = cursor.execute(
+                    'DELETE FROM grades WHERE student_id = ? RETURNING subject_id', (student_id,)
+                ).fetchall()
+                cursor.execute('DELETE FROM grade_aggregates WHERE student_id = ?', (student_id,))
+                cursor.execute('DELETE FROM grade_trends WHERE student_id = ?', (student_id,))
+                # Удаляем ученика
+                cursor.execute('DELETE FROM students WHERE student_id = ?', (student_id,))
+                conn.commit()
+            self._grades_changed(rewrite=True, touched=[(student_id, row['subject_id']) for row in deleted],
+                                students=[student_id])
             return True
         except Exception as e:
             logger.error(f"Error deleting student: {e}")
             return False
     
-    def get_all_users(self) -> List[Dict[str, Any]]:
-        """Получить всех пользователей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users ORDER BY full_name')
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_users(self, limit: Optional[int] = None,
+                      after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Получить пользователей по имени (постранично: limit и after)"""
+        query, params = 'SELECT * FROM users', []
+        if after:
+            condition, params = _keyset_clause(PAGE_KEYS['users'], after)
+            query += f' WHERE {condition}'
+        query += ' ORDER BY full_name, user_id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
 
-# Singleton instance
-db = Database()
+class GradeWriteQueue:
+    """Очередь групповой фиксации оценок
+
+    Пока поток-писатель фиксирует один пакет, новые записи оценок копятся
+    и уходят следующим пакетом одной транзакцией. Простаивающий писатель
+    получает пакет через GRADE_BATCH_WINDOW_MS (или на следующей итерации
+    цикла событий), полный пакет (GRADE_BATCH_MAX_ROWS) отправляется сразу. Каждый вызывающий получает
+    свой результат: grade_id для добавления, True/False для обновления.
+    """
+
+    def __init__(self, async_db: 'AsyncDatabase', max_rows: int = GRADE_BATCH_MAX_ROWS,
+                 window_ms: float = GRADE_BATCH_WINDOW_MS):
+        self.async_db = async_db
+        self.max_rows = max_rows
+        self.window = window_ms / 1000
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._in_flight = 0
+
+    async def submit(self, op: str, **args) -> Any:
+        """Постановка записи в очередь и ожидание результата её пакета"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({'op': op, 'args': args}, future))
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif self._timer is None and not self._in_flight:
+            # Окно 0 - фиксация на следующей итерации цикла событий: в пакет
+            # попадут все записи, поставленные в очередь на текущей итерации
+            self._timer = loop.call_later(self.window, self._flush) if self.window else loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        """Отправка накопленного пакета потоку-писателю"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._in_flight += 1
+            asyncio.ensure_future(self._commit(batch))
+
+    async def _commit(self, batch: List[tuple]):
+        operations = [operation for operation, _ in batch]
+        try:
+            results = await self.async_db.run(
+                self.async_db.database.apply_grade_writes, operations, write=True
+            )
+        except Exception as e:
+            logger.error(f"Error committing grade batch: {e}")
+            results = [None if operation['op'] == 'add' else False for operation in operations]
+        finally:
+            self._in_flight -= 1
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        # Записи, накопившиеся во время фиксации, уходят следующим пакетом
+        if not self._in_flight:
+            self._flush()
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database
+
+    Методы Database доступны как корутины: await adb.get_user(user_id).
+    Чтение выполняется в ограниченном пуле потоков-читателей, запись -
+    в единственном потоке-писателе. У каждого потока своё подключение
+    из пула Database, поэтому event loop никогда не обращается к SQLite.
+    """
+
+    # Методы, изменяющие данные: выполняются только потоком-писателем
+    WRITE_METHODS = frozenset({
+        'add_user', 'update_user_role', 'add_student', 'create_link_request',
+        'approve_link', 'reject_link', 'add_subject', 'delete_subject',
+        'add_grade', 'update_grade', 'apply_grade_writes', 'add_homework', 'make_admin',
+        'rebuild_grade_aggregates', 'create_class', 'assign_teacher', 'create_invite', 'use_invite_code',
+        'remove_admin', 'delete_assignment', 'delete_class', 'delete_student',
+        'claim_notifications', 'finish_notifications', 'purge_notifications', 'enqueue_deadline_reminder',
+        'suppress_chats', 'unsuppress_chat',
+    })
+
+    # Служебные методы Database, не имеющие смысла в асинхронном виде
+    SYNC_ONLY_METHODS = frozenset({
+        'open_connection', 'get_connection', 'connection', 'init_db',
+    })
+
+    def __init__(self, database: Database, readers: int = DB_READER_THREADS):
+        self.database = database
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self.grade_queue = GradeWriteQueue(self)
+
+    async def run(self, func, *args, write: bool = False, **kwargs):
+        """Выполнение синхронной функции, работающей с базой, в потоке базы"""
+        loop = asyncio.get_running_loop()
+        executor = self._writer if write else self._readers
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def add_grade(self, student_id: int, subject_id: int, grade: int,
+                        teacher_id: int, date: str, comment: Optional[str] = None) -> Optional[int]:
+        """Добавление оценки через очередь групповой фиксации"""
+        return await self.grade_queue.submit(
+            'add', student_id=student_id, subject_id=subject_id, grade=grade,
+            teacher_id=teacher_id, date=date, comment=comment
+        )
+
+    async def update_grade(self, grade_id: int, grade: int, comment: Optional[str] = None) -> bool:
+        """Обновление оценки через очередь групповой фиксации"""
+        return await self.grade_queue.submit('update', grade_id=grade_id, grade=grade, comment=comment)
+
+    def __getattr__(self, name: str):
+        if name.startswith('_') or name in self.SYNC_ONLY_METHODS:
+            raise AttributeError(name)
+        method = getattr(self.database, name)
+        write = name in self.WRITE_METHODS
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, write=write, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        # Кешируем обёртку, чтобы __getattr__ вызывался один раз на метод
+        setattr(self, name, call)
+        return call
+
+    def close(self):
+        """Остановка потоков и закрытие подключений"""
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self.database.close()
+
+
+# Singleton instance. База открывается при первом запросе, а не при импорте:
+# процессы пула табелей (utils.report_cards) импортируют модуль, но работают
+# только со своим подключением на чтение
+db = Database(lazy=True)
+adb = AsyncDatabase(db)
 
@@ -7,7 +7,7 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database import db
+from database import adb
 from keyboards import get_admin_menu, get_role_selection_keyboard, WEBAPP_URL
 from config import ROLE_TEACHER, ROLE_STUDENT, ROLE_PARENT
 
@@ -33,7 +33,7 @@ def get_role_name(role: str) -> str:
 @router.message(F.text == "⚙️ Админ панель")
 async def admin_open_panel(message: Message):
     """Открытие админ панели через inline кнопку (передает initData на всех платформах)"""
-    if not db.is_admin(message.from_user.id):
+    if not await adb.is_admin(message.from_user.id):
         return
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -54,7 +54,7 @@ async def admin_open_panel(message: Message):
 @router.message(F.text == "🔑 Создать приглашение")
 async def admin_create_invite_start(message: Message, state: FSMContext):
     """Начало создания приглашения"""
-    if not db.is_admin(message.from_user.id):
+    if not await adb.is_admin(message.from_user.id):
         return
     
     await message.answer(
@@ -92,7 +92,7 @@ async def admin_create_invite_finish(message: Message, state: FSMContext):
     role = data['invite_role']
     full_name = message.text
     
-    code = db.create_invite(role, full_name, message.from_user.id)
+    code = await adb.create_invite(role, full_name, message.from_user.id)
     
     if code:
         await message.answer(
@@ -117,10 +117,10 @@ async def admin_create_invite_finish(message: Message, state: FSMContext):
 @router.message(F.text == "🏫 Классы")
 async def admin_show_classes(message: Message):
     """Показать список классов"""
-    if not db.is_admin(message.from_user.id):
+    if not await adb.is_admin(message.from_user.id):
         return
     
-    classes = db.get_all_classes()
+    classes = await adb.get_all_classes()
     
     if classes:
         text = "🏫 <b>Классы:</b>\n\n"
@@ -136,10 +136,10 @@ async def admin_show_classes(message: Message):
 @router.message(F.text == "📚 Предметы")
 async def admin_show_subjects(message: Message):
     """Показать список предметов"""
-    if not db.is_admin(message.from_user.id):
+    if not await adb.is_admin(message.from_user.id):
         return
     
-    subjects = db.get_all_subjects()
+    subjects = await adb.get_all_subjects()
     
     if subjects:
         text = "📚 <b>Предметы:</b>\n\n"
@@ -3,7 +3,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database import db
+from database import adb
 from keyboards import get_parent_menu, get_students_keyboard, get_back_button
 from utils.statistics import get_student_statistics, format_statistics_message
 
@@ -21,7 +21,7 @@ class ParentStates(StatesGroup):
 @router.message(F.text == "👶 Мои дети")
 async def show_my_children(message: Message):
     """Показать список детей родителя"""
-    children = db.get_parent_students(message.from_user.id)
+    children = await adb.get_parent_students(message.from_user.id)
     
     if not children:
         await message.answer(
@@ -41,7 +41,7 @@ async def show_my_children(message: Message):
 @router.message(F.text.startswith("/link_child"))
 async def link_child_start(message: Message, state: FSMContext):
     """Начало процесса связывания с ребенком"""
-    students = db.get_all_students()
+    students = await adb.get_all_students()
     
     if not students:
         await message.answer("❌ В системе нет учеников", reply_markup=get_parent_menu())
@@ -60,7 +60,7 @@ async def request_link(callback: CallbackQuery, state: FSMContext):
     student_id = int(callback.data.split("_")[1])
     
     # Проверка, не существует ли уже связь
-    existing_children = db.get_parent_students(callback.from_user.id)
+    existing_children = await adb.get_parent_students(callback.from_user.id)
     if any(child['student_id'] == student_id for child in existing_children):
         await callback.message.edit_text("❌ Вы уже привязаны к этому ученику")
         await state.clear()
@@ -68,10 +68,10 @@ async def request_link(callback: CallbackQuery, state: FSMContext):
         return
     
     # Создание запроса
-    link_id = db.create_link_request(callback.from_user.id, student_id)
+    link_id = await adb.create_link_request(callback.from_user.id, student_id)
     
     if link_id:
-        student = db.get_student(student_id)
+        student = await adb.get_student(student_id)
         await callback.message.edit_text(
             f"✅ Запрос отправлен!\n\n"
             f"Ученик: <b>{student['full_name']}</b>\n\n"
@@ -89,7 +89,7 @@ async def request_link(callback: CallbackQuery, state: FSMContext):
 @router.message(F.text == "📊 Оценки")
 async def show_grades_menu(message: Message, state: FSMContext):
     """Меню просмотра оценок"""
-    children = db.get_parent_students(message.from_user.id)
+    children = await adb.get_parent_students(message.from_user.id)
     
     if not children:
         await message.answer(
@@ -122,9 +122,9 @@ async def select_child_for_grades(callback: CallbackQuery, state: FSMContext):
 
 async def show_child_grades(message: Message, student_id: int, edit: bool = False):
     """Показать оценки ребенка"""
-    student = db.get_student(student_id)
-    grades = db.get_student_grades(student_id)
-    stats = get_student_statistics(student_id)
+    student = await adb.get_student(student_id)
+    grades = await adb.get_student_grades(student_id, limit=10)
+    stats = await adb.run(get_student_statistics, student_id)
     
     if not grades:
         text = f"📊 <b>Оценки ученика {student['full_name']}</b>\n\n"
@@ -134,7 +134,7 @@ async def show_child_grades(message: Message, student_id: int, edit: bool = Fals
         text += format_statistics_message(stats)
         text += "\n<b>Последние оценки:</b>\n"
         
-        for grade in grades[:10]:  # Показываем последние 10 оценок
+        for grade in grades:  # Последние 10 оценок
             text += f"• {grade['subject_name']}: <b>{grade['grade']}</b> ({grade['date']})\n"
             if grade['comment']:
                 text += f"  💬 {grade['comment']}\n"
@@ -150,7 +150,7 @@ async def show_child_grades(message: Message, student_id: int, edit: bool = Fals
 @router.message(F.text == "📝 Домашние задания")
 async def show_homework(message: Message):
     """Показать домашние задания"""
-    homework_list = db.get_all_homework()
+    homework_list = await adb.get_all_homework(limit=15)
     
     if not homework_list:
         await message.answer("📝 Домашних заданий пока нет", reply_markup=get_parent_menu())
@@ -158,7 +158,7 @@ async def show_homework(message: Message):
     
     text = "📝 <b>Домашние задания:</b>\n\n"
     
-    for hw in homework_list[:15]:  # Показываем последние 15
+    for hw in homework_list:  # Ближайшие 15 по сроку
         text += f"📚 <b>{hw['subject_name']}</b>\n"
         text += f"• {hw['title']}\n"
         if hw['deadline']:
@@ -1,7 +1,7 @@
 from aiogram import Router, F
 from aiogram.types import Message
 
-from database import db
+from database import adb
 from keyboards import get_student_menu
 from utils.statistics import get_student_statistics, format_statistics_message
 
@@ -14,7 +14,7 @@ router = Router()
 async def show_my_grades(message: Message):
     """Показать оценки ученика"""
     # Получение ученика по user_id
-    student = db.get_student_by_user_id(message.from_user.id)
+    student = await adb.get_student_by_user_id(message.from_user.id)
     
     if not student:
         await message.answer(
@@ -24,8 +24,8 @@ async def show_my_grades(message: Message):
         )
         return
     
-    grades = db.get_student_grades(student['student_id'])
-    stats = get_student_statistics(student['student_id'])
+    grades = await adb.get_student_grades(student['student_id'], limit=15)
+    stats = await adb.run(get_student_statistics, student['student_id'])
     
     if not grades:
         text = "📊 <b>Мои оценки</b>\n\n"
@@ -35,7 +35,7 @@ async def show_my_grades(message: Message):
         text += format_statistics_message(stats)
         text += "\n<b>Последние оценки:</b>\n"
         
-        for grade in grades[:15]:  # Показываем последние 15 оценок
+        for grade in grades:  # Последние 15 оценок
             text += f"• {grade['subject_name']}: <b>{grade['grade']}</b> ({grade['date']})\n"
             if grade['comment']:
                 text += f"  💬 {grade['comment']}\n"
@@ -48,7 +48,7 @@ async def show_my_grades(message: Message):
 @router.message(F.text == "📝 Домашние задания")
 async def show_homework(message: Message):
     """Показать домашние задания"""
-    homework_list = db.get_all_homework()
+    homework_list = await adb.get_all_homework(limit=15)
     
     if not homework_list:
         await message.answer("📝 Домашних заданий пока нет", reply_markup=get_student_menu())
@@ -56,7 +56,7 @@ async def show_homework(message: Message):
     
     text = "📝 <b>Домашние задания:</b>\n\n"
     
-    for hw in homework_list[:15]:  # Показываем последние 15
+    for hw in homework_list:  # Ближайшие 15 по сроку
         text += f"📚 <b>{hw['subject_name']}</b>\n"
         text += f"• {hw['title']}\n"
         text += f"📄 {hw['description']}\n"
@@ -5,14 +5,15 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime
 
-from database import db
+from database import adb
 from keyboards import (
     get_teacher_menu, get_students_keyboard, get_subjects_keyboard,
     get_grade_keyboard, get_link_approval_keyboard, get_cancel_button,
     get_subject_management_keyboard
 )
-from utils.statistics import get_class_statistics, format_class_statistics_message
-from utils.notifications import notify_new_grade, notify_new_homework, notify_link_approved, notify_link_rejected
+from utils.statistics import format_class_statistics_message
+from utils.leaderboard import leaderboards
+from utils.notifications import notify_link_approved, notify_link_rejected
 from config import MIN_GRADE, MAX_GRADE
 
 router = Router()
@@ -39,7 +40,7 @@ class TeacherStates(StatesGroup):
 @router.message(F.text == "👥 Ученики")
 async def show_students(message: Message):
     """Показать список учеников"""
-    students = db.get_all_students()
+    students = await adb.get_all_students()
     
     if not students:
         await message.answer("📝 Список учеников пуст. Добавьте первого ученика командой /add_student")
@@ -74,7 +75,7 @@ async def add_student_class(message: Message, state: FSMContext):
     student_name = data['student_name']
     class_name = message.text
     
-    student_id = db.add_student(student_name, class_name)
+    student_id = await adb.add_student(student_name, class_name)
     
     if student_id:
         await message.answer(
@@ -92,7 +93,7 @@ async def add_student_class(message: Message, state: FSMContext):
 @router.message(F.text == "📚 Предметы")
 async def show_subjects(message: Message):
     """Показать список предметов"""
-    subjects = db.get_all_subjects(teacher_id=message.from_user.id)
+    subjects = await adb.get_all_subjects(teacher_id=message.from_user.id)
     
     if not subjects:
         await message.answer(
@@ -119,7 +120,7 @@ async def add_subject_start(message: Message, state: FSMContext):
 async def add_subject_name(message: Message, state: FSMContext):
     """Получение названия и сохранение предмета"""
     subject_name = message.text
-    subject_id = db.add_subject(subject_name, message.from_user.id)
+    subject_id = await adb.add_subject(subject_name, message.from_user.id)
     
     if subject_id:
         await message.answer(
@@ -137,7 +138,7 @@ async def add_subject_name(message: Message, state: FSMContext):
 @router.message(F.text == "✏️ Выставить оценки")
 async def start_grading(message: Message, state: FSMContext):
     """Начало процесса выставления оценок"""
-    students = db.get_all_students()
+    students = await adb.get_all_students()
     
     if not students:
         await message.answer("❌ Нет учеников в системе. Добавьте учеников командой /add_student")
@@ -153,13 +154,13 @@ async def select_student_for_grade(callback: CallbackQuery, state: FSMContext):
     student_id = int(callback.data.split("_")[1])
     await state.update_data(student_id=student_id)
     
-    subjects = db.get_all_subjects()
+    subjects = await adb.get_all_subjects()
     if not subjects:
         await callback.message.answer("❌ Нет предметов в системе. Добавьте предметы командой /add_subject")
         await state.clear()
         return
     
-    student = db.get_student(student_id)
+    student = await adb.get_student(student_id)
     await callback.message.edit_text(
         f"📚 Выберите предмет для ученика <b>{student['full_name']}</b>:",
         reply_markup=get_subjects_keyboard(subjects, prefix="grade_subject")
@@ -208,7 +209,7 @@ async def enter_grade_comment(message: Message, state: FSMContext):
     
     # Сохранение оценки
     today = datetime.now().strftime('%Y-%m-%d')
-    grade_id = db.add_grade(
+    grade_id = await adb.add_grade(
         student_id=student_id,
         subject_id=subject_id,
         grade=grade,
@@ -218,22 +219,10 @@ async def enter_grade_comment(message: Message, state: FSMContext):
     )
     
     if grade_id:
-        student = db.get_student(student_id)
-        subjects = db.get_all_subjects()
-        subject = next((s for s in subjects if s['subject_id'] == subject_id), None)
+        student = await adb.get_student(student_id)
+        subject = await adb.get_subject(subject_id)
         
-        # Отправка уведомлений
-        parent_links = db.get_parent_students(student_id)
-        parent_ids = [link['parent_id'] for link in parent_links]
-        
-        await notify_new_grade(
-            bot=message.bot,
-            student_id=student_id,
-            parent_ids=parent_ids,
-            subject_name=subject['name'],
-            grade=grade,
-            comment=comment
-        )
+        # Уведомления ученику и родителям уже в очереди notification_outbox
         
         await message.answer(
             f"✅ Оценка <b>{grade}</b> выставлена ученику <b>{student['full_name']}</b> по предмету <b>{subject['name']}</b>!",
@@ -250,7 +239,7 @@ async def enter_grade_comment(message: Message, state: FSMContext):
 @router.message(F.text == "📝 Создать ДЗ")
 async def create_homework_start(message: Message, state: FSMContext):
     """Начало создания домашнего задания"""
-    subjects = db.get_all_subjects(teacher_id=message.from_user.id)
+    subjects = await adb.get_all_subjects(teacher_id=message.from_user.id)
     
     if not subjects:
         await message.answer("❌ Нет предметов. Добавьте предметы командой /add_subject")
@@ -320,7 +309,7 @@ async def enter_homework_deadline(message: Message, state: FSMContext):
         return
     
     # Сохранение ДЗ
-    homework_id = db.add_homework(
+    homework_id = await adb.add_homework(
         subject_id=data['subject_id'],
         title=data['title'],
         description=data['description'],
@@ -330,17 +319,7 @@ async def enter_homework_deadline(message: Message, state: FSMContext):
     )
     
     if homework_id:
-        subjects = db.get_all_subjects()
-        subject = next((s for s in subjects if s['subject_id'] == data['subject_id']), None)
-        
-        # Отправка уведомлений
-        await notify_new_homework(
-            bot=message.bot,
-            subject_name=subject['name'],
-            title=data['title'],
-            deadline=message.text
-        )
-        
+        # Уведомления ученикам и родителям уже в очереди notification_outbox
         await message.answer(
             f"✅ Домашнее задание <b>{data['title']}</b> создано!",
             reply_markup=get_teacher_menu()
@@ -356,7 +335,7 @@ async def enter_homework_deadline(message: Message, state: FSMContext):
 @router.message(F.text == "✅ Одобрить родителей")
 async def show_pending_links(message: Message):
     """Показать pending запросы на связь"""
-    links = db.get_pending_links()
+    links = await adb.get_pending_links()
     
     if not links:
         await message.answer("📝 Нет ожидающих запросов", reply_markup=get_teacher_menu())
@@ -377,14 +356,14 @@ async def approve_link(callback: CallbackQuery):
     link_id = int(callback.data.split("_")[2])
     
     # Получение информации о связи
-    links = db.get_pending_links()
+    links = await adb.get_pending_links()
     link = next((l for l in links if l['link_id'] == link_id), None)
     
     if not link:
         await callback.answer("❌ Запрос не найден", show_alert=True)
         return
     
-    success = db.approve_link(link_id, callback.from_user.id)
+    success = await adb.approve_link(link_id, callback.from_user.id)
     
     if success:
         # Уведомление родителя
@@ -411,14 +390,14 @@ async def reject_link(callback: CallbackQuery):
     link_id = int(callback.data.split("_")[2])
     
     # Получение информации о связи
-    links = db.get_pending_links()
+    links = await adb.get_pending_links()
     link = next((l for l in links if l['link_id'] == link_id), None)
     
     if not link:
         await callback.answer("❌ Запрос не найден", show_alert=True)
         return
     
-    success = db.reject_link(link_id, callback.from_user.id)
+    success = await adb.reject_link(link_id, callback.from_user.id)
     
     if success:
         # Уведомление родителя
@@ -443,8 +422,8 @@ async def reject_link(callback: CallbackQuery):
 
 @router.message(F.text == "📊 Статистика")
 async def show_statistics(message: Message):
-    """Показать статистику класса"""
-    stats = get_class_statistics()
+    """Показать рейтинг учеников школы (из кеша рейтингов)"""
+    stats = await adb.run(leaderboards.get)
     text = format_class_statistics_message(stats)
     await message.answer(text, reply_markup=get_teacher_menu())
 
@@ -0,0 +1,80 @@
+"""
+Служебные команды для обслуживания базы данных
+
+Запуск:
+    python manage.py rebuild-aggregates   # пересоздать grade_aggregates и grade_histograms из grades
+    python manage.py report-cards --start 2024-09-01 --end 2024-10-31   # табели учеников за период
+    python manage.py export-grades --out grades.csv [--class 9А] [--start ...] [--end ...] [--format arrow]
+"""
+
+import argparse
+import logging
+
+from config import REPORTS_DIR, REPORT_WORKERS
+from database import db
+from utils.report_cards import generate_report_cards
+from utils.export import FORMATS, export_chunks
+
+
+def rebuild_aggregates(args):
+    """Пересоздание агрегатов оценок"""
+    count = db.rebuild_grade_aggregates()
+    print(f"✅ Агрегаты оценок пересозданы: {count} строк")
+
+
+def report_cards(args):
+    """Табели всех учеников за период"""
+    def progress(done: int, total: int):
+        print(f"   {done}/{total} учеников", flush=True)
+
+    summary = generate_report_cards(args.start, args.end, args.out, args.workers, progress)
+    print(f"✅ Табели {summary['students']} учеников сохранены в {args.out}")
+
+
+def export_grades(args):
+    """Выгрузка журнала оценок в файл"""
+    batches = db.iter_grades(args.class_name, args.start, args.end)
+    with open(args.out, 'wb') as file:
+        for chunk in export_chunks(batches, args.format):
+            file.write(chunk)
+    print(f"✅ Журнал выгружен в {args.out}")
+
+
+# Команда: (обработчик, описание, аргументы [(флаг, параметры add_argument)])
+COMMANDS = {
+    'rebuild-aggregates': (rebuild_aggregates, 'Пересоздать grade_aggregates и grade_histograms из таблицы grades', []),
+    'report-cards': (report_cards, 'Сформировать табели учеников за период (JSON и HTML)', [
+        ('--start', {'required': True, 'help': 'Первый день периода (YYYY-MM-DD)'}),
+        ('--end', {'required': True, 'help': 'Последний день периода (YYYY-MM-DD)'}),
+        ('--out', {'default': REPORTS_DIR, 'help': 'Папка для табелей'}),
+        ('--workers', {'type': int, 'default': REPORT_WORKERS, 'help': 'Число процессов'}),
+    ]),
+    'export-grades': (export_grades, 'Выгрузить журнал оценок (CSV или Arrow IPC)', [
+        ('--out', {'required': True, 'help': 'Файл выгрузки'}),
+        ('--format', {'choices': tuple(FORMATS), 'default': 'csv', 'help': 'Формат файла'}),
+        ('--class', {'dest': 'class_name', 'help': 'Только ученики класса'}),
+        ('--start', {'help': 'Первый день периода (YYYY-MM-DD)'}),
+        ('--end', {'help': 'Последний день периода (YYYY-MM-DD)'}),
+    ]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обслуживание базы данных школьного бота')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (handler, help_text, arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        for flag, options in arguments:
+            subparser.add_argument(flag, **options)
+        subparser.set_defaults(handler=handler)
+
+    args = parser.parse_args()
+    try:
+        args.handler(args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
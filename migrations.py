@@ -0,0 +1,429 @@
+"""
+Версионированные миграции схемы базы данных
+
+Номер применённой миграции хранится в PRAGMA user_version. Каждая миграция
+применяется ровно один раз в собственной транзакции; для актуальной базы
+проверка при старте сводится к одному чтению PRAGMA user_version.
+
+Новая миграция добавляется в конец списка MIGRATIONS со следующим номером.
+Уже выпущенные миграции не изменяются.
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+from utils.trends import advance_trend
+
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-запрос или функция, получающая курсор
+Step = Union[str, Callable[[sqlite3.Cursor], None]]
+
+
+def add_column(table: str, column: str, definition: str) -> Callable[[sqlite3.Cursor], None]:
+    """Шаг миграции: добавить колонку, если её ещё нет
+
+    Базы, созданные до появления миграций, могли уже получить колонку
+    через ALTER TABLE в старом init_db.
+    """
+    def step(cursor: sqlite3.Cursor):
+        columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+
+# Исходная схема. IF NOT EXISTS нужен для баз, созданных до появления миграций
+_BASE_TABLES = [
+    # Таблица пользователей
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT NOT NULL,
+        role TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Таблица учеников
+    '''
+    CREATE TABLE IF NOT EXISTS students (
+        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        full_name TEXT NOT NULL,
+        class_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    ''',
+    # Таблица связей родитель-ученик
+    '''
+    CREATE TABLE IF NOT EXISTS parent_student_links (
+        link_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        parent_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        approved_at TIMESTAMP,
+        approved_by INTEGER,
+        FOREIGN KEY (parent_id) REFERENCES users(user_id),
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        FOREIGN KEY (approved_by) REFERENCES users(user_id)
+    )
+    ''',
+    # Таблица предметов
+    '''
+    CREATE TABLE IF NOT EXISTS subjects (
+        subject_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        teacher_id INTEGER NOT NULL,
+        max_grade INTEGER DEFAULT 10,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (teacher_id) REFERENCES users(user_id)
+    )
+    ''',
+    # Таблица оценок
+    '''
+    CREATE TABLE IF NOT EXISTS grades (
+        grade_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        grade INTEGER NOT NULL,
+        date DATE NOT NULL,
+        comment TEXT,
+        teacher_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (student_id) REFERENCES students(student_id),
+        FOREIGN KEY (subject_id) REFERENCES subjects(subject_id),
+        FOREIGN KEY (teacher_id) REFERENCES users(user_id)
+    )
+    ''',
+    # Таблица домашних заданий
+    '''
+    CREATE TABLE IF NOT EXISTS homework (
+        homework_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        file_id TEXT,
+        deadline TIMESTAMP,
+        created_by INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (subject_id) REFERENCES subjects(subject_id),
+        FOREIGN KEY (created_by) REFERENCES users(user_id)
+    )
+    ''',
+    # Таблица классов (9А, 10Б и т.д.)
+    '''
+    CREATE TABLE IF NOT EXISTS classes (
+        class_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Таблица назначений учителей (кто какой предмет в каком классе ведет)
+    '''
+    CREATE TABLE IF NOT EXISTS teaching_assignments (
+        assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id INTEGER NOT NULL,
+        class_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(teacher_id, class_id, subject_id),
+        FOREIGN KEY (teacher_id) REFERENCES users(user_id),
+        FOREIGN KEY (class_id) REFERENCES classes(class_id),
+        FOREIGN KEY (subject_id) REFERENCES subjects(subject_id)
+    )
+    ''',
+    # Таблица пригласительных кодов
+    '''
+    CREATE TABLE IF NOT EXISTS invite_codes (
+        code_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT NOT NULL UNIQUE,
+        role TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        target_data TEXT,
+        is_used BOOLEAN DEFAULT 0,
+        used_by INTEGER,
+        created_by INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        used_at TIMESTAMP,
+        FOREIGN KEY (used_by) REFERENCES users(user_id),
+        FOREIGN KEY (created_by) REFERENCES users(user_id)
+    )
+    ''',
+]
+
+# Вторичные индексы: каждый обслуживает конкретные запросы Database
+_INDEXES = [
+    # get_student_grades, delete_student: WHERE student_id = ? ORDER BY date DESC
+    'CREATE INDEX IF NOT EXISTS idx_grades_student_date ON grades(student_id, date)',
+    # get_grades_by_subject: WHERE student_id = ? AND subject_id = ? ORDER BY date DESC
+    'CREATE INDEX IF NOT EXISTS idx_grades_student_subject_date ON grades(student_id, subject_id, date)',
+    # get_parent_students: WHERE parent_id = ? AND status = 'approved' (покрывающий)
+    'CREATE INDEX IF NOT EXISTS idx_links_parent_status ON parent_student_links(parent_id, status, student_id)',
+    # delete_student: WHERE student_id = ?
+    'CREATE INDEX IF NOT EXISTS idx_links_student ON parent_student_links(student_id)',
+    # get_pending_links: WHERE status = 'pending' ORDER BY requested_at DESC
+    'CREATE INDEX IF NOT EXISTS idx_links_status_requested ON parent_student_links(status, requested_at)',
+    # get_student_by_user_id
+    'CREATE INDEX IF NOT EXISTS idx_students_user ON students(user_id)',
+    # get_students_by_class_name, get_classes_with_student_count, get_all_students (порядок)
+    'CREATE INDEX IF NOT EXISTS idx_students_class_name ON students(class_name, full_name)',
+    # get_all_homework: WHERE subject_id = ? ORDER BY deadline
+    'CREATE INDEX IF NOT EXISTS idx_homework_subject_deadline ON homework(subject_id, deadline)',
+    # get_all_homework без фильтра: ORDER BY deadline
+    'CREATE INDEX IF NOT EXISTS idx_homework_deadline ON homework(deadline)',
+    # add_subject: WHERE LOWER(name) = LOWER(?) (индекс по выражению)
+    'CREATE INDEX IF NOT EXISTS idx_subjects_lower_name ON subjects(LOWER(name))',
+    # get_all_subjects(teacher_id): WHERE teacher_id = ? ORDER BY name
+    'CREATE INDEX IF NOT EXISTS idx_subjects_teacher_name ON subjects(teacher_id, name)',
+    # get_all_invites: WHERE is_used = 0 ORDER BY created_at DESC
+    'CREATE INDEX IF NOT EXISTS idx_invites_used_created ON invite_codes(is_used, created_at)',
+    # get_all_teachers: WHERE role = 'teacher' ORDER BY full_name
+    'CREATE INDEX IF NOT EXISTS idx_users_role_name ON users(role, full_name)',
+]
+
+def fill_grade_aggregates(cursor: sqlite3.Cursor, where: str = '', params: tuple = ()):
+    """Заполнение grade_aggregates из grades (where - фильтр по grades)
+
+    Последняя оценка - с наибольшими (date, grade_id), как в get_student_grades.
+    """
+    cursor.execute(f'''
+        INSERT INTO grade_aggregates
+            (student_id, subject_id, grade_sum, grade_count, min_grade, max_grade,
+             last_grade, last_date, last_grade_id)
+        SELECT a.student_id, a.subject_id, a.grade_sum, a.grade_count, a.min_grade, a.max_grade,
+               l.grade, l.date, l.grade_id
+        FROM (
+            SELECT student_id, subject_id, SUM(grade) AS grade_sum, COUNT(*) AS grade_count,
+                   MIN(grade) AS min_grade, MAX(grade) AS max_grade,
+                   (SELECT last.grade_id FROM grades last
+                    WHERE last.student_id = g.student_id AND last.subject_id = g.subject_id
+                    ORDER BY last.date DESC, last.grade_id DESC LIMIT 1) AS last_grade_id
+            FROM grades g
+            {where}
+            GROUP BY student_id, subject_id
+        ) a
+        JOIN grades l ON l.grade_id = a.last_grade_id
+    ''', params)
+
+
+_GRADE_AGGREGATES = [
+    '''
+    CREATE TABLE IF NOT EXISTS grade_aggregates (
+        student_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        grade_sum INTEGER NOT NULL,
+        grade_count INTEGER NOT NULL,
+        min_grade INTEGER NOT NULL,
+        max_grade INTEGER NOT NULL,
+        last_grade INTEGER,
+        last_date DATE,
+        last_grade_id INTEGER,
+        PRIMARY KEY (student_id, subject_id)
+    ) WITHOUT ROWID
+    ''',
+    fill_grade_aggregates,
+]
+
+def fill_grade_histograms(cursor: sqlite3.Cursor):
+    """Заполнение grade_histograms из grades
+
+    scope - название класса ученика или '' для всей школы.
+    """
+    cursor.execute('''
+        INSERT INTO grade_histograms (scope, subject_id, grade, grade_count)
+        SELECT '', subject_id, grade, COUNT(*) FROM grades GROUP BY subject_id, grade
+    ''')
+    cursor.execute('''
+        INSERT INTO grade_histograms (scope, subject_id, grade, grade_count)
+        SELECT st.class_name, g.subject_id, g.grade, COUNT(*)
+        FROM grades g
+        JOIN students st ON st.student_id = g.student_id
+        WHERE st.class_name IS NOT NULL
+        GROUP BY st.class_name, g.subject_id, g.grade
+    ''')
+
+
+_GRADE_HISTOGRAMS = [
+    '''
+    CREATE TABLE IF NOT EXISTS grade_histograms (
+        scope TEXT NOT NULL,
+        subject_id INTEGER NOT NULL,
+        grade INTEGER NOT NULL,
+        grade_count INTEGER NOT NULL,
+        PRIMARY KEY (scope, subject_id, grade)
+    ) WITHOUT ROWID
+    ''',
+    fill_grade_histograms,
+]
+
+def fill_grade_trends(cursor: sqlite3.Cursor):
+    """Заполнение grade_trends проигрыванием оценок каждой пары (ученик, предмет) по порядку
+
+    Оповещения при этом не отправляются: восстанавливается только состояние.
+    """
+    rows = cursor.execute('''
+        SELECT student_id, subject_id, grade, date FROM grades
+        ORDER BY student_id, subject_id, date, grade_id
+    ''')
+    trends, key, state, grade_sum, grade_count = [], None, None, 0, 0
+    for student_id, subject_id, grade, day in rows:
+        if (student_id, subject_id) != key:
+            if key is not None:
+                trends.append((*key, state))
+            key, state, grade_sum, grade_count = (student_id, subject_id), None, 0, 0
+        grade_sum += grade
+        grade_count += 1
+        state, _ = advance_trend(state, grade, day, grade_sum / grade_count)
+    if key is not None:
+        trends.append((*key, state))
+    cursor.executemany(
+        '''INSERT INTO grade_trends (student_id, subject_id, ewma, window_days, window_count, at_risk)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        [(s, subj, t['ewma'], json.dumps(t['window_days']), sum(t['window_days'].values()), t['at_risk'])
+         for s, subj, t in trends]
+    )
+
+
+# Первая версия grade_trends (окно с фиксированным началом). Таблица
+# пересоздаётся и заполняется миграцией 15, поэтому здесь не заполняется
+_GRADE_TRENDS = [
+    '''
+    CREATE TABLE IF NOT EXISTS grade_trends (
+        student_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        ewma REAL NOT NULL,
+        window_start DATE NOT NULL,
+        window_count INTEGER NOT NULL,
+        at_risk BOOLEAN NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, subject_id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# Скользящее окно: window_days - JSON {'ГГГГ-ММ-ДД': число оценок} за
+# последние AT_RISK_WINDOW_DAYS дней, window_count - их сумма
+_GRADE_TRENDS_SLIDING = [
+    'DROP TABLE IF EXISTS grade_trends',
+    '''
+    CREATE TABLE grade_trends (
+        student_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        ewma REAL NOT NULL,
+        window_days TEXT NOT NULL,
+        window_count INTEGER NOT NULL,
+        at_risk BOOLEAN NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, subject_id)
+    ) WITHOUT ROWID
+    ''',
+    fill_grade_trends,
+]
+
+# Исходящие уведомления: строка на получателя, пишется в транзакции оценки
+# или ДЗ, воркер (utils/outbox.py) отправляет её и помечает доставленной
+_NOTIFICATION_OUTBOX = [
+    '''
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        delivered_at TIMESTAMP
+    )
+    ''',
+    # claim_notifications: WHERE status IN (...) AND available_at <= ?
+    'CREATE INDEX IF NOT EXISTS idx_outbox_status_available ON notification_outbox(status, available_at)',
+]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Базовые таблицы', _BASE_TABLES),
+    (2, 'Колонка invite_codes.target_data', [add_column('invite_codes', 'target_data', 'TEXT')]),
+    (3, 'Колонка users.is_admin', [add_column('users', 'is_admin', 'BOOLEAN DEFAULT 0')]),
+    (4, 'Индексы для частых запросов', _INDEXES),
+    (5, 'Индексы постраничной выдачи', [
+        # get_all_users: ORDER BY full_name, user_id LIMIT ?
+        'CREATE INDEX IF NOT EXISTS idx_users_full_name ON users(full_name)',
+        # get_all_invites(include_used=True): ORDER BY created_at DESC, code_id DESC LIMIT ?
+        'CREATE INDEX IF NOT EXISTS idx_invites_created ON invite_codes(created_at)',
+    ]),
+    (6, 'Агрегаты оценок по ученику и предмету', _GRADE_AGGREGATES),
+    (7, 'Гистограммы оценок по классу и предмету', _GRADE_HISTOGRAMS),
+    (8, 'Индекс агрегатов по предмету', [
+        # get_subject_rankings: WHERE subject_id = ?
+        'CREATE INDEX IF NOT EXISTS idx_grade_aggregates_subject ON grade_aggregates(subject_id)',
+    ]),
+    (9, 'Скользящие средние оценок для оповещений о зоне риска', _GRADE_TRENDS),
+    (10, 'Индекс назначений учителей по предмету', [
+        # get_notification_recipients: WHERE ta.subject_id = ?
+        'CREATE INDEX IF NOT EXISTS idx_assignments_subject ON teaching_assignments(subject_id, class_id)',
+    ]),
+    (11, 'Очередь исходящих уведомлений', _NOTIFICATION_OUTBOX),
+    (12, 'Индекс очереди уведомлений по получателю', [
+        # claim_notifications: накопленные уведомления получателя WHERE chat_id IN (...) AND kind = ?
+        'CREATE INDEX IF NOT EXISTS idx_outbox_chat_kind ON notification_outbox(chat_id, kind, status)',
+    ]),
+    (13, 'Отметка об отправленном напоминании о дедлайне', [
+        add_column('homework', 'reminder_sent_at', 'TIMESTAMP'),
+        # get_pending_reminders: WHERE reminder_sent_at IS NULL AND deadline > ?
+        'CREATE INDEX IF NOT EXISTS idx_homework_pending_reminders ON homework(deadline) WHERE reminder_sent_at IS NULL',
+    ]),
+    (14, 'Недоступные получатели уведомлений', [
+        '''
+        CREATE TABLE IF NOT EXISTS notification_suppressions (
+            chat_id INTEGER PRIMARY KEY,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (15, 'Скользящее окно оценок для оповещений о зоне риска', _GRADE_TRENDS_SLIDING),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы базы"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применение недостающих миграций; возвращает итоговую версию схемы"""
+    version = get_schema_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        # BEGIN IMMEDIATE сразу берёт блокировку записи, поэтому два процесса
+        # не применят одну миграцию дважды
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= number:
+                conn.rollback()
+                continue
+            cursor = conn.cursor()
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migration {number} ({description}) failed")
+            raise
+        logger.info(f"Applied migration {number}: {description}")
+
+    return get_schema_version(conn)
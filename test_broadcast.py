@@ -0,0 +1,68 @@
+"""
+Проверка рассылки сообщений
+
+Рассылка через тестового бота: частота отправки не превышает лимит
+token bucket, RetryAfter приостанавливает рассылку и сообщение
+доставляется повторно, заблокировавшие бота получатели попадают в отчёт.
+"""
+
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from utils.broadcast import Broadcaster
+
+
+class FakeBot:
+    """Бот, запоминающий время отправки и отвечающий заданными ошибками"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.errors.get(chat_id)
+        if isinstance(error, list):
+            error = error.pop(0) if error else None
+        if error is not None:
+            raise error
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def test_rate_limit():
+    """Отправка не быстрее rate сообщений в секунду после исчерпания запаса"""
+    bot = FakeBot()
+    broadcaster = Broadcaster(rate=100, burst=5, concurrency=4, max_retries=1)
+    report = asyncio.run(broadcaster.broadcast(bot, list(range(1, 56)) + [1, 2, None], 'text'))
+
+    assert report['total'] == 55 and report['sent'] == 55, report
+    assert report['failed'] == report['blocked'] == 0
+    assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(1, 56))
+    # 5 сообщений сразу, ещё 50 - не быстрее 100 в секунду
+    assert report['duration'] >= 0.45, report
+    print(f"✅ 55 сообщений за {report['duration']} с")
+
+
+def test_failures():
+    """RetryAfter повторяется, недоступные получатели отделяются от ошибок"""
+    bot = FakeBot({
+        1: [TelegramRetryAfter(None, 'Flood control exceeded', 1)],
+        2: TelegramForbiddenError(None, 'Forbidden: bot was blocked by the user'),
+        3: TelegramBadRequest(None, 'Bad Request: chat not found'),
+        4: TelegramBadRequest(None, 'Bad Request: message is too long'),
+    })
+    broadcaster = Broadcaster(rate=1000, burst=10, concurrency=2, max_retries=2)
+    started = time.monotonic()
+    report = asyncio.run(broadcaster.broadcast(bot, [1, 2, 3, 4, 5], 'text'))
+
+    assert report['sent'] == 2 and report['failed'] == 1 and report['blocked'] == 2, report
+    assert sorted(report['blocked_ids']) == [2, 3]
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 5]
+    assert time.monotonic() - started >= 1, "RetryAfter должен приостановить рассылку"
+    print("✅ RetryAfter и недоступные получатели обработаны")
+
+
+if __name__ == "__main__":
+    test_rate_limit()
+    test_failures()
@@ -0,0 +1,203 @@
+"""
+Проверка кешей Database
+
+Повторные get_user/is_admin обслуживаются из кеша, а методы, меняющие
+пользователя, сразу сбрасывают его запись. Справочник предметов, классов
+и назначений перестраивается только после их изменения, статистика
+ученика - после записей его оценок или удаления предмета. Рейтинги
+сбрасываются только записями, затрагивающими их учеников или предметы.
+"""
+
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from config import ROLE_TEACHER, ROLE_PARENT, ROLE_ADMIN
+from database import Database
+from utils import statistics
+from utils.leaderboard import Leaderboards
+
+
+def test_user_cache():
+    print("🗃️ Testing user cache\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'cache.db')
+        user_id = 1001
+
+        # Отсутствующий пользователь тоже кешируется
+        assert database.get_user(user_id) is None
+        assert database.get_user(user_id) is None
+        assert database.get_cache_stats()['user_cache']['hits'] == 1
+
+        database.add_user(user_id, 'user', 'Пользователь', ROLE_PARENT)
+        assert database.get_user(user_id)['role'] == ROLE_PARENT
+
+        database.update_user_role(user_id, ROLE_TEACHER)
+        assert database.get_user(user_id)['role'] == ROLE_TEACHER
+
+        assert not database.is_admin(user_id)
+        database.make_admin(user_id)
+        assert database.is_admin(user_id)
+        database.remove_admin(user_id)
+        assert not database.is_admin(user_id)
+
+        code = database.create_invite(ROLE_ADMIN, 'Админ', user_id)
+        assert database.get_user(1002) is None
+        database.use_invite_code(code, 1002)
+        assert database.is_admin(1002)
+
+        # Изменение возвращённого словаря не портит кеш
+        database.get_user(user_id)['role'] = ROLE_ADMIN
+        assert database.get_user(user_id)['role'] == ROLE_TEACHER
+
+        stats = database.get_cache_stats()['user_cache']
+        print(f"   hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']}")
+        database.close()
+
+    print("\n✅ User cache is invalidated on every user change")
+
+
+def test_catalog():
+    print("📚 Testing catalog of subjects, classes and assignments\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'catalog.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+
+        math_id = database.add_subject('Математика', teacher_id)
+        physics_id = database.add_subject('Физика', teacher_id)
+        class_id = database.create_class('9А')
+        assert database.get_subject(math_id)['name'] == 'Математика'
+        assert [s['name'] for s in database.get_all_subjects(teacher_id)] == ['Математика', 'Физика']
+
+        # Чтения не перестраивают справочник
+        catalog = database._get_catalog()
+        version = database.catalog_version
+        database.get_all_classes()
+        database.get_subject(physics_id)
+        assert database._get_catalog() is catalog
+
+        assignment_id = database.assign_teacher(teacher_id, class_id, physics_id)
+        assert database.catalog_version == version + 1
+        assert database.get_teacher_assignments(teacher_id)[0]['subject_name'] == 'Физика'
+
+        database.delete_subject(physics_id)
+        assert database.get_subject(physics_id) is None
+        assert database.get_teacher_assignments(teacher_id) == []
+
+        database.delete_assignment(assignment_id)
+        database.delete_class(class_id)
+        assert database.get_all_classes() == []
+        database.close()
+
+    print("✅ Catalog is rebuilt only after catalog changes")
+
+
+def test_stats_cache():
+    print("📈 Testing student statistics cache\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'stats.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        math_id = database.add_subject('Математика', teacher_id)
+        physics_id = database.add_subject('Физика', teacher_id)
+        first, second = database.add_student('Первый', '9А'), database.add_student('Второй', '9А')
+        grade_id = database.add_grade(first, math_id, 5, teacher_id, '2024-09-01')
+        database.add_grade(second, physics_id, 7, teacher_id, '2024-09-01')
+
+        with mock.patch.object(statistics, 'db', database):
+            def cached(student_id):
+                hits = database.get_cache_stats()['stats_cache']['hits']
+                stats = statistics.get_student_statistics(student_id)
+                return stats, database.get_cache_stats()['stats_cache']['hits'] > hits
+
+            assert not cached(first)[1] and not cached(second)[1]
+            assert cached(first)[1] and cached(second)[1]
+
+            # Оценки первого ученика сбрасывают только его запись
+            database.add_grade(first, physics_id, 9, teacher_id, '2024-09-02')
+            stats, hit = cached(first)
+            assert not hit and stats['total_grades'] == 2
+            assert cached(second)[1]
+            database.update_grade(grade_id, 10)
+            assert cached(first)[0]['subject_averages']['Математика']['average'] == 10.0
+
+            # Пакетный запрос дочитывает только отсутствующих в кеше
+            assert statistics.get_students_statistics([first, second]) == {
+                first: cached(first)[0], second: cached(second)[0]
+            }
+
+            database.delete_subject(physics_id)
+            stats, hit = cached(second)
+            assert not hit and stats['total_grades'] == 0
+            database.delete_student(first)
+            assert cached(first)[0]['total_grades'] == 0
+
+        stats = database.get_cache_stats()['stats_cache']
+        print(f"   hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']}")
+        database.close()
+
+    print("✅ Statistics cache is invalidated only by the student's writes")
+
+
+def test_leaderboards():
+    print("🏆 Testing cached leaderboards\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'leaderboards.db')
+        boards = Leaderboards(database, size=3)
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        math_id = database.add_subject('Математика', teacher_id)
+        physics_id = database.add_subject('Физика', teacher_id)
+        class_a = [database.add_student(f'Ученик А{i}', '9А') for i in range(4)]
+        class_b = [database.add_student(f'Ученик Б{i}', '9Б') for i in range(4)]
+        for i, student_id in enumerate(class_a + class_b):
+            database.add_grade(student_id, math_id, i % 5 + 5, teacher_id, '2024-09-01')
+            database.add_grade(student_id, physics_id, 10 - i % 4, teacher_id, '2024-09-02')
+
+        def expected(class_name):
+            with mock.patch.object(statistics, 'db', database):
+                stats = statistics.get_class_statistics(class_name)
+            return stats['total_students'], [r['student_id'] for r in stats['student_rankings'][:3]]
+
+        def ids(board):
+            return board['total_students'], [r['student_id'] for r in board['student_rankings']]
+
+        assert ids(boards.get()) == expected(None)
+        assert ids(boards.get('class', '9А')) == expected('9А')
+        assert ids(boards.get('class', '9Б')) == expected('9Б')
+        assert boards.get('subject', math_id)['student_rankings'][0]['average'] == 9.0
+        boards.get('subject', physics_id)
+        misses = boards.misses
+
+        # Оценка ученика 9А сбрасывает рейтинги школы, 9А и математики
+        database.add_grade(class_a[0], math_id, 10, teacher_id, '2024-09-03')
+        boards.get('class', '9Б')
+        boards.get('subject', physics_id)
+        assert boards.misses == misses
+        assert ids(boards.get('class', '9А')) == expected('9А')
+        assert ids(boards.get()) == expected(None)
+        boards.get('subject', math_id)
+        assert boards.misses == misses + 3
+
+        # Новый ученик класса и удаление предмета
+        database.add_student('Новенький', '9Б')
+        assert ids(boards.get('class', '9Б')) == expected('9Б')
+        database.delete_subject(physics_id)
+        assert ids(boards.get('class', '9Б')) == expected('9Б')
+
+        print(f"   hit_rate={boards.stats()['hit_rate']}")
+        database.close()
+
+    print("✅ Leaderboards are rebuilt only after relevant writes")
+
+
+if __name__ == "__main__":
+    test_user_cache()
+    test_catalog()
+    test_stats_cache()
+    test_leaderboards()
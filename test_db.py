@@ -75,6 +75,16 @@ def test_database():
     
     parent_children = db.get_parent_students(parent_id)
     print(f"   Parent has {len(parent_children)} linked children")
+
+    # Получатели уведомлений: ученик 9А с аккаунтом и его родитель
+    recipients = db.get_notification_recipients(class_name="9А")
+    assert sorted(recipients) == sorted([student_user_id, parent_id]), recipients
+    assert db.get_notification_recipients(class_name="9Б") == []
+    # Физика ведётся только в 9Б, у математики назначений нет - вся школа
+    db.assign_teacher(teacher_id, db.create_class("9Б"), physics_id)
+    assert db.get_notification_recipients(subject_id=physics_id) == []
+    assert sorted(db.get_notification_recipients(subject_id=math_id)) == sorted(recipients)
+    print(f"✅ Notification recipients in 9А: {len(recipients)}")
     
     # Test 6: Add homework
     print("\n6️⃣ Testing homework management...")
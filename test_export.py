@@ -0,0 +1,88 @@
+"""
+Проверка выгрузки журнала оценок
+
+CSV, собранный из пачек Database.iter_grades, должен содержать те же
+оценки, что и списки оценок учеников, с учётом фильтров по классу и
+периоду; поток Arrow IPC, прочитанный обратно, - те же строки.
+"""
+
+import csv
+import io
+import tempfile
+from pathlib import Path
+
+import pyarrow as pa
+
+from config import ROLE_TEACHER
+from database import Database, EXPORT_COLUMNS
+from utils import export
+
+
+def expected_rows(database: Database, class_name=None, start=None, end=None) -> list:
+    """Строки выгрузки, собранные по спискам оценок учеников"""
+    rows = []
+    for student in database.get_all_students():
+        if class_name is not None and student['class_name'] != class_name:
+            continue
+        for grade in database.get_student_grades(student['student_id']):
+            if (start and grade['date'] < start) or (end and grade['date'] > end):
+                continue
+            rows.append((grade['grade_id'], grade['date'], student['class_name'], student['student_id'],
+                         student['full_name'], grade['subject_id'], grade['subject_name'], grade['grade'],
+                         grade['teacher_id'], grade['comment']))
+    return sorted(rows)
+
+
+def read_csv(chunks) -> list:
+    """Строки CSV-выгрузки с типами, как в базе"""
+    text = b''.join(chunks).decode('utf-8-sig')
+    reader = csv.reader(io.StringIO(text))
+    assert tuple(next(reader)) == EXPORT_COLUMNS
+    integer = {'grade_id', 'student_id', 'subject_id', 'grade', 'teacher_id'}
+    return sorted(
+        tuple(int(v) if name in integer else (v or None) for name, v in zip(EXPORT_COLUMNS, row))
+        for row in reader
+    )
+
+
+def test_export():
+    print("📤 Testing gradebook export\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'export.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        subject_id = database.add_subject('Литература', teacher_id)
+        student_ids = [database.add_student(f'Ученик "{i}", запятая', ['9А', '9Б', None][i % 3]) for i in range(6)]
+        for i in range(50):
+            database.add_grade(student_ids[i % 6], subject_id, i % 10 + 1, teacher_id,
+                               f'2024-09-{i % 28 + 1:02d}', 'Комментарий\nв две строки' if i % 7 == 0 else None)
+
+        for filters in ({}, {'class_name': '9А'}, {'start': '2024-09-05', 'end': '2024-09-20'}):
+            chunks = list(export.csv_chunks(database.iter_grades(batch_size=7, **filters)))
+            expected = expected_rows(database, **filters)
+            assert read_csv(chunks) == expected, f"CSV differs for {filters}"
+            # Заголовок и по куску на каждую пачку
+            assert len(chunks) == 1 + -(-len(expected) // 7)
+            print(f"   ✅ csv {filters or 'whole school'} ({len(expected)} rows)")
+
+        for filters in ({}, {'class_name': '9А'}):
+            chunks = list(export.export_chunks(database.iter_grades(batch_size=7, **filters), 'arrow'))
+            reader = pa.ipc.open_stream(b''.join(chunks))
+            assert reader.schema.names == list(EXPORT_COLUMNS)
+            batches = list(reader)
+            expected = expected_rows(database, **filters)
+            # По RecordBatch на каждую пачку
+            assert [b.num_rows for b in batches][:-1] == [7] * (len(batches) - 1) and len(batches) == -(-len(expected) // 7)
+            table = pa.Table.from_batches(batches)
+            assert sorted(zip(*[table.column(name).to_pylist() for name in EXPORT_COLUMNS])) == expected, \
+                f"Arrow differs for {filters}"
+            print(f"   ✅ arrow {filters or 'whole school'} ({len(expected)} rows)")
+
+        database.close()
+
+    print("\n✅ Exports match grade lists")
+
+
+if __name__ == "__main__":
+    test_export()
@@ -0,0 +1,195 @@
+"""
+Проверка очереди исходящих уведомлений
+
+Оценка и домашнее задание ставят уведомления в notification_outbox той же
+транзакцией; воркер доставляет их через тестового бота, неудачные
+отправки откладывает с задержкой, а строки с истёкшей арендой захватывает
+повторно. Оценки, накопленные за окно, приходят получателю одним
+сообщением; заблокировавшим бота уведомления больше не отправляются.
+"""
+
+import asyncio
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config import ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT
+from database import AsyncDatabase, Database
+from utils.outbox import OutboxWorker
+
+TEACHER_ID = 1001
+PARENT_ID = 1002
+STUDENT_USER_ID = 1003
+
+
+class FakeBot:
+    """Бот, запоминающий отправленные сообщения; failing - получатели с ошибкой, blocked - заблокировавшие бота"""
+
+    def __init__(self, failing=(), blocked=()):
+        self.failing = set(failing)
+        self.blocked = set(blocked)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.failing:
+            raise TelegramBadRequest(None, 'Bad Request: message is too long')
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(None, 'Forbidden: bot was blocked by the user')
+        self.sent.append((chat_id, text))
+
+
+def outbox_rows(database: Database) -> list:
+    with database.connection() as conn:
+        return [dict(row) for row in conn.execute('SELECT * FROM notification_outbox ORDER BY outbox_id')]
+
+
+def make_available(database: Database, where: str = "status = 'pending'"):
+    """Окно накопления и задержки повтора истекли"""
+    with database.connection() as conn:
+        conn.execute(f"UPDATE notification_outbox SET available_at = datetime('now', '-1 second') WHERE {where}")
+        conn.commit()
+
+
+def prepare(database: Database) -> dict:
+    database.add_user(TEACHER_ID, 'teacher', 'Учитель', ROLE_TEACHER)
+    database.add_user(PARENT_ID, 'parent', 'Родитель', ROLE_PARENT)
+    database.add_user(STUDENT_USER_ID, 'student', 'Ученик', ROLE_STUDENT)
+    student_id = database.add_student('Ученик', '9А', STUDENT_USER_ID)
+    database.add_student('Ученик без аккаунта', '9А')
+    database.approve_link(database.create_link_request(PARENT_ID, student_id), TEACHER_ID)
+    return {'student_id': student_id, 'subject_id': database.add_subject('Математика', TEACHER_ID)}
+
+
+def test_outbox():
+    print("📬 Testing notification outbox\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'outbox.db')
+        async_db = AsyncDatabase(database)
+        ids = prepare(database)
+        today = datetime.now().strftime('%Y-%m-%d')
+
+        # Оценка и ДЗ: строки на ученика и родителя в той же транзакции
+        database.add_grade(ids['student_id'], ids['subject_id'], 9, TEACHER_ID, today, 'Молодец')
+        database.add_homework(ids['subject_id'], 'Задачи 1-5', 'Описание', TEACHER_ID, f'{today} 18:00:00')
+        rows = outbox_rows(database)
+        assert sorted((r['kind'], r['chat_id']) for r in rows) == [
+            ('new_grade', PARENT_ID), ('new_grade', STUDENT_USER_ID),
+            ('new_homework', PARENT_ID), ('new_homework', STUDENT_USER_ID),
+        ], rows
+        assert all(r['status'] == 'pending' for r in rows)
+        # Оценки ждут окно накопления, ДЗ доступно сразу
+        with database.connection() as conn:
+            waiting = conn.execute("SELECT kind FROM notification_outbox WHERE available_at > datetime('now')")
+            assert [row[0] for row in waiting] == ['new_grade', 'new_grade']
+        make_available(database)
+
+        # Оценка, не прошедшая транзакцию, уведомлений не создаёт
+        assert database.add_grade(10**9, None, 5, TEACHER_ID, today) is None
+        assert len(outbox_rows(database)) == len(rows)
+
+        # Доставка: родителю не удаётся отправить, ученику - удаётся
+        bot = FakeBot(failing={PARENT_ID})
+        worker = OutboxWorker(bot, async_db, max_attempts=2)
+        assert asyncio.run(worker.process_batch()) == 4
+        assert sorted(chat_id for chat_id, _ in bot.sent) == [STUDENT_USER_ID, STUDENT_USER_ID]
+        assert any('Молодец' in text for _, text in bot.sent)
+        statuses = {(r['kind'], r['chat_id']): r['status'] for r in outbox_rows(database)}
+        assert statuses[('new_grade', STUDENT_USER_ID)] == 'delivered'
+        assert statuses[('new_grade', PARENT_ID)] == 'pending'
+        # Повтор отложен: сейчас захватывать нечего
+        assert asyncio.run(worker.process_batch()) == 0
+        print("✅ Delivered notifications marked, failed ones postponed")
+
+        # Истёкшая аренда: строки, захваченные упавшим процессом, захватываются снова
+        make_available(database)
+        claimed = database.claim_notifications(10, 0)
+        assert [n['chat_id'] for n in claimed] == [PARENT_ID, PARENT_ID]
+        assert all(n['attempts'] == 2 for n in claimed)
+
+        # Попытки исчерпаны - отказ
+        assert asyncio.run(worker.process_batch()) == 2
+        assert database.get_outbox_stats() == {'delivered': 2, 'failed': 2}
+        print("✅ Expired leases reclaimed, attempts limited")
+
+        async_db.close()
+
+
+def test_coalescing():
+    print("\n📚 Testing grade notification coalescing\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'outbox.db')
+        async_db = AsyncDatabase(database)
+        ids = prepare(database)
+        today = datetime.now().strftime('%Y-%m-%d')
+        subjects = [ids['subject_id'], database.add_subject('Физика', TEACHER_ID), database.add_subject('Химия', TEACHER_ID)]
+
+        # Урок: три оценки подряд, окно первой закончилось
+        for grade, subject_id in zip((7, 8, 9), subjects):
+            database.add_grade(ids['student_id'], subject_id, grade, TEACHER_ID, today)
+        make_available(database, 'outbox_id IN (1, 2)')
+
+        bot = FakeBot()
+        assert asyncio.run(OutboxWorker(bot, async_db).process_batch()) == 6
+        assert sorted(chat_id for chat_id, _ in bot.sent) == [PARENT_ID, STUDENT_USER_ID]
+        for _, text in bot.sent:
+            assert 'Новые оценки (3)' in text and 'Физика: <b>8</b>' in text, text
+        assert database.get_outbox_stats() == {'delivered': 6}
+        print("✅ 6 notifications sent as 2 messages")
+
+        async_db.close()
+
+
+def test_suppressions():
+    print("\n🚫 Testing notification suppressions\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'outbox.db')
+        async_db = AsyncDatabase(database)
+        ids = prepare(database)
+        today = datetime.now().strftime('%Y-%m-%d')
+
+        # Два ДЗ в очереди; родитель заблокировал бота
+        database.add_homework(ids['subject_id'], 'ДЗ 1', '', TEACHER_ID)
+        database.add_homework(ids['subject_id'], 'ДЗ 2', '', TEACHER_ID)
+        bot = FakeBot(blocked={PARENT_ID})
+        worker = OutboxWorker(bot, async_db, batch_size=2)
+        assert asyncio.run(worker.process_batch()) == 2
+        assert database.get_suppressed_chats() == {PARENT_ID}
+
+        # Оставшееся в очереди ДЗ родителю не отправляется
+        assert asyncio.run(worker.process_batch()) == 2
+        assert [chat_id for chat_id, _ in bot.sent] == [STUDENT_USER_ID, STUDENT_USER_ID]
+        assert [(r['status'], r['last_error']) for r in outbox_rows(database) if r['chat_id'] == PARENT_ID] == [
+            ('failed', 'blocked'), ('suppressed', None)]
+
+        # Новые уведомления для него не создаются до /start
+        database.add_grade(ids['student_id'], ids['subject_id'], 8, TEACHER_ID, today)
+        assert [r['chat_id'] for r in outbox_rows(database)][-1:] == [STUDENT_USER_ID]
+        print("✅ Blocked recipient suppressed and skipped")
+
+        database.unsuppress_chat(PARENT_ID)
+        assert database.get_suppressed_chats() == set()
+        database.add_grade(ids['student_id'], ids['subject_id'], 9, TEACHER_ID, today)
+        assert sorted(r['chat_id'] for r in outbox_rows(database)[-2:]) == [PARENT_ID, STUDENT_USER_ID]
+        # Отметка хранится в базе: новое подключение видит её снятой
+        reopened = Database(Path(tmp) / 'outbox.db')
+        # /start без отметки ничего не пишет, даже пока отметки не загружены
+        statements = []
+        reopened.get_connection().set_trace_callback(statements.append)
+        assert reopened.unsuppress_chat(STUDENT_USER_ID)
+        assert not any(sql.startswith('DELETE') for sql in statements), statements
+        assert reopened.get_suppressed_chats() == set()
+        reopened.close()
+        print("✅ Suppression cleared on /start")
+
+        async_db.close()
+
+
+if __name__ == "__main__":
+    test_outbox()
+    test_coalescing()
+    test_suppressions()
@@ -0,0 +1,74 @@
+"""
+Проверка постраничной выдачи Database
+
+Обход списков страницами по ключу из PAGE_KEYS должен вернуть те же
+строки в том же порядке, что и полный список, включая строки с
+одинаковыми значениями сортировки и NULL.
+"""
+
+import tempfile
+from pathlib import Path
+
+from config import ROLE_TEACHER, ROLE_ADMIN
+from database import Database, PAGE_KEYS
+
+
+def read_pages(fetch, key, page_size: int) -> list:
+    """Все строки, прочитанные страницами по page_size"""
+    rows, after = [], None
+    while True:
+        page = fetch(limit=page_size, after=after)
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = [page[-1][column] for column in key]
+
+
+def test_pagination():
+    print("📄 Testing keyset pagination\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'pages.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        for i in range(7):
+            # Одинаковые имена проверяют уникальный последний столбец ключа
+            database.add_user(2000 + i, None, f'Родитель {i % 3}', ROLE_TEACHER)
+        subject_id = database.add_subject('Математика', teacher_id)
+
+        for i in range(9):
+            class_name = None if i % 4 == 0 else f'9{"АБ"[i % 2]}'
+            database.add_student(f'Ученик {i % 2}', class_name)
+        student_id = database.get_all_students()[-1]['student_id']
+
+        # Несколько оценок на одну дату
+        for i in range(11):
+            database.add_grade(student_id, subject_id, i % 10 + 1, teacher_id, f'2024-09-0{i % 3 + 1}')
+
+        for i in range(6):
+            deadline = None if i % 3 == 0 else f'2024-10-0{i % 2 + 1} 18:00:00'
+            database.add_homework(subject_id, f'ДЗ {i}', 'Описание', teacher_id, deadline)
+
+        for i in range(5):
+            database.create_invite(ROLE_ADMIN, f'Админ {i}', teacher_id)
+
+        cases = {
+            'students': (database.get_all_students, PAGE_KEYS['students']),
+            'grades': (lambda **page: database.get_student_grades(student_id, **page), PAGE_KEYS['grades']),
+            'homework': (database.get_all_homework, PAGE_KEYS['homework']),
+            'invites': (lambda **page: database.get_all_invites(True, **page), PAGE_KEYS['invites']),
+            'users': (database.get_all_users, PAGE_KEYS['users']),
+        }
+        for name, (fetch, key) in cases.items():
+            full = fetch()
+            for page_size in (1, 2, 4):
+                assert read_pages(fetch, key, page_size) == full, f"{name}: pages differ (size {page_size})"
+            print(f"   ✅ {name} ({len(full)} rows)")
+
+        database.close()
+
+    print("\n✅ Pages match full lists")
+
+
+if __name__ == "__main__":
+    test_pagination()
@@ -0,0 +1,215 @@
+"""
+Проверка планов запросов Database
+
+Вызывает каждый публичный метод Database на временной базе, записывает
+выполненный SQL и прогоняет его через EXPLAIN QUERY PLAN. Тест падает,
+если какой-то запрос полностью сканирует большую таблицу без индекса.
+"""
+
+import re
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from config import ROLE_TEACHER, ROLE_PARENT, ROLE_STUDENT
+from database import Database
+
+# Таблицы, которые растут вместе со школой
+LARGE_TABLES = {
+    'grades', 'grade_aggregates', 'grade_histograms', 'grade_trends', 'students', 'parent_student_links', 'homework',
+    'notification_outbox',
+}
+
+# Служебные методы, не выполняющие запросов к данным
+SKIPPED_METHODS = {
+    'open_connection', 'get_connection', 'connection', 'close', 'init_db',
+    'generate_invite_code', 'get_cache_stats', 'add_grades_listener', 'add_homework_listener',
+}
+
+# Обслуживающие методы, которым полный проход по таблицам разрешён
+FULL_SCAN_METHODS = {'rebuild_grade_aggregates', 'get_grade_columns', 'iter_grades'}
+
+TEACHER_ID = 1001
+PARENT_ID = 1002
+STUDENT_USER_ID = 1003
+TODAY = datetime.now().strftime('%Y-%m-%d')
+
+# Вызов каждого метода с тестовыми аргументами; ids заполняется при подготовке данных
+METHOD_CALLS = {
+    'add_user': lambda d, ids: d.add_user(1004, 'new_user', 'Новый пользователь', ROLE_PARENT),
+    'get_user': lambda d, ids: d.get_user(TEACHER_ID),
+    'claim_notifications': lambda d, ids: d.claim_notifications(10, 60),
+    'finish_notifications': lambda d, ids: d.finish_notifications([1], [(2, 30, 'failed')], [(3, 'blocked')]),
+    'purge_notifications': lambda d, ids: d.purge_notifications(7),
+    'get_outbox_stats': lambda d, ids: d.get_outbox_stats(),
+    'get_suppressed_chats': lambda d, ids: d.get_suppressed_chats(),
+    'suppress_chats': lambda d, ids: d.suppress_chats([PARENT_ID]),
+    'unsuppress_chat': lambda d, ids: d.unsuppress_chat(PARENT_ID),
+    'is_first_user': lambda d, ids: d.is_first_user(),
+    'update_user_role': lambda d, ids: d.update_user_role(1004, ROLE_PARENT),
+    'add_student': lambda d, ids: d.add_student('Новый ученик', '9Б'),
+    'get_student': lambda d, ids: d.get_student(ids['student_id']),
+    'get_all_students': lambda d, ids: (d.get_all_students(), d.get_all_students(10, ('9А', 'Ученик', 1)),
+                                        d.get_all_students(10, (None, 'Ученик', 1))),
+    'get_student_by_user_id': lambda d, ids: d.get_student_by_user_id(STUDENT_USER_ID),
+    'create_link_request': lambda d, ids: d.create_link_request(PARENT_ID, ids['student_id']),
+    'get_pending_links': lambda d, ids: d.get_pending_links(),
+    'approve_link': lambda d, ids: d.approve_link(ids['link_id'], TEACHER_ID),
+    'reject_link': lambda d, ids: d.reject_link(ids['link_id'], TEACHER_ID),
+    'get_parent_students': lambda d, ids: d.get_parent_students(PARENT_ID),
+    'get_notification_recipients': lambda d, ids: (d.get_notification_recipients(ids['subject_id']),
+                                                   d.get_notification_recipients(class_name='9А'),
+                                                   d.get_notification_recipients()),
+    'add_subject': lambda d, ids: d.add_subject('Физика', TEACHER_ID),
+    'get_all_subjects': lambda d, ids: (d.get_all_subjects(), d.get_all_subjects(TEACHER_ID)),
+    'get_subject': lambda d, ids: d.get_subject(ids['subject_id']),
+    'delete_subject': lambda d, ids: d.delete_subject(ids['spare_subject_id']),
+    'add_grade': lambda d, ids: d.add_grade(ids['student_id'], ids['subject_id'], 8, TEACHER_ID, TODAY),
+    'get_student_grades': lambda d, ids: (d.get_student_grades(ids['student_id']),
+                                          d.get_student_grades(ids['student_id'], 10, (TODAY, 10**9))),
+    'get_grades_by_subject': lambda d, ids: d.get_grades_by_subject(ids['student_id'], ids['subject_id']),
+    'update_grade': lambda d, ids: d.update_grade(ids['grade_id'], 9, 'Исправлено'),
+    'apply_grade_writes': lambda d, ids: d.apply_grade_writes([
+        {'op': 'add', 'args': {'student_id': ids['student_id'], 'subject_id': ids['subject_id'],
+                               'grade': 6, 'teacher_id': TEACHER_ID, 'date': TODAY}},
+        {'op': 'update', 'args': {'grade_id': ids['grade_id'], 'grade': 7}},
+    ]),
+    'get_grade_aggregates': lambda d, ids: d.get_grade_aggregates(ids['student_id']),
+    'get_grade_histogram': lambda d, ids: (d.get_grade_histogram(ids['subject_id']),
+                                           d.get_grade_histogram(ids['subject_id'], '9А')),
+    'get_subject_rankings': lambda d, ids: d.get_subject_rankings(ids['subject_id']),
+    'get_student_class_sizes': lambda d, ids: d.get_student_class_sizes(),
+    'get_term_grades': lambda d, ids: (d.get_term_grades('9А', '2024-09-01', TODAY),
+                                       d.get_term_grades(None, '2024-09-01', TODAY)),
+    'iter_grades': lambda d, ids: list(d.iter_grades()),
+    'get_grade_trends': lambda d, ids: d.get_grade_trends(ids['student_id']),
+    'get_student_parents': lambda d, ids: d.get_student_parents(ids['student_id']),
+    'get_weekly_grades': lambda d, ids: (
+        d.get_weekly_grades(TODAY, student_id=ids['student_id'], subject_ids=[ids['subject_id']]),
+        d.get_weekly_grades(TODAY, student_id=ids['student_id']),
+        d.get_weekly_grades(TODAY, class_name='9А'),
+    ),
+    'get_grade_aggregates_batch': lambda d, ids: d.get_grade_aggregates_batch([ids['student_id'], 10**9]),
+    'get_student_rankings': lambda d, ids: (d.get_student_rankings(), d.get_student_rankings('9А')),
+    'get_grade_columns': lambda d, ids: d.get_grade_columns(),
+    'rebuild_grade_aggregates': lambda d, ids: d.rebuild_grade_aggregates(),
+    'add_homework': lambda d, ids: d.add_homework(ids['subject_id'], 'ДЗ', 'Описание', TEACHER_ID, TODAY),
+    'get_all_homework': lambda d, ids: (d.get_all_homework(), d.get_all_homework(ids['subject_id']),
+                                        d.get_all_homework(limit=10, after=(TODAY, 1))),
+    'get_homework': lambda d, ids: d.get_homework(ids['homework_id']),
+    'get_pending_reminders': lambda d, ids: d.get_pending_reminders(TODAY),
+    'enqueue_deadline_reminder': lambda d, ids: d.enqueue_deadline_reminder(ids['homework_id']),
+    'make_admin': lambda d, ids: d.make_admin(TEACHER_ID),
+    'is_admin': lambda d, ids: d.is_admin(TEACHER_ID),
+    'create_class': lambda d, ids: d.create_class('10А'),
+    'get_all_classes': lambda d, ids: d.get_all_classes(),
+    'assign_teacher': lambda d, ids: d.assign_teacher(TEACHER_ID, ids['class_id'], ids['spare_subject_id']),
+    'get_teacher_assignments': lambda d, ids: d.get_teacher_assignments(TEACHER_ID),
+    'create_invite': lambda d, ids: d.create_invite(ROLE_STUDENT, 'Приглашённый', TEACHER_ID),
+    'use_invite_code': lambda d, ids: d.use_invite_code(ids['invite_code'], 1005),
+    'get_all_invites': lambda d, ids: (d.get_all_invites(), d.get_all_invites(include_used=True),
+                                       d.get_all_invites(True, 10, (TODAY, 10**9))),
+    'get_all_teachers': lambda d, ids: d.get_all_teachers(),
+    'get_all_admins': lambda d, ids: d.get_all_admins(),
+    'remove_admin': lambda d, ids: d.remove_admin(TEACHER_ID),
+    'get_classes_with_student_count': lambda d, ids: d.get_classes_with_student_count(),
+    'get_students_by_class_name': lambda d, ids: d.get_students_by_class_name('9А'),
+    'get_all_assignments': lambda d, ids: d.get_all_assignments(),
+    'delete_assignment': lambda d, ids: d.delete_assignment(ids['assignment_id']),
+    'delete_class': lambda d, ids: d.delete_class(ids['spare_class_id']),
+    'delete_student': lambda d, ids: d.delete_student(ids['spare_student_id']),
+    'get_all_users': lambda d, ids: (d.get_all_users(), d.get_all_users(10, ('Учитель', TEACHER_ID))),
+}
+
+
+def prepare_data(database: Database) -> dict:
+    """Минимальный набор данных, чтобы каждый метод дошёл до своих запросов"""
+    database.add_user(TEACHER_ID, 'teacher', 'Учитель', ROLE_TEACHER)
+    database.add_user(PARENT_ID, 'parent', 'Родитель', ROLE_PARENT)
+    database.add_user(STUDENT_USER_ID, 'student', 'Ученик', ROLE_STUDENT)
+    ids = {
+        'student_id': database.add_student('Ученик', '9А', STUDENT_USER_ID),
+        'spare_student_id': database.add_student('Выбывший ученик', '9А'),
+        'subject_id': database.add_subject('Математика', TEACHER_ID),
+        'spare_subject_id': database.add_subject('Химия', TEACHER_ID),
+        'class_id': database.create_class('9А'),
+        'spare_class_id': database.create_class('11Б'),
+    }
+    ids['link_id'] = database.create_link_request(PARENT_ID, ids['student_id'])
+    ids['grade_id'] = database.add_grade(ids['student_id'], ids['subject_id'], 7, TEACHER_ID, TODAY)
+    ids['homework_id'] = database.add_homework(ids['subject_id'], 'ДЗ', 'Описание', TEACHER_ID, TODAY)
+    ids['assignment_id'] = database.assign_teacher(TEACHER_ID, ids['class_id'], ids['subject_id'])
+    ids['invite_code'] = database.create_invite(ROLE_STUDENT, 'Ученик', TEACHER_ID,
+                                                {'student_id': ids['student_id']})
+    return ids
+
+
+def table_aliases(sql: str) -> dict:
+    """Сопоставление псевдонимов таблиц в запросе с именами таблиц"""
+    aliases = {}
+    pattern = r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?'
+    for table, alias in re.findall(pattern, sql, flags=re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'SET', 'ON', 'JOIN', 'LEFT', 'ORDER', 'VALUES', 'GROUP'):
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn, sql: str) -> list:
+    """Список полных сканов больших таблиц в плане запроса"""
+    aliases = table_aliases(sql)
+    problems = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+        detail = row[3]
+        match = re.match(r'SCAN (\w+)', detail)
+        if not match or 'USING' in detail:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES:
+            problems.append(detail)
+    return problems
+
+
+def test_query_plans():
+    print("🔍 Checking query plans of Database methods\n")
+
+    public_methods = {
+        name for name in dir(Database)
+        if not name.startswith('_') and callable(getattr(Database, name))
+    }
+    uncovered = public_methods - SKIPPED_METHODS - set(METHOD_CALLS)
+    assert not uncovered, f"Methods without query plan coverage: {sorted(uncovered)}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'plans.db')
+        ids = prepare_data(database)
+        conn = database.get_connection()
+
+        failures = {}
+        for method, call in METHOD_CALLS.items():
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                call(database, ids)
+            finally:
+                conn.set_trace_callback(None)
+
+            if method in FULL_SCAN_METHODS:
+                print(f"   ⏭️  {method} (full scan allowed)")
+                continue
+            queries = [s for s in statements if s.lstrip().split()[0].upper() in ('SELECT', 'UPDATE', 'DELETE')]
+            for sql in queries:
+                problems = full_scans(conn, sql)
+                if problems:
+                    failures.setdefault(method, []).extend(problems)
+            print(f"   {'❌' if method in failures else '✅'} {method} ({len(queries)} queries)")
+
+        database.close()
+
+    assert not failures, f"Full table scans found: {failures}"
+
+    print("\n✅ No full scans of large tables")
+
+
+if __name__ == "__main__":
+    test_query_plans()
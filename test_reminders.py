@@ -0,0 +1,98 @@
+"""
+Проверка планировщика напоминаний о дедлайнах
+
+Планировщик загружает только будущие дедлайны без отправленного
+напоминания, ставит наступившие напоминания в очередь уведомлений ровно
+один раз (в том числе после перезапуска) и подхватывает новые задания из
+add_homework без повторного чтения таблицы.
+"""
+
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import ROLE_TEACHER, ROLE_STUDENT
+from database import AsyncDatabase, Database
+from utils.reminders import DeadlineScheduler
+
+TEACHER_ID = 1001
+STUDENT_USER_ID = 1003
+
+
+def reminder_rows(database: Database) -> list:
+    with database.connection() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT json_extract(payload, '$.homework_id') FROM notification_outbox "
+            "WHERE kind = 'deadline_reminder' ORDER BY outbox_id"
+        )]
+
+
+def at(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_reminders():
+    print("⏰ Testing deadline reminders\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'reminders.db')
+        async_db = AsyncDatabase(database)
+        database.add_user(TEACHER_ID, 'teacher', 'Учитель', ROLE_TEACHER)
+        database.add_user(STUDENT_USER_ID, 'student', 'Ученик', ROLE_STUDENT)
+        database.add_student('Ученик', '9А', STUDENT_USER_ID)
+        subject_id = database.add_subject('Математика', TEACHER_ID)
+
+        now = datetime.now()
+        later = database.add_homework(subject_id, 'Через два дня', '', TEACHER_ID, at(now + timedelta(days=2)))
+        soon = database.add_homework(subject_id, 'Через 12 часов', '', TEACHER_ID, at(now + timedelta(hours=12)))
+        database.add_homework(subject_id, 'Прошедшее', '', TEACHER_ID, at(now - timedelta(hours=1)))
+        database.add_homework(subject_id, 'Без дедлайна', '', TEACHER_ID)
+
+        async def first_run():
+            scheduler = DeadlineScheduler(async_db)
+            await scheduler.load()
+            assert len(scheduler) == 2
+            return await scheduler.fire_due(datetime.now())
+
+        # Напоминание за день: для задания через 12 часов уже пора
+        assert asyncio.run(first_run()) == 1
+        assert reminder_rows(database) == [soon]
+        print("✅ Due reminder queued, future one kept")
+
+        async def after_restart():
+            scheduler = DeadlineScheduler(async_db)
+            await scheduler.load()
+            assert len(scheduler) == 1
+            fired = await scheduler.fire_due(now + timedelta(days=2))
+            # Повторная отправка того же задания ничего не ставит в очередь
+            scheduler.schedule(later, at(now + timedelta(days=2)))
+            return fired + await scheduler.fire_due(now + timedelta(days=2))
+
+        assert asyncio.run(after_restart()) == 1
+        assert reminder_rows(database) == [soon, later]
+        print("✅ Restart does not resend, each reminder fires once")
+
+        async def live():
+            scheduler = DeadlineScheduler(async_db)
+            scheduler.start()
+            await asyncio.sleep(0.1)
+            # Напоминание через секунду после добавления задания
+            homework_id = await async_db.add_homework(subject_id, 'Новое', '', TEACHER_ID,
+                                                      at(datetime.now() + timedelta(days=1, seconds=1)))
+            for _ in range(50):
+                if homework_id in reminder_rows(database):
+                    break
+                await asyncio.sleep(0.1)
+            await scheduler.stop()
+            return homework_id
+
+        homework_id = asyncio.run(live())
+        assert reminder_rows(database) == [soon, later, homework_id]
+        print("✅ New homework picked up from add_homework")
+
+        async_db.close()
+
+
+if __name__ == "__main__":
+    test_reminders()
@@ -0,0 +1,383 @@
+"""
+Проверка статистики оценок
+
+Агрегаты grade_aggregates и гистограммы grade_histograms, которые
+поддерживаются при каждой записи оценки, должны совпадать с
+пересчитанными с нуля и давать ту же статистику учеников и классов, что
+и подсчёт по списку оценок.
+Колоночная аналитика сверяется с прямым подсчётом NumPy по каждой группе,
+недельная динамика из SQL - с группировкой списка оценок по строкам,
+табели за период - со списками оценок учеников, состояние детектора
+зоны риска (EWMA и скользящее окно) - с проигрыванием всех оценок.
+"""
+
+import json
+import random
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from config import ROLE_TEACHER
+import migrations
+from database import Database
+from utils import analytics, report_cards, statistics
+
+
+def expected_statistics(database: Database, student_id: int) -> dict:
+    """Статистика ученика, посчитанная по полному списку оценок"""
+    grades = database.get_student_grades(student_id)
+    stats = {
+        'overall_average': statistics.calculate_average_grade(grades),
+        'total_grades': len(grades),
+        'subject_averages': {},
+    }
+    for subject in database.get_all_subjects():
+        subject_grades = [g for g in grades if g['subject_id'] == subject['subject_id']]
+        if subject_grades:
+            stats['subject_averages'][subject['name']] = {
+                'average': statistics.calculate_average_grade(subject_grades),
+                'count': len(subject_grades),
+                'last_grade': subject_grades[0]['grade'],
+            }
+    return stats
+
+
+def test_grade_aggregates():
+    print("📊 Testing grade aggregates\n")
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'stats.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        subject_ids = [database.add_subject(name, teacher_id) for name in ('Физика', 'Алгебра', 'История')]
+        student_ids = [database.add_student(f'Ученик {i}', '9А') for i in range(4)]
+
+        grade_ids = []
+        for _ in range(120):
+            grade_ids.append(database.add_grade(
+                rng.choice(student_ids), rng.choice(subject_ids), rng.randint(1, 10),
+                teacher_id, f'2024-09-{rng.randint(1, 28):02d}'
+            ))
+        for grade_id in rng.sample(grade_ids, 30):
+            database.update_grade(grade_id, rng.randint(1, 10))
+        database.apply_grade_writes([
+            {'op': 'add', 'args': {'student_id': student_ids[0], 'subject_id': subject_ids[0],
+                                   'grade': 10, 'teacher_id': teacher_id, 'date': '2024-10-01'}},
+            {'op': 'update', 'args': {'grade_id': grade_ids[0], 'grade': 1}},
+        ])
+        database.delete_student(student_ids[-1])
+
+        incremental = [database.get_grade_aggregates(s) for s in student_ids]
+        histograms = [database.get_grade_histogram(s, c) for s in subject_ids for c in (None, '9А')]
+        database.rebuild_grade_aggregates()
+        assert incremental == [database.get_grade_aggregates(s) for s in student_ids]
+        assert incremental[-1] == []
+        assert histograms == [database.get_grade_histogram(s, c) for s in subject_ids for c in (None, '9А')]
+        print("   ✅ Incremental aggregates and histograms match a rebuild")
+
+        with mock.patch.object(statistics, 'db', database):
+            for student_id in student_ids:
+                assert statistics.get_student_statistics(student_id) == expected_statistics(database, student_id)
+            print("   ✅ Student statistics match grade lists")
+
+            database.add_student('Ученик без оценок', '9Б')
+            for class_name in (None, '9А', '9Б'):
+                students = [s for s in database.get_all_students() if not class_name or s['class_name'] == class_name]
+                rankings = []
+                for student in students:
+                    expected = expected_statistics(database, student['student_id'])
+                    rankings.append({
+                        'student_id': student['student_id'],
+                        'full_name': student['full_name'],
+                        'average': expected['overall_average'],
+                        'total_grades': expected['total_grades'],
+                    })
+                rankings.sort(key=lambda x: x['average'], reverse=True)
+                assert statistics.get_class_statistics(class_name) == {
+                    'total_students': len(students), 'student_rankings': rankings
+                }
+            print("   ✅ Class statistics match per-student statistics")
+
+            batch = statistics.get_students_statistics(student_ids + [10**9])
+            assert batch == {s: statistics.get_student_statistics(s) for s in student_ids + [10**9]}
+            class_batch = statistics.get_students_statistics(class_name='9А')
+            assert set(class_batch) == {s['student_id'] for s in database.get_students_by_class_name('9А')}
+            print("   ✅ Batch statistics match per-student statistics")
+
+            for subject_id in subject_ids:
+                grades = [g['grade'] for s in student_ids for g in database.get_grades_by_subject(s, subject_id)]
+                distribution = statistics.get_grade_distribution(subject_id, '9А', student_ids[0])
+                assert distribution['total'] == len(grades)
+                assert distribution['median'] == round(float(np.median(grades)), 2)
+                average = distribution['student']['average']
+                below = sum(g < average for g in grades) + sum(g == average for g in grades) / 2
+                assert distribution['student']['percentile_rank'] == round(below / len(grades) * 100, 1)
+            print("   ✅ Distributions match grade lists")
+
+        database.close()
+
+    print("\n✅ Grade aggregates are consistent")
+
+
+def expected_dynamics(database: Database, student_id: int, subject_id: int, days: int) -> list:
+    """Недельная динамика, посчитанная построчно по списку оценок"""
+    cutoff = datetime.now() - timedelta(days=days)
+    weekly = {}
+    for grade in database.get_grades_by_subject(student_id, subject_id):
+        day = datetime.strptime(grade['date'], '%Y-%m-%d')
+        if day >= cutoff:
+            weekly.setdefault(day.strftime('%Y-W%W'), []).append(grade['grade'])
+    return [
+        {'week': week, 'average': round(sum(values) / len(values), 2), 'count': len(values)}
+        for week, values in sorted(weekly.items())
+    ]
+
+
+def expected_report(rows: list, key) -> list:
+    """Статистика групп, посчитанная NumPy отдельно по каждой группе"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row['grade'])
+    return [
+        {'key': k, 'count': len(v), 'mean': round(float(np.mean(v)), 2),
+         'median': round(float(np.median(v)), 2), 'std': round(float(np.std(v)), 2),
+         'p25': round(float(np.percentile(v, 25)), 2), 'p75': round(float(np.percentile(v, 75)), 2)}
+        for k, v in sorted(groups.items())
+    ]
+
+
+def test_analytics():
+    print("🧮 Testing NumPy analytics\n")
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'analytics.db')
+        teacher_ids = [1001, 1002]
+        for teacher_id in teacher_ids:
+            database.add_user(teacher_id, f'teacher{teacher_id}', 'Учитель', ROLE_TEACHER)
+        subject_ids = [database.add_subject(f'Предмет {i}', teacher_ids[0]) for i in range(3)]
+        student_ids = [database.add_student(f'Ученик {i}', rng.choice(['9А', '9Б', None])) for i in range(12)]
+        today = datetime.now()
+
+        def add_grades(count: int):
+            for _ in range(count):
+                day = today - timedelta(days=rng.randint(0, 120))
+                database.add_grade(rng.choice(student_ids), rng.choice(subject_ids), rng.randint(1, 10),
+                                   rng.choice(teacher_ids), day.strftime('%Y-%m-%d'))
+
+        add_grades(400)
+        with mock.patch.object(analytics, 'db', database), mock.patch.object(analytics, '_frame', None):
+            classes = {s['student_id']: s['class_name'] or '' for s in database.get_all_students()}
+            rows = [dict(g, class_name=classes[s]) for s in student_ids for g in database.get_student_grades(s)]
+            keys = {
+                'student': lambda r: r['student_id'],
+                'subject': lambda r: r['subject_id'],
+                'teacher': lambda r: r['teacher_id'],
+                'class': lambda r: r['class_name'],
+                'week': lambda r: datetime.strptime(r['date'], '%Y-%m-%d').strftime('%Y-W%W'),
+            }
+            for by, key in keys.items():
+                assert analytics.grade_report(by) == expected_report(rows, key), f"group by {by}"
+            assert analytics.grade_report('subject', class_name='9А') == \
+                expected_report([r for r in rows if r['class_name'] == '9А'], keys['subject'])
+            print("   ✅ Grouped statistics match NumPy per group")
+
+            # Дозагрузка новых оценок и полная перезагрузка после изменения
+            frame = analytics.get_frame()
+            add_grades(50)
+            assert len(analytics.get_frame()) == len(frame) + 50
+            database.update_grade(1, 10)
+            assert analytics.get_frame().columns['grade'][0] == 10
+            print("   ✅ Frame follows grade writes")
+
+        with mock.patch.object(statistics, 'db', database):
+            for student_id in student_ids:
+                for subject_id in subject_ids:
+                    assert statistics.get_grade_dynamics(student_id, subject_id, 60) == \
+                        expected_dynamics(database, student_id, subject_id, 60)
+                series = statistics.get_subjects_dynamics(student_id=student_id, days=60)
+                assert {s['subject_id']: s['weeks'] for s in series} == {
+                    subject_id: weeks for subject_id in subject_ids
+                    if (weeks := expected_dynamics(database, student_id, subject_id, 60))
+                }
+            class_series = statistics.get_subjects_dynamics(class_name='9А', subject_ids=subject_ids[:2], days=60)
+            class_students = [s for s in student_ids if classes[s] == '9А']
+            for s in class_series:
+                weekly = {}
+                for student_id in class_students:
+                    for week in expected_dynamics(database, student_id, s['subject_id'], 60):
+                        weekly.setdefault(week['week'], []).append(week['count'])
+                assert s['subject_id'] in subject_ids[:2]
+                assert [(w['week'], w['count']) for w in s['weeks']] == sorted((k, sum(v)) for k, v in weekly.items())
+            print("   ✅ Weekly dynamics match row-by-row grouping")
+
+        # Оценка с датой, которую SQLite не разбирает, не сдвигает столбцы
+        database.add_grade(student_ids[0], subject_ids[0], 5, teacher_ids[0], '02.09.2024')
+        with mock.patch.object(analytics, 'db', database), mock.patch.object(analytics, '_frame', None):
+            frame = analytics.get_frame()
+            assert len(frame) == 450 and {len(column) for column in frame.columns.values()} == {450}
+        print("   ✅ Unparseable dates skipped in every column")
+
+        database.close()
+
+    print("\n✅ Analytics are consistent")
+
+
+def at_risk_rows(database: Database) -> list:
+    """Оповещения о зоне риска в очереди: (получатель, ученик)"""
+    with database.connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT chat_id, json_extract(payload, '$.student_id') FROM notification_outbox "
+            "WHERE kind = 'at_risk' ORDER BY outbox_id"
+        )]
+
+
+def test_grade_trends():
+    print("📉 Testing at-risk detection\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'trends.db')
+        alerts = []
+        database.add_grades_listener(lambda change: alerts.extend(change['at_risk']))
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        subject_id = database.add_subject('Химия', teacher_id)
+        student_id, other_id = database.add_student('Ученик', '9А'), database.add_student('Другой', '9А')
+
+        day = datetime(2024, 9, 2)
+        for grade in [9, 9, 10, 9, 9, 10, 9]:
+            database.add_grade(student_id, subject_id, grade, teacher_id, day.strftime('%Y-%m-%d'))
+            database.add_grade(other_id, subject_id, grade, teacher_id, day.strftime('%Y-%m-%d'))
+            day += timedelta(days=2)
+        assert alerts == []
+
+        # Резкое падение: одно оповещение при входе в зону риска, не на каждую оценку
+        for grade in [4, 3, 4, 3]:
+            database.add_grade(student_id, subject_id, grade, teacher_id, day.strftime('%Y-%m-%d'))
+            day += timedelta(days=1)
+        assert [(a['student_id'], a['subject_id']) for a in alerts] == [(student_id, subject_id)]
+        assert alerts[0]['ewma'] <= alerts[0]['average'] - 2
+        assert database.get_grade_trends(student_id)[0]['at_risk']
+        assert not database.get_grade_trends(other_id)[0]['at_risk']
+        # Оповещение учителю предмета - через очередь уведомлений, той же транзакцией
+        assert at_risk_rows(database) == [(teacher_id, student_id)]
+        print("   ✅ One alert when the rolling average drops")
+
+        # Восстановление снимает признак, новое падение снова оповещает
+        database.apply_grade_writes([
+            {'op': 'add', 'args': {'student_id': student_id, 'subject_id': subject_id, 'grade': 10,
+                                   'teacher_id': teacher_id, 'date': day.strftime('%Y-%m-%d')}}
+            for _ in range(4)
+        ])
+        assert not database.get_grade_trends(student_id)[0]['at_risk']
+        database.apply_grade_writes([
+            {'op': 'add', 'args': {'student_id': student_id, 'subject_id': subject_id, 'grade': 2,
+                                   'teacher_id': teacher_id, 'date': day.strftime('%Y-%m-%d')}}
+            for _ in range(3)
+        ])
+        assert len(alerts) == 2 and len(at_risk_rows(database)) == 2
+        print("   ✅ Recovery resets the alert")
+
+        # Падение на стыке 30-дневных отрезков: скользящее окно видит все оценки серии
+        burst_id = database.add_student('Четвёртый', '9Б')
+        day = datetime(2024, 9, 2)
+        grades = [(day + timedelta(days=2 * i), grade) for i, grade in enumerate([9, 9, 10, 9, 9, 10, 9])]
+        grades += [(day + timedelta(days=28 + i), grade) for i, grade in enumerate([4, 3, 4, 3])]
+        for moment, grade in grades:
+            database.add_grade(burst_id, subject_id, grade, teacher_id, moment.strftime('%Y-%m-%d'))
+        assert [a['student_id'] for a in alerts[2:]] == [burst_id]
+        # В окне 30 дней до 2024-10-03: оценки с 2024-09-04
+        assert database.get_grade_trends(burst_id)[0]['window_count'] == 10
+        print("   ✅ Sliding window counts a drop across the window boundary")
+
+        # Дата не в формате ISO не роняет пакет: каждая запись получает свой id
+        third_id = database.add_student('Третий', '9А')
+        grade_ids = database.apply_grade_writes([
+            {'op': 'add', 'args': {'student_id': third_id, 'subject_id': subject_id, 'grade': grade,
+                                   'teacher_id': teacher_id, 'date': date}}
+            for grade, date in [(8, '2024-09-01'), (7, '02.09.2024'), (9, '2024-09-03')]
+        ])
+        assert all(grade_ids) and len(set(grade_ids)) == 3, grade_ids
+        # Оценка с такой датой учитывается в EWMA, но не в окне
+        assert database.get_grade_trends(third_id)[0]['window_count'] == 2
+        print("   ✅ Non-ISO date kept in the batch")
+
+        # Сохранённое состояние совпадает с проигрыванием всех оценок
+        students = (student_id, other_id, burst_id)
+        incremental = [database.get_grade_trends(s) for s in students]
+        with database.connection() as conn:
+            conn.execute('DELETE FROM grade_trends')
+            migrations.fill_grade_trends(conn.cursor())
+            conn.commit()
+        assert incremental == [database.get_grade_trends(s) for s in students]
+        print("   ✅ Persisted state matches a full replay")
+
+        database.close()
+
+    print("\n✅ At-risk detector is consistent")
+
+
+def test_report_cards():
+    print("📑 Testing report cards\n")
+
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(Path(tmp) / 'reports.db')
+        teacher_id = 1001
+        database.add_user(teacher_id, 'teacher', 'Учитель', ROLE_TEACHER)
+        subject_ids = [database.add_subject(name, teacher_id) for name in ('Физика', 'Алгебра')]
+        student_ids = [database.add_student(f'Ученик {i}', ['9А', '9Б', None][i % 3]) for i in range(9)]
+        for _ in range(200):
+            month, day = rng.choice([8, 9, 10]), rng.randint(1, 28)
+            assert database.add_grade(rng.choice(student_ids[:-1]), rng.choice(subject_ids), rng.randint(1, 10),
+                                      teacher_id, f'2024-{month:02d}-{day:02d}') is not None
+
+        progress = []
+        out_dir = Path(tmp) / 'cards'
+        summary = report_cards.generate_report_cards('2024-09-01', '2024-10-15', out_dir, workers=2,
+                                                     progress=lambda done, total: progress.append((done, total)),
+                                                     db_path=database.db_path)
+        assert summary['students'] == len(student_ids)
+        assert progress[0] == (0, 9) and progress[-1] == (9, 9) and len(progress) == 4
+
+        reports = {}
+        for student in database.get_all_students():
+            path = out_dir / report_cards.class_directory(student['class_name']) / str(student['student_id'])
+            reports[student['student_id']] = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+            assert student['full_name'] in path.with_suffix('.html').read_text(encoding='utf-8')
+
+        for student_id, report in reports.items():
+            grades = [g for g in database.get_student_grades(student_id) if '2024-09-01' <= g['date'] <= '2024-10-15']
+            assert report['total_grades'] == len(grades)
+            assert report['overall_average'] == statistics.calculate_average_grade(grades)
+            for subject in report['subjects']:
+                subject_grades = [g for g in grades if g['subject_id'] == subject['subject_id']]
+                assert subject['average'] == statistics.calculate_average_grade(subject_grades)
+                assert sum(week['count'] for week in subject['weeks']) == len(subject_grades)
+            classmates = [r for r in reports.values() if r['class_name'] == report['class_name']]
+            better = [r for r in classmates if r['total_grades'] and
+                      (not report['total_grades'] or r['overall_average'] > report['overall_average'])]
+            assert report['class_rank'] == len(better) + 1 and report['class_size'] == len(classmates)
+        print("   ✅ Report cards match grade lists")
+
+        # Общий экземпляр базы (импорт в процессах пула) не открывает файл до первого запроса
+        shared = Database(Path(tmp) / 'shared.db', lazy=True)
+        assert not (Path(tmp) / 'shared.db').exists()
+        assert shared.get_all_subjects() == []
+        shared.close()
+        print("   ✅ Shared database opened on first query")
+
+        database.close()
+
+    print("\n✅ Report cards are generated for every student")
+
+
+if __name__ == "__main__":
+    test_grade_aggregates()
+    test_analytics()
+    test_grade_trends()
+    test_report_cards()
@@ -0,0 +1,151 @@
+"""
+Массовая рассылка сообщений в Telegram
+
+Telegram ограничивает бота примерно 30 сообщениями в секунду на всех
+получателей. Рассылка идёт через общий для процесса token bucket
+(BROADCAST_RATE сообщений в секунду с запасом BROADCAST_BURST), не более
+BROADCAST_CONCURRENCY запросов одновременно. Ответ RetryAfter
+приостанавливает всю рассылку на указанное Telegram время, после чего
+сообщение отправляется повторно. Сетевые и серверные ошибки повторяются
+с экспоненциальной задержкой, не больше BROADCAST_MAX_RETRIES раз.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramRetryAfter, TelegramServerError,
+)
+
+from config import BROADCAST_BURST, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES, BROADCAST_RATE
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых писать получателю бессмысленно
+PERMANENT_ERRORS = ('chat not found', 'user is deactivated', 'bot was blocked', 'bot can\'t initiate')
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """Получатель заблокировал бота, удалил аккаунт или никогда не писал боту"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and any(text in str(error).lower() for text in PERMANENT_ERRORS)
+
+
+class TokenBucket:
+    """Ограничение частоты: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (ответ RetryAfter)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        """Дождаться токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Broadcaster:
+    """Рассылка одного сообщения списку получателей с общим ограничением частоты"""
+
+    def __init__(self, rate: float = BROADCAST_RATE, burst: int = BROADCAST_BURST,
+                 concurrency: int = BROADCAST_CONCURRENCY, max_retries: int = BROADCAST_MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._buckets: Dict[asyncio.AbstractEventLoop, TokenBucket] = {}
+
+    def bucket(self) -> TokenBucket:
+        """Token bucket текущего цикла событий (asyncio.Lock привязан к циклу)"""
+        loop = asyncio.get_running_loop()
+        bucket = self._buckets.get(loop)
+        if bucket is None:
+            bucket = self._buckets[loop] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> str:
+        """Отправка одного сообщения: 'sent', 'blocked' или 'failed'"""
+        bucket = self.bucket()
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+                return 'sent'
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing broadcast for {e.retry_after}s")
+                bucket.pause(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to send message to {chat_id}: {e}")
+                    return 'failed'
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                if is_permanent_error(e):
+                    logger.info(f"Recipient {chat_id} is unreachable: {e}")
+                    return 'blocked'
+                logger.error(f"Failed to send message to {chat_id}: {e}")
+                return 'failed'
+        logger.error(f"Failed to send message to {chat_id}: retries exhausted")
+        return 'failed'
+
+    async def broadcast(self, bot: Bot, chat_ids: Iterable[int], text: str, **kwargs) -> Dict[str, Any]:
+        """Рассылка text получателям chat_ids (повторы отбрасываются)
+
+        Возвращает отчёт: число отправленных, неудачных и недоступных
+        получателей (заблокировали бота, удалили аккаунт), их id и
+        длительность рассылки в секундах.
+        """
+        started = time.monotonic()
+        recipients = [chat_id for chat_id in dict.fromkeys(chat_ids) if chat_id]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> str:
+            async with semaphore:
+                return await self.send(bot, chat_id, text, **kwargs)
+
+        results = await asyncio.gather(*(deliver(chat_id) for chat_id in recipients))
+        report = {
+            'total': len(recipients),
+            'sent': results.count('sent'),
+            'failed': results.count('failed'),
+            'blocked': results.count('blocked'),
+            'blocked_ids': [chat_id for chat_id, result in zip(recipients, results) if result == 'blocked'],
+            'duration': round(time.monotonic() - started, 3),
+        }
+        logger.info(
+            f"Broadcast to {report['total']} recipients: {report['sent']} sent, "
+            f"{report['failed']} failed, {report['blocked']} blocked in {report['duration']}s"
+        )
+        return report
+
+
+broadcaster = Broadcaster()
+
+
+async def broadcast(bot: Bot, chat_ids: Iterable[int], text: str, **kwargs) -> Dict[str, Any]:
+    """Рассылка через общий для процесса Broadcaster"""
+    return await broadcaster.broadcast(bot, chat_ids, text, **kwargs)
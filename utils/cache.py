@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Признак отсутствия значения в кеше (None - допустимое кешируемое значение)
+MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кеш с TTL и счётчиками попаданий
+
+    Значение, прочитанное из базы до инвалидации, не должно попасть в кеш
+    после неё: перед чтением из базы берётся generation, и set() с
+    устаревшим поколением игнорируется.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или MISSING"""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Сохранение значения; generation - поколение на момент чтения из базы"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Удаление одного ключа"""
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики кеша для метрик"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
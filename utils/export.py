@@ -0,0 +1,71 @@
+"""
+Потоковая выгрузка журнала оценок
+
+Пачки строк из Database.iter_grades превращаются в куски файла по одному
+на пачку: CSV (UTF-8 с BOM, чтобы Excel распознал кириллицу) или поток
+Arrow IPC для аналитики. Ни один формат не держит в памяти больше одной
+пачки.
+"""
+
+import csv
+import io
+from typing import Iterable, Iterator, List
+
+import pyarrow as pa
+
+from database import EXPORT_COLUMNS
+
+# Формат: (MIME-тип, расширение файла)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def csv_chunks(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """CSV по пачкам строк: заголовок, затем один кусок на пачку"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+_ARROW_TYPES = {
+    'grade_id': 'int64', 'date': 'string', 'class_name': 'string', 'student_id': 'int64',
+    'student_name': 'string', 'subject_id': 'int64', 'subject_name': 'string',
+    'grade': 'int64', 'teacher_id': 'int64', 'comment': 'string',
+}
+
+
+def arrow_chunks(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Поток Arrow IPC: схема, затем по одному RecordBatch на пачку"""
+    schema = pa.schema([(name, _ARROW_TYPES[name]) for name in EXPORT_COLUMNS])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield _drain(sink)
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    """Накопленные байты потока; буфер очищается"""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def export_chunks(batches: Iterable[List[tuple]], fmt: str) -> Iterator[bytes]:
+    """Куски файла выгрузки в формате fmt из FORMATS"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {tuple(FORMATS)}")
+    return csv_chunks(batches) if fmt == 'csv' else arrow_chunks(batches)
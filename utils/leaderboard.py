@@ -0,0 +1,124 @@
+"""
+Кешируемые рейтинги учеников
+
+Рейтинг - первые LEADERBOARD_SIZE учеников по среднему баллу в классе, по
+предмету или по всей школе. Он строится по агрегатам оценок и хранится до
+записи, которая может его изменить: Database сообщает подписчикам, оценки
+каких учеников и предметов изменились, и сбрасываются только рейтинги,
+куда входят эти ученики или предметы.
+"""
+
+import heapq
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import LEADERBOARD_SIZE, LEADERBOARD_TTL
+from database import db, Database
+
+# Виды рейтингов: вся школа, класс (ключ - название), предмет (ключ - subject_id)
+SCOPES = ('school', 'class', 'subject')
+
+
+def build_leaderboard(rows: List[Dict[str, Any]], size: int) -> Dict[str, Any]:
+    """Первые size учеников по среднему баллу из строк с grade_sum и grade_count
+
+    При равном среднем сохраняется порядок строк, как в get_class_statistics.
+    """
+    rankings = [
+        {
+            'student_id': row['student_id'],
+            'full_name': row['full_name'],
+            'class_name': row['class_name'],
+            'average': round(row['grade_sum'] / row['grade_count'], 2) if row['grade_count'] else 0.0,
+            'total_grades': row['grade_count'],
+        }
+        for row in rows
+    ]
+    return {
+        'total_students': len(rankings),
+        'student_rankings': heapq.nlargest(size, rankings, key=lambda x: x['average']),
+    }
+
+
+class Leaderboards:
+    """Кеш рейтингов с инвалидацией по изменениям оценок"""
+
+    def __init__(self, database: Database, size: int = LEADERBOARD_SIZE, ttl: Optional[float] = LEADERBOARD_TTL):
+        self.database = database
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._boards: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        # Поколение растёт при каждом изменении: рейтинг, прочитанный до
+        # изменения, не сохраняется после него
+        self._generation = 0
+        self._lock = threading.Lock()
+        database.add_grades_listener(self._on_grades_changed)
+
+    def get(self, scope: str = 'school', key: Any = None) -> Dict[str, Any]:
+        """Рейтинг {'total_students', 'student_rankings'} школы, класса или предмета"""
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown leaderboard scope '{scope}', expected one of {SCOPES}")
+        board_key = (scope, key if scope != 'school' else None)
+
+        with self._lock:
+            entry = self._boards.get(board_key)
+            if entry is not None and self._is_fresh(entry):
+                self.hits += 1
+                return _copy(entry['board'])
+            self.misses += 1
+            generation = self._generation
+            catalog_version = self.database.catalog_version
+
+        if scope == 'subject':
+            rows = self.database.get_subject_rankings(key)
+        else:
+            rows = self.database.get_student_rankings(key)
+        board = build_leaderboard(rows, self.size)
+
+        with self._lock:
+            if generation == self._generation:
+                self._boards[board_key] = {
+                    'board': board,
+                    'members': {row['student_id'] for row in rows},
+                    'catalog_version': catalog_version,
+                    'built_at': time.monotonic(),
+                }
+        return _copy(board)
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        if entry['catalog_version'] != self.database.catalog_version:
+            return False
+        return self.ttl is None or time.monotonic() - entry['built_at'] < self.ttl
+
+    def _on_grades_changed(self, change: Dict[str, Set[Any]]):
+        """Сброс рейтингов, в которые входят изменившиеся ученики или предметы"""
+        with self._lock:
+            self._generation += 1
+            for board_key, entry in list(self._boards.items()):
+                scope, key = board_key
+                if (scope == 'school'
+                        or (scope == 'subject' and key in change['subjects'])
+                        or (scope == 'class' and (key in change['classes'] or entry['members'] & change['students']))):
+                    del self._boards[board_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики кеша рейтингов для метрик"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._boards),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def _copy(board: Dict[str, Any]) -> Dict[str, Any]:
+    return {'total_students': board['total_students'],
+            'student_rankings': [dict(row) for row in board['student_rankings']]}
+
+
+leaderboards = Leaderboards(db)
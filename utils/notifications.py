@@ -1,70 +1,97 @@
 from aiogram import Bot
-from typing import List
+from typing import Any, Dict, Iterable, List
 import logging
 
+from utils.broadcast import broadcast
+
 logger = logging.getLogger(__name__)
 
 
-async def notify_new_grade(bot: Bot, student_id: int, parent_ids: List[int], 
-                          subject_name: str, grade: int, comment: str = None):
-    """Уведомление о новой оценке"""
+def format_new_grade(payload: Dict[str, Any]) -> str:
+    """Текст уведомления о новой оценке (payload из notification_outbox)"""
     message = f"📊 <b>Новая оценка!</b>\n\n"
-    message += f"Предмет: <b>{subject_name}</b>\n"
-    message += f"Оценка: <b>{grade}</b>\n"
-    if comment:
-        message += f"Комментарий: {comment}\n"
-    
-    # Уведомление ученика
-    from database import db
-    student = db.get_student(student_id)
-    if student and student['user_id']:
-        try:
-            await bot.send_message(student['user_id'], message)
-        except Exception as e:
-            logger.error(f"Failed to notify student {student_id}: {e}")
-    
-    # Уведомление родителей
-    for parent_id in parent_ids:
-        try:
-            await bot.send_message(parent_id, message)
-        except Exception as e:
-            logger.error(f"Failed to notify parent {parent_id}: {e}")
-
-
-async def notify_new_homework(bot: Bot, subject_name: str, title: str, 
-                             deadline: str = None):
-    """Уведомление о новом домашнем задании"""
-    from database import db
+    message += f"Ученик: {payload['student_name']}\n"
+    message += f"Предмет: <b>{payload['subject_name']}</b>\n"
+    message += f"Оценка: <b>{payload['grade']}</b>\n"
+    if payload.get('comment'):
+        message += f"Комментарий: {payload['comment']}\n"
+    return message
+
+
+def format_new_grades(payloads: List[Dict[str, Any]]) -> str:
+    """Одно сообщение о нескольких новых оценках (накопленных за окно NOTIFY_GRADE_WINDOW)"""
+    if len(payloads) == 1:
+        return format_new_grade(payloads[0])
+    by_student: Dict[str, List[Dict[str, Any]]] = {}
+    for payload in payloads:
+        by_student.setdefault(payload['student_name'], []).append(payload)
     
+    message = f"📊 <b>Новые оценки ({len(payloads)})</b>\n"
+    for student_name, grades in by_student.items():
+        message += f"\nУченик: {student_name}\n"
+        for payload in grades:
+            message += f"• {payload['subject_name']}: <b>{payload['grade']}</b>"
+            if payload.get('comment'):
+                message += f" — {payload['comment']}"
+            message += "\n"
+    return message
+
+
+def format_new_homework(payload: Dict[str, Any]) -> str:
+    """Текст уведомления о новом домашнем задании (payload из notification_outbox)"""
     message = f"📝 <b>Новое домашнее задание!</b>\n\n"
-    message += f"Предмет: <b>{subject_name}</b>\n"
-    message += f"Задание: {title}\n"
-    if deadline:
-        message += f"📅 Срок сдачи: <b>{deadline}</b>\n"
-    
-    # Получение всех учеников и родителей
-    students = db.get_all_students()
-    notified = set()
+    message += f"Предмет: <b>{payload['subject_name']}</b>\n"
+    message += f"Задание: {payload['title']}\n"
+    if payload.get('deadline'):
+        message += f"📅 Срок сдачи: <b>{payload['deadline'][:16]}</b>\n"
+    return message
+
+
+def format_deadline_reminder(payload: Dict[str, Any]) -> str:
+    """Текст напоминания о дедлайне (payload из notification_outbox)"""
+    message = f"⏰ <b>Напоминание о дедлайне!</b>\n\n"
+    message += f"Предмет: <b>{payload['subject_name']}</b>\n"
+    message += f"Задание: {payload['title']}\n"
+    message += f"📅 Срок сдачи: <b>{payload['deadline'][:16]}</b>\n"
+    return message
+
+
+def format_at_risk(payload: Dict[str, Any]) -> str:
+    """Текст оповещения о резком снижении оценок ученика (payload из notification_outbox)"""
+    message = f"⚠️ <b>Снижение успеваемости</b>\n\n"
+    message += f"Ученик: <b>{payload['student_name']}</b>\n"
+    message += f"Предмет: <b>{payload['subject_name']}</b>\n"
+    message += f"Последние оценки в среднем: <b>{payload['ewma']}</b> (средний балл по предмету: {payload['average']})\n"
+    message += f"Последняя оценка: <b>{payload['grade']}</b>\n"
+    return message
+
+
+# Тексты уведомлений из notification_outbox по виду; накопленные уведомления
+# одного получателя передаются списком и отправляются одним сообщением
+FORMATTERS = {
+    'new_grade': format_new_grades,
+    'new_homework': lambda payloads: '\n'.join(format_new_homework(payload) for payload in payloads),
+    'deadline_reminder': lambda payloads: '\n'.join(format_deadline_reminder(payload) for payload in payloads),
+    'at_risk': lambda payloads: '\n'.join(format_at_risk(payload) for payload in payloads),
+}
+
+
+async def send_notification(bot: Bot, chat_ids: Iterable[int], message: str) -> Dict[str, Any]:
+    """Рассылка без недоступных получателей; новые недоступные запоминаются
+
+    Получатели, заблокировавшие бота или удалившие аккаунт, пропускаются до
+    снятия отметки командой /start. Возвращает отчёт рассылки с числом
+    пропущенных получателей.
+    """
+    from database import adb
     
-    for student in students:
-        # Уведомление ученика
-        if student['user_id'] and student['user_id'] not in notified:
-            try:
-                await bot.send_message(student['user_id'], message)
-                notified.add(student['user_id'])
-            except Exception as e:
-                logger.error(f"Failed to notify student {student['student_id']}: {e}")
-        
-        # Уведомление родителей ученика
-        parent_links = db.get_parent_students(student['student_id'])
-        for link in parent_links:
-            parent_id = link.get('parent_id')
-            if parent_id and parent_id not in notified:
-                try:
-                    await bot.send_message(parent_id, message)
-                    notified.add(parent_id)
-                except Exception as e:
-                    logger.error(f"Failed to notify parent {parent_id}: {e}")
+    suppressed = await adb.get_suppressed_chats()
+    chat_ids = [chat_id for chat_id in dict.fromkeys(chat_ids) if chat_id]
+    report = await broadcast(bot, [chat_id for chat_id in chat_ids if chat_id not in suppressed], message)
+    report['suppressed'] = len(chat_ids) - report['total']
+    if report['blocked_ids']:
+        await adb.suppress_chats(report['blocked_ids'])
+    return report
 
 
 async def notify_link_approved(bot: Bot, parent_id: int, student_name: str):
@@ -72,10 +99,7 @@ async def notify_link_approved(bot: Bot, parent_id: int, student_name: str):
     message = f"✅ <b>Запрос одобрен!</b>\n\n"
     message += f"Вы теперь можете просматривать оценки и домашние задания ученика <b>{student_name}</b>."
     
-    try:
-        await bot.send_message(parent_id, message)
-    except Exception as e:
-        logger.error(f"Failed to notify parent {parent_id}: {e}")
+    await send_notification(bot, [parent_id], message)
 
 
 async def notify_link_rejected(bot: Bot, parent_id: int, student_name: str):
@@ -83,30 +107,4 @@ async def notify_link_rejected(bot: Bot, parent_id: int, student_name: str):
     message = f"❌ <b>Запрос отклонен</b>\n\n"
     message += f"Ваш запрос на просмотр данных ученика <b>{student_name}</b> был отклонен учителем."
     
-    try:
-        await bot.send_message(parent_id, message)
-    except Exception as e:
-        logger.error(f"Failed to notify parent {parent_id}: {e}")
-
-
-async def notify_deadline_reminder(bot: Bot, homework_id: int):
-    """Напоминание о дедлайне (за 1 день)"""
-    from database import db
-    
-    homework = db.get_homework(homework_id)
-    if not homework:
-        return
-    
-    message = f"⏰ <b>Напоминание о дедлайне!</b>\n\n"
-    message += f"Предмет: <b>{homework['subject_name']}</b>\n"
-    message += f"Задание: {homework['title']}\n"
-    message += f"📅 Срок сдачи: <b>{homework['deadline']}</b>\n"
-    
-    # Уведомление всех учеников
-    students = db.get_all_students()
-    for student in students:
-        if student['user_id']:
-            try:
-                await bot.send_message(student['user_id'], message)
-            except Exception as e:
-                logger.error(f"Failed to send deadline reminder to student {student['student_id']}: {e}")
+    await send_notification(bot, [parent_id], message)
@@ -0,0 +1,140 @@
+"""
+Доставка уведомлений из очереди notification_outbox
+
+Оценки (включая оповещения о зоне риска) и домашние задания пишут
+уведомления в notification_outbox той же транзакцией, что и сами данные,
+поэтому обработчик отвечает учителю сразу после фиксации, а перезапуск
+процесса не теряет сообщений. Воркер
+захватывает готовые строки пачками (на время аренды OUTBOX_LEASE),
+отправляет их через общий Broadcaster и отмечает результат: доставленные,
+повтор с экспоненциальной задержкой или отказ после OUTBOX_MAX_ATTEMPTS
+попыток. Строки, захваченные упавшим процессом, возвращаются в очередь по
+истечении аренды.
+
+Получатели, заблокировавшие бота или удалившие аккаунт, записываются в
+notification_suppressions, и их уведомления больше не отправляются.
+
+Новые оценки ждут в очереди окно NOTIFY_GRADE_WINDOW: за это время
+оценки, выставленные на уроке всему классу, накапливаются, и каждый
+получатель получает их одним сообщением.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+
+from config import (
+    BROADCAST_CONCURRENCY, OUTBOX_BATCH_SIZE, OUTBOX_LEASE, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_INTERVAL, OUTBOX_RETENTION_DAYS, OUTBOX_RETRY_DELAY,
+)
+from database import AsyncDatabase, adb
+from utils.broadcast import broadcaster
+from utils.notifications import FORMATTERS
+
+logger = logging.getLogger(__name__)
+
+# Период очистки завершённых уведомлений, секунд
+PURGE_INTERVAL = 3600
+
+
+def retry_delay(attempts: int) -> int:
+    """Задержка перед следующей попыткой после attempts неудачных"""
+    return OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+class OutboxWorker:
+    """Асинхронный воркер доставки notification_outbox"""
+
+    def __init__(self, bot: Bot, async_db: AsyncDatabase = adb, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL, max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.bot = bot
+        self.adb = async_db
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = 0.0
+
+    def start(self):
+        """Запуск воркера в текущем цикле событий"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка воркера; незавершённая пачка вернётся в очередь по истечении аренды"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """Цикл доставки: пачки подряд, пока очередь не опустеет, затем ожидание"""
+        logger.info("Notification outbox worker started")
+        while True:
+            try:
+                if time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                    self._purged_at = time.monotonic()
+                    await self.adb.purge_notifications(OUTBOX_RETENTION_DAYS)
+                if await self.process_batch():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in notification outbox worker: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def process_batch(self) -> int:
+        """Отправка одной пачки; возвращает число захваченных уведомлений"""
+        notifications = await self.adb.claim_notifications(self.batch_size, OUTBOX_LEASE)
+        if not notifications:
+            return 0
+
+        # Получатели, ставшие недоступными после постановки в очередь, пропускаются
+        suppressed = await self.adb.get_suppressed_chats()
+        skipped = [n['outbox_id'] for n in notifications if n['chat_id'] in suppressed]
+
+        # Уведомления одного вида одному получателю - одним сообщением
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for notification in notifications:
+            if notification['chat_id'] not in suppressed:
+                groups.setdefault((notification['chat_id'], notification['kind']), []).append(notification)
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def deliver(chat_id: int, kind: str, group: List[Dict[str, Any]]) -> str:
+            async with semaphore:
+                text = FORMATTERS[kind]([n['payload'] for n in group])
+                return await broadcaster.send(self.bot, chat_id, text)
+
+        results = await asyncio.gather(*(deliver(*key, group) for key, group in groups.items()),
+                                       return_exceptions=True)
+
+        delivered: List[int] = []
+        retries, failed, blocked = [], [], set()
+        for ((chat_id, _), group), result in zip(groups.items(), results):
+            if result == 'blocked':
+                blocked.add(chat_id)
+            attempts = max(n['attempts'] for n in group)
+            for notification in group:
+                outbox_id = notification['outbox_id']
+                if result == 'sent':
+                    delivered.append(outbox_id)
+                elif result == 'blocked':
+                    failed.append((outbox_id, 'blocked'))
+                elif attempts >= self.max_attempts:
+                    failed.append((outbox_id, str(result)))
+                else:
+                    retries.append((outbox_id, retry_delay(attempts), str(result)))
+        await self.adb.finish_notifications(delivered, retries, failed, skipped)
+        if blocked:
+            await self.adb.suppress_chats(blocked)
+        logger.info(
+            f"Outbox batch: {len(groups)} messages, {len(delivered)} delivered, "
+            f"{len(retries)} to retry, {len(failed)} failed, {len(skipped)} suppressed"
+        )
+        return len(notifications)
@@ -0,0 +1,119 @@
+"""
+Планировщик напоминаний о дедлайнах
+
+При запуске загружает из homework задания с будущим дедлайном, напоминание
+о которых ещё не отправлено (запрос по частичному индексу), и держит их в
+min-куче по времени напоминания - за DEADLINE_REMINDER_DAYS до дедлайна.
+Новые задания приходят от Database.add_homework через подписку, без
+повторного чтения таблицы. Между срабатываниями планировщик спит до
+ближайшего напоминания, поэтому в простое не тратит процессор.
+
+Напоминание отмечается в homework.reminder_sent_at и ставится в очередь
+notification_outbox одной транзакцией: после перезапуска оно не
+отправляется повторно, а доставку берёт на себя воркер очереди.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import DEADLINE_REMINDER_DAYS
+from database import AsyncDatabase, adb
+
+logger = logging.getLogger(__name__)
+
+
+def parse_deadline(deadline: Any) -> Optional[datetime]:
+    """Дедлайн из homework ('ГГГГ-ММ-ДД ЧЧ:ММ:СС' или 'ГГГГ-ММ-ДД'); None, если не разобрать"""
+    if not deadline:
+        return None
+    try:
+        return datetime.fromisoformat(str(deadline))
+    except ValueError:
+        return None
+
+
+class DeadlineScheduler:
+    """Напоминания о дедлайнах по min-куче (время напоминания, homework_id)"""
+
+    def __init__(self, async_db: AsyncDatabase = adb, remind_before: timedelta = timedelta(days=DEADLINE_REMINDER_DAYS)):
+        self.adb = async_db
+        self.remind_before = remind_before
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, homework_id: int, deadline: Any):
+        """Добавление задания в кучу (вызывается в цикле событий)"""
+        moment = parse_deadline(deadline)
+        if moment is None:
+            if deadline:
+                logger.warning(f"Homework {homework_id} has unparseable deadline {deadline!r}")
+            return
+        remind_at = moment - self.remind_before
+        heapq.heappush(self._heap, (remind_at, homework_id))
+        # Новое задание раньше текущего ближайшего - пересчитать время сна
+        if self._wakeup is not None and self._heap[0] == (remind_at, homework_id):
+            self._wakeup.set()
+
+    def start(self):
+        """Подписка на новые задания и запуск планировщика в текущем цикле событий"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        def on_homework_added(homework: Dict[str, Any]):
+            # Вызывается в потоке-писателе базы
+            loop.call_soon_threadsafe(self.schedule, homework['homework_id'], homework['deadline'])
+
+        # Подписка до загрузки: задание, добавленное между ними, попадёт в кучу
+        # дважды, но enqueue_deadline_reminder отправит напоминание один раз
+        self.adb.database.add_homework_listener(on_homework_added)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка планировщика"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self):
+        """Загрузка заданий с будущим дедлайном и неотправленным напоминанием"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for homework in await self.adb.get_pending_reminders(now):
+            self.schedule(homework['homework_id'], homework['deadline'])
+        logger.info(f"Deadline scheduler loaded {len(self._heap)} pending reminders")
+
+    async def run(self):
+        """Цикл: сон до ближайшего напоминания или нового задания, затем отправка наступивших"""
+        await self.load()
+        while True:
+            await self.fire_due(datetime.now())
+            self._wakeup.clear()
+            timeout = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire_due(self, now: datetime) -> int:
+        """Постановка в очередь наступивших напоминаний; возвращает их число"""
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, homework_id = heapq.heappop(self._heap)
+            try:
+                if await self.adb.enqueue_deadline_reminder(homework_id):
+                    fired += 1
+            except Exception as e:
+                logger.error(f"Error firing deadline reminder for homework {homework_id}: {e}")
+        return fired
@@ -0,0 +1,183 @@
+"""
+Табели успеваемости за четверть
+
+Для каждого ученика собираются средние и число оценок по предметам,
+недельная динамика и место в классе за период. Классы распределяются по
+процессам ProcessPoolExecutor: каждый процесс открывает базу только на
+чтение, строит табели своего класса и сразу записывает их на диск
+(JSON и HTML), а главный процесс сообщает о ходе работы по мере
+готовности классов.
+
+Процессы пула запускаются методом spawn: fork процесса бота с работающими
+потоками базы и циклом событий небезопасен.
+"""
+
+import html
+import json
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config import DATABASE_PATH, REPORT_WORKERS
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Папка учеников без класса
+NO_CLASS_DIR = 'no_class'
+
+
+def build_report_cards(students: List[Dict[str, Any]], rows: List[Dict[str, Any]],
+                       start: str, end: str) -> List[Dict[str, Any]]:
+    """Табели учеников класса из строк Database.get_term_grades
+
+    Место в классе - по среднему баллу за период; при равном среднем место
+    общее, ученики без оценок - в конце.
+    """
+    by_student = {student['student_id']: {} for student in students}
+    for row in rows:
+        subjects = by_student.get(row['student_id'])
+        if subjects is None:
+            continue
+        subject = subjects.setdefault(row['subject_id'], {
+            'subject_id': row['subject_id'],
+            'subject_name': row['subject_name'],
+            'grade_sum': 0,
+            'count': 0,
+            'weeks': [],
+        })
+        subject['grade_sum'] += row['grade_sum']
+        subject['count'] += row['grade_count']
+        subject['weeks'].append({
+            'week': row['week'],
+            'average': round(row['grade_sum'] / row['grade_count'], 2),
+            'count': row['grade_count'],
+        })
+
+    reports = []
+    for student in students:
+        subjects = list(by_student[student['student_id']].values())
+        total_sum = sum(s['grade_sum'] for s in subjects)
+        total_count = sum(s['count'] for s in subjects)
+        reports.append({
+            'student_id': student['student_id'],
+            'full_name': student['full_name'],
+            'class_name': student['class_name'],
+            'term': {'start': start, 'end': end},
+            'overall_average': round(total_sum / total_count, 2) if total_count else 0.0,
+            'total_grades': total_count,
+            'subjects': [
+                {
+                    'subject_id': s['subject_id'],
+                    'subject_name': s['subject_name'],
+                    'average': round(s['grade_sum'] / s['count'], 2),
+                    'count': s['count'],
+                    'weeks': s['weeks'],
+                }
+                for s in subjects
+            ],
+        })
+
+    ranked = sorted(reports, key=lambda r: (r['total_grades'] == 0, -r['overall_average']))
+    previous, rank = None, 0
+    for position, report in enumerate(ranked, 1):
+        key = (report['total_grades'] == 0, report['overall_average'])
+        if key != previous:
+            previous, rank = key, position
+        report['class_rank'] = rank
+        report['class_size'] = len(reports)
+    return reports
+
+
+def render_report_html(report: Dict[str, Any]) -> str:
+    """HTML-страница табеля"""
+    escape = html.escape
+    rows = []
+    for subject in report['subjects']:
+        weeks = ', '.join(f"{week['week']}: {week['average']}" for week in subject['weeks'])
+        rows.append(
+            f"<tr><td>{escape(subject['subject_name'])}</td><td>{subject['average']}</td>"
+            f"<td>{subject['count']}</td><td>{weeks}</td></tr>"
+        )
+    class_name = report['class_name'] or 'без класса'
+    return (
+        '<!DOCTYPE html>\n<html lang="ru"><head><meta charset="utf-8">'
+        f"<title>Табель: {escape(report['full_name'])}</title></head><body>"
+        f"<h1>{escape(report['full_name'])}</h1>"
+        f"<p>Класс: {escape(class_name)} · Период: {report['term']['start']} — {report['term']['end']}</p>"
+        f"<p>Средний балл: <b>{report['overall_average']}</b> · Оценок: {report['total_grades']} · "
+        f"Место в классе: {report['class_rank']} из {report['class_size']}</p>"
+        '<table border="1" cellpadding="4"><tr><th>Предмет</th><th>Средний балл</th>'
+        f"<th>Оценок</th><th>По неделям</th></tr>{''.join(rows)}</table></body></html>\n"
+    )
+
+
+def class_directory(class_name: Optional[str]) -> str:
+    """Имя папки класса, безопасное для файловой системы"""
+    if not class_name:
+        return NO_CLASS_DIR
+    return re.sub(r'[^\w-]+', '_', class_name)
+
+
+def write_class_reports(db_path: str, class_name: Optional[str], start: str, end: str, out_dir: str) -> int:
+    """Табели одного класса (выполняется в процессе пула); возвращает число учеников"""
+    database = Database(Path(db_path), read_only=True)
+    try:
+        students = database.get_students_by_class_name(class_name)
+        rows = database.get_term_grades(class_name, start, end)
+    finally:
+        database.close()
+
+    directory = Path(out_dir) / class_directory(class_name)
+    directory.mkdir(parents=True, exist_ok=True)
+    for report in build_report_cards(students, rows, start, end):
+        path = directory / str(report['student_id'])
+        path.with_suffix('.json').write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        path.with_suffix('.html').write_text(render_report_html(report), encoding='utf-8')
+    return len(students)
+
+
+def generate_report_cards(start: str, end: str, out_dir: Path, workers: int = REPORT_WORKERS,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          db_path: Path = DATABASE_PATH) -> Dict[str, Any]:
+    """Табели всех учеников школы за период [start, end] в папку out_dir
+
+    progress(done, total) вызывается после каждого готового класса с числом
+    обработанных и всех учеников.
+    """
+    database = Database(Path(db_path), read_only=True)
+    try:
+        classes = database.get_student_class_sizes()
+    finally:
+        database.close()
+    total = sum(c['student_count'] for c in classes)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    done = 0
+    if progress:
+        progress(done, total)
+    # Крупные классы первыми: процессы загружаются равномернее
+    classes.sort(key=lambda c: c['student_count'], reverse=True)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {
+            pool.submit(write_class_reports, str(db_path), c['class_name'], start, end, str(out_dir)): c
+            for c in classes
+        }
+        for future in as_completed(futures):
+            done += future.result()
+            if progress:
+                progress(done, total)
+
+    summary = {
+        'term': {'start': start, 'end': end},
+        'classes': [{'class_name': c['class_name'], 'directory': class_directory(c['class_name']),
+                     'students': c['student_count']} for c in sorted(classes, key=lambda c: c['class_name'] or '')],
+        'students': total,
+    }
+    (out_dir / 'index.json').write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    logger.info(f"Report cards for {total} students written to {out_dir}")
+    return summary
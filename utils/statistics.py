@@ -1,5 +1,6 @@
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+from config import MIN_GRADE, MAX_GRADE
 from database import db
 
 
@@ -11,67 +12,145 @@ def calculate_average_grade(grades: List[Dict[str, Any]]) -> float:
     return round(total / len(grades), 2)
 
 
-def get_student_statistics(student_id: int) -> Dict[str, Any]:
-    """Получение статистики ученика"""
-    grades = db.get_student_grades(student_id)
-    subjects = db.get_all_subjects()
+def build_student_statistics(aggregates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Статистика ученика из его строк grade_aggregates (упорядоченных по предмету)"""
+    total_sum = sum(a['grade_sum'] for a in aggregates)
+    total_count = sum(a['grade_count'] for a in aggregates)
     
     stats = {
-        'overall_average': calculate_average_grade(grades),
-        'total_grades': len(grades),
+        'overall_average': round(total_sum / total_count, 2) if total_count else 0.0,
+        'total_grades': total_count,
         'subject_averages': {}
     }
     
     # Средний балл по каждому предмету
-    for subject in subjects:
-        subject_grades = [g for g in grades if g['subject_id'] == subject['subject_id']]
-        if subject_grades:
-            stats['subject_averages'][subject['name']] = {
-                'average': calculate_average_grade(subject_grades),
-                'count': len(subject_grades),
-                'last_grade': subject_grades[0]['grade'] if subject_grades else None
-            }
+    for aggregate in aggregates:
+        stats['subject_averages'][aggregate['subject_name']] = {
+            'average': round(aggregate['grade_sum'] / aggregate['grade_count'], 2),
+            'count': aggregate['grade_count'],
+            'last_grade': aggregate['last_grade']
+        }
     
     return stats
 
 
-def get_grade_dynamics(student_id: int, subject_id: int, days: int = 30) -> List[Dict[str, Any]]:
-    """Получение динамики оценок за период"""
-    grades = db.get_grades_by_subject(student_id, subject_id)
-    cutoff_date = datetime.now() - timedelta(days=days)
-    
-    recent_grades = [
-        g for g in grades 
-        if datetime.strptime(g['date'], '%Y-%m-%d') >= cutoff_date
-    ]
+def get_student_statistics(student_id: int) -> Dict[str, Any]:
+    """Получение статистики ученика (из агрегатов grade_aggregates)"""
+    return build_student_statistics(db.get_grade_aggregates(student_id))
+
+
+def get_students_statistics(student_ids: List[int] = None, class_name: str = None) -> Dict[int, Dict[str, Any]]:
+    """Статистика нескольких учеников (или всего класса) одним запросом к агрегатам"""
+    if class_name:
+        student_ids = [s['student_id'] for s in db.get_students_by_class_name(class_name)]
     
-    # Группировка по неделям
-    weekly_data = {}
-    for grade in recent_grades:
-        date = datetime.strptime(grade['date'], '%Y-%m-%d')
-        week = date.strftime('%Y-W%W')
-        
-        if week not in weekly_data:
-            weekly_data[week] = []
-        weekly_data[week].append(grade['grade'])
+    by_student = {student_id: [] for student_id in student_ids or []}
+    for aggregate in db.get_grade_aggregates_batch(list(by_student)):
+        by_student[aggregate['student_id']].append(aggregate)
     
-    # Вычисление средних по неделям
-    dynamics = []
-    for week, grades_list in sorted(weekly_data.items()):
-        dynamics.append({
-            'week': week,
-            'average': round(sum(grades_list) / len(grades_list), 2),
-            'count': len(grades_list)
-        })
-    
-    return dynamics
+    return {
+        student_id: build_student_statistics(aggregates)
+        for student_id, aggregates in by_student.items()
+    }
+
+
+def _dynamics_since(days: int) -> str:
+    """Первый день периода: оценка за день попадает в период, если полночь этого дня не раньше cutoff"""
+    cutoff = datetime.now() - timedelta(days=days)
+    first_day = cutoff.date() if cutoff.time() == time.min else cutoff.date() + timedelta(days=1)
+    return first_day.strftime('%Y-%m-%d')
+
+
+def _weekly_series(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Точки графика из строк Database.get_weekly_grades"""
+    return [
+        {'week': row['week'], 'average': round(row['grade_sum'] / row['grade_count'], 2), 'count': row['grade_count']}
+        for row in rows
+    ]
+
+
+def get_grade_dynamics(student_id: int, subject_id: int, days: int = 30) -> List[Dict[str, Any]]:
+    """Получение динамики оценок за период (по неделям, одним запросом)"""
+    rows = db.get_weekly_grades(_dynamics_since(days), student_id=student_id, subject_ids=[subject_id])
+    return _weekly_series(rows)
+
+
+def get_subjects_dynamics(student_id: int = None, class_name: str = None,
+                          subject_ids: List[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    """Недельная динамика по всем предметам ученика или класса одним запросом
+
+    Возвращает серии по предметам (в порядке названий):
+    [{'subject_id', 'subject_name', 'weeks': [{'week', 'average', 'count'}, ...]}, ...]
+    """
+    rows = db.get_weekly_grades(_dynamics_since(days), student_id=student_id,
+                                subject_ids=subject_ids, class_name=class_name)
+    series = []
+    for row in rows:
+        if not series or series[-1]['subject_id'] != row['subject_id']:
+            series.append({'subject_id': row['subject_id'], 'subject_name': row['subject_name'], 'rows': []})
+        series[-1]['rows'].append(row)
+    return [
+        {'subject_id': s['subject_id'], 'subject_name': s['subject_name'], 'weeks': _weekly_series(s['rows'])}
+        for s in series
+    ]
+
+
+def histogram_median(histogram: Dict[int, int]) -> float:
+    """Медиана по гистограмме оценок (среднее двух средних значений при чётном числе)"""
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    middle = [(total - 1) // 2, total // 2]
+    values, seen = [], 0
+    for grade in sorted(histogram):
+        seen += histogram[grade]
+        while middle and middle[0] < seen:
+            values.append(grade)
+            middle.pop(0)
+    return round(sum(values) / 2, 2)
+
+
+def histogram_percentile_rank(histogram: Dict[int, int], value: float) -> float:
+    """Процентильный ранг значения: доля оценок ниже него (равные считаются наполовину)"""
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    below = sum(count for grade, count in histogram.items() if grade < value)
+    equal = histogram.get(value, 0)
+    return round((below + equal / 2) / total * 100, 1)
+
+
+def get_grade_distribution(subject_id: int, class_name: str = None, student_id: int = None) -> Dict[str, Any]:
+    """Распределение оценок предмета в классе (или школе) и место ученика в нём
+
+    Счётчики гистограммы поддерживаются при каждой записи оценки, поэтому
+    медиана и процентильный ранг считаются по MAX_GRADE - MIN_GRADE + 1
+    значениям без чтения самих оценок.
+    """
+    histogram = db.get_grade_histogram(subject_id, class_name)
+    total = sum(histogram.values())
+    distribution = {
+        'subject_id': subject_id,
+        'class_name': class_name,
+        'total': total,
+        'histogram': {grade: histogram.get(grade, 0) for grade in range(MIN_GRADE, MAX_GRADE + 1)},
+        'average': round(sum(g * c for g, c in histogram.items()) / total, 2) if total else 0.0,
+        'median': histogram_median(histogram),
+    }
+    if student_id is not None:
+        aggregate = next((a for a in db.get_grade_aggregates(student_id) if a['subject_id'] == subject_id), None)
+        average = round(aggregate['grade_sum'] / aggregate['grade_count'], 2) if aggregate else None
+        distribution['student'] = {
+            'student_id': student_id,
+            'average': average,
+            'percentile_rank': histogram_percentile_rank(histogram, average) if average is not None else None,
+        }
+    return distribution
 
 
 def get_class_statistics(class_name: str = None) -> Dict[str, Any]:
-    """Получение статистики по классу"""
-    students = db.get_all_students()
-    if class_name:
-        students = [s for s in students if s['class_name'] == class_name]
+    """Получение статистики по классу (все ученики одним запросом к агрегатам)"""
+    students = db.get_student_rankings(class_name)
     
     stats = {
         'total_students': len(students),
@@ -80,12 +159,12 @@ def get_class_statistics(class_name: str = None) -> Dict[str, Any]:
     
     # Рейтинг учеников
     for student in students:
-        student_stats = get_student_statistics(student['student_id'])
+        count = student['grade_count']
         stats['student_rankings'].append({
             'student_id': student['student_id'],
             'full_name': student['full_name'],
-            'average': student_stats['overall_average'],
-            'total_grades': student_stats['total_grades']
+            'average': round(student['grade_sum'] / count, 2) if count else 0.0,
+            'total_grades': count
         })
     
     # Сортировка по среднему баллу
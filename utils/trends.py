@@ -0,0 +1,65 @@
+"""
+Скользящее состояние оценок ученика по предмету
+
+Для каждой пары (ученик, предмет) хранится EWMA оценок, число оценок по
+дням за последние AT_RISK_WINDOW_DAYS дней (скользящее окно, не больше
+AT_RISK_WINDOW_DAYS записей) и признак зоны риска. Новая оценка обновляет
+состояние за O(1); ученик попадает в зону риска, когда EWMA опускается
+ниже его среднего по предмету на AT_RISK_DROP баллов (при достаточном
+числе оценок в окне), и выходит из неё, когда отставание сокращается до
+AT_RISK_RECOVERY.
+"""
+
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from config import AT_RISK_ALPHA, AT_RISK_DROP, AT_RISK_RECOVERY, AT_RISK_WINDOW_DAYS, AT_RISK_MIN_GRADES
+
+
+def _parse_day(value: Any) -> Optional[date]:
+    """День оценки из столбца date; None, если дата не в формате ISO"""
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def advance_window(window: Dict[str, int], day: str) -> Dict[str, int]:
+    """Окно {'ГГГГ-ММ-ДД': число оценок} после оценки за day
+
+    В окне остаются дни не старше AT_RISK_WINDOW_DAYS до самой поздней
+    оценки. Оценка с датой не в формате ISO в окно не попадает.
+    """
+    current = _parse_day(day)
+    if current is None:
+        return window
+    window = dict(window)
+    key = current.isoformat()
+    window[key] = window.get(key, 0) + 1
+    newest = max(date.fromisoformat(d) for d in window)
+    return {d: count for d, count in window.items() if (newest - date.fromisoformat(d)).days < AT_RISK_WINDOW_DAYS}
+
+
+def advance_trend(state: Optional[Dict[str, Any]], grade: int, day: str,
+                  average: float) -> Tuple[Dict[str, Any], bool]:
+    """Состояние после новой оценки и признак входа в зону риска
+
+    state - {'ewma', 'window_days', 'at_risk'} или None для первой оценки
+    (window_days - окно advance_window); average - среднее ученика по предмету с учётом
+    этой оценки.
+    """
+    if state is None:
+        ewma, window, at_risk = float(grade), {}, False
+    else:
+        ewma = AT_RISK_ALPHA * grade + (1 - AT_RISK_ALPHA) * state['ewma']
+        window, at_risk = state['window_days'], bool(state['at_risk'])
+    window = advance_window(window, day)
+
+    drop = average - ewma
+    entered = False
+    if not at_risk and sum(window.values()) >= AT_RISK_MIN_GRADES and drop >= AT_RISK_DROP:
+        at_risk = entered = True
+    elif at_risk and drop <= AT_RISK_RECOVERY:
+        at_risk = False
+
+    return {'ewma': ewma, 'window_days': window, 'at_risk': at_risk}, entered
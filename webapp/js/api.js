@@ -201,6 +201,31 @@ const API = {
         return await this.apiRequest('GET', `/api/statistics?student_id=${studentId}`);
     },
 
+    // Статистика нескольких учеников одним запросом: { student_id: stats }
+    async getStatisticsBatch(studentIds) {
+        if (this.isDemoMode()) {
+            const result = {};
+            for (const studentId of studentIds) {
+                result[studentId] = await this.getStatistics(studentId);
+            }
+            return result;
+        }
+
+        return await this.apiRequest('POST', '/api/statistics/batch', { student_ids: studentIds });
+    },
+
+    // Недельная динамика по всем предметам ученика или класса: [{ subject_id, subject_name, weeks }]
+    async getGradeDynamics({ studentId = null, className = null, days = 30 } = {}) {
+        if (this.isDemoMode()) {
+            return [];
+        }
+
+        const params = new URLSearchParams({ days });
+        if (studentId) params.set('student_id', studentId);
+        if (className) params.set('class_name', className);
+        return await this.apiRequest('GET', `/api/statistics/dynamics?${params}`);
+    },
+
     // ============ PARENT STUDENTS ============
 
     async getParentStudents(parentId) {
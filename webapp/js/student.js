@@ -12,6 +12,7 @@ async function initStudentInterface(userId) {
     }
 
     await loadStudentStatistics(student.student_id);
+    await loadStudentDynamics(student.student_id);
     await loadStudentGradesView(student.student_id);
     await loadStudentHomework();
 }
@@ -45,6 +46,35 @@ async function loadStudentStatistics(studentId) {
     }
 }
 
+// Недельная динамика по всем предметам одним запросом: столбец на неделю, высота - средний балл
+async function loadStudentDynamics(studentId) {
+    try {
+        const series = await API.getGradeDynamics({ studentId, days: 60 });
+        if (series.length === 0) {
+            return;
+        }
+
+        const maxAverage = Math.max(10, ...series.flatMap(s => s.weeks.map(w => w.average)));
+        const charts = series.map(s => `
+            <div class="stat-card">
+                <h3>${s.subject_name}</h3>
+                <div class="dynamics-chart">
+                    ${s.weeks.map(w => `
+                        <div class="dynamics-week" title="${w.week}: ${w.average} (${w.count} оценок)">
+                            <div class="dynamics-bar" style="height: ${Math.round(w.average / maxAverage * 100)}%"></div>
+                            <div class="dynamics-label">${w.average}</div>
+                        </div>
+                    `).join('')}
+                </div>
+            </div>
+        `).join('');
+
+        document.getElementById('student-stats').innerHTML += `<h3 style="margin-top: 20px; margin-bottom: 12px;">Динамика по неделям:</h3>${charts}`;
+    } catch (error) {
+        console.error('Error loading grade dynamics:', error);
+    }
+}
+
 async function loadStudentGradesView(studentId) {
     try {
         const grades = await API.getGrades(studentId);
@@ -181,8 +181,8 @@ async function loadClassStatistics() {
         let totalAverage = 0;
         let studentCount = 0;
 
-        for (const student of students) {
-            const stats = await API.getStatistics(student.student_id);
+        const allStats = await API.getStatisticsBatch(students.map(s => s.student_id));
+        for (const stats of Object.values(allStats)) {
             if (stats.overall_average > 0) {
                 totalAverage += parseFloat(stats.overall_average);
                 studentCount++;
@@ -7,12 +7,20 @@ Updated: 2025-11-28 - Added user role API endpoint
 from aiohttp import web
 import aiohttp_cors
 import asyncio
+import base64
 import json
 import logging
+import secrets
 from pathlib import Path
 from datetime import datetime
-from database import db
-from utils.statistics import get_student_statistics
+from config import API_MAX_PAGE_SIZE, API_MAX_BATCH_SIZE, REPORTS_DIR, REPORT_WORKERS
+from database import adb, PAGE_KEYS
+from utils.statistics import (get_student_statistics, get_students_statistics, get_subjects_dynamics,
+                              get_grade_distribution)
+from utils.analytics import grade_report, GROUP_BY
+from utils.leaderboard import leaderboards
+from utils.report_cards import generate_report_cards
+from utils.export import FORMATS, export_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +92,41 @@ async def serve_css(request):
         return web.Response(status=500, text=str(e))
 
 
+# ============ PAGINATION ============
+
+def encode_cursor(row: dict, key: tuple) -> str:
+    """Непрозрачный курсор из ключа последней строки страницы"""
+    values = json.dumps([row[column] for column in key], ensure_ascii=False)
+    return base64.urlsafe_b64encode(values.encode()).decode()
+
+
+def get_page_params(request, key: tuple):
+    """limit и ключ after из параметров limit и cursor; ValueError при ошибке"""
+    limit = request.query.get('limit')
+    limit = min(int(limit), API_MAX_PAGE_SIZE) if limit else None
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive')
+    cursor = request.query.get('cursor')
+    after = json.loads(base64.urlsafe_b64decode(cursor.encode())) if cursor else None
+    if after is not None and (not isinstance(after, list) or len(after) != len(key)):
+        raise ValueError('invalid cursor')
+    return limit, after
+
+
+def page_response(rows: list, limit, key: tuple):
+    """Ответ со страницей; rows запрошены с limit + 1, чтобы узнать о продолжении"""
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], key)
+    return web.json_response({'success': True, 'data': rows, 'next_cursor': next_cursor})
+
+
+def bad_page_params(e: Exception):
+    """Ответ 400 на некорректные limit или cursor"""
+    return web.json_response({'success': False, 'error': f'Invalid pagination: {e}'}, status=400)
+
+
 # ============ API HANDLERS ============
 
 async def api_get_user(request):
@@ -92,13 +135,12 @@ async def api_get_user(request):
     logger.info(f"API: GET /api/user/{user_id}")
     try:
         # user_id здесь это telegram_id из фронтенда
-        user = await asyncio.to_thread(db.get_user, user_id)
+        user = await adb.get_user(user_id)
         if not user:
             return web.json_response({'success': False, 'error': 'User not found'}, status=404)
         
-        # Проверяем является ли админом
-        is_admin = await asyncio.to_thread(db.is_admin, user_id)
-        user['is_admin'] = is_admin
+        # Флаг админа берём из той же записи, без повторного запроса
+        user['is_admin'] = user.get('is_admin', 0) == 1
         
         return web.json_response({'success': True, 'data': user})
     except Exception as e:
@@ -108,10 +150,14 @@ async def api_get_user(request):
 async def api_get_students(request):
     """Получение списка учеников"""
     logger.info(f"API: GET /api/students")
+    key = PAGE_KEYS['students']
     try:
-        # Запускаем синхронную работу с БД в отдельном потоке
-        students = await asyncio.to_thread(db.get_all_students)
-        return web.json_response({'success': True, 'data': students})
+        limit, after = get_page_params(request, key)
+    except ValueError as e:
+        return bad_page_params(e)
+    try:
+        students = await adb.get_all_students(limit=limit and limit + 1, after=after)
+        return page_response(students, limit, key)
     except Exception as e:
         logger.error(f"Error getting students: {e}")
         return web.json_response({'success': False, 'error': str(e)}, status=500)
@@ -121,7 +167,7 @@ async def api_get_student(request):
     student_id = int(request.match_info['student_id'])
     logger.info(f"API: GET /api/students/{student_id}")
     try:
-        student = await asyncio.to_thread(db.get_student, student_id)
+        student = await adb.get_student(student_id)
         if not student:
             return web.json_response({'success': False, 'error': 'Student not found'}, status=404)
         return web.json_response({'success': True, 'data': student})
@@ -133,7 +179,7 @@ async def api_get_subjects(request):
     """Получение списка предметов"""
     logger.info(f"API: GET /api/subjects")
     try:
-        subjects = await asyncio.to_thread(db.get_all_subjects)
+        subjects = await adb.get_all_subjects()
         return web.json_response({'success': True, 'data': subjects})
     except Exception as e:
         logger.error(f"Error getting subjects: {e}")
@@ -147,9 +193,14 @@ async def api_get_grades(request):
     if not student_id:
         return web.json_response({'success': False, 'error': 'student_id is required'}, status=400)
     
+    key = PAGE_KEYS['grades']
+    try:
+        limit, after = get_page_params(request, key)
+    except ValueError as e:
+        return bad_page_params(e)
     try:
-        grades = await asyncio.to_thread(db.get_student_grades, int(student_id))
-        return web.json_response({'success': True, 'data': grades})
+        grades = await adb.get_student_grades(int(student_id), limit=limit and limit + 1, after=after)
+        return page_response(grades, limit, key)
     except Exception as e:
         logger.error(f"Error getting grades: {e}")
         return web.json_response({'success': False, 'error': str(e)}, status=500)
@@ -170,13 +221,13 @@ async def api_add_grade(request):
         if not all([student_id, subject_id, grade, teacher_id]):
             return web.json_response({'success': False, 'error': 'Missing required fields'}, status=400)
             
-        success = await asyncio.to_thread(
-            db.add_grade,
+        success = await adb.add_grade(
             student_id=int(student_id),
             subject_id=int(subject_id),
             grade=int(grade),
             comment=comment,
-            teacher_id=int(teacher_id)
+            teacher_id=int(teacher_id),
+            date=datetime.now().strftime('%Y-%m-%d')
         )
         
         if success:
@@ -201,7 +252,7 @@ async def api_update_grade(request):
         if grade is None:
             return web.json_response({'success': False, 'error': 'Grade is required'}, status=400)
             
-        success = await asyncio.to_thread(db.update_grade, grade_id, int(grade), comment)
+        success = await adb.update_grade(grade_id, int(grade), comment)
         
         if success:
             return web.json_response({'success': True})
@@ -217,7 +268,7 @@ async def api_get_homework(request):
     logger.info(f"API: GET /api/homework subject_id={subject_id}")
     try:
         if subject_id:
-            homework = await asyncio.to_thread(db.get_homework, int(subject_id))
+            homework = await adb.get_homework(int(subject_id))
         else:
             homework = [] 
             
@@ -235,18 +286,107 @@ async def api_get_statistics(request):
         return web.json_response({'success': False, 'error': 'student_id is required'}, status=400)
         
     try:
-        stats = await asyncio.to_thread(get_student_statistics, int(student_id))
+        stats = await adb.run(get_student_statistics, int(student_id))
         return web.json_response({'success': True, 'data': stats})
     except Exception as e:
         logger.error(f"Error getting statistics: {e}")
         return web.json_response({'success': False, 'error': str(e)}, status=500)
 
+async def api_get_statistics_batch(request):
+    """Статистика нескольких учеников: {"student_ids": [...]} или {"class_name": "..."}"""
+    logger.info("API: POST /api/statistics/batch")
+    try:
+        data = await request.json()
+        class_name = data.get('class_name')
+        student_ids = [int(student_id) for student_id in data.get('student_ids') or []]
+    except (ValueError, TypeError, AttributeError) as e:
+        return web.json_response({'success': False, 'error': f'Invalid request: {e}'}, status=400)
+    
+    if not class_name and not student_ids:
+        return web.json_response({'success': False, 'error': 'student_ids or class_name is required'}, status=400)
+    if len(student_ids) > API_MAX_BATCH_SIZE:
+        return web.json_response(
+            {'success': False, 'error': f'Too many students (max {API_MAX_BATCH_SIZE})'}, status=400
+        )
+    
+    try:
+        stats = await adb.run(get_students_statistics, student_ids, class_name)
+        # Ключи JSON-объекта - строки
+        return web.json_response({'success': True, 'data': {str(k): v for k, v in stats.items()}})
+    except Exception as e:
+        logger.error(f"Error getting batch statistics: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+async def api_get_statistics_dynamics(request):
+    """Недельная динамика оценок по предметам: ?student_id=... или ?class_name=..., опционально subject_id, days"""
+    student_id = request.query.get('student_id')
+    class_name = request.query.get('class_name')
+    logger.info(f"API: GET /api/statistics/dynamics student_id={student_id} class_name={class_name}")
+    
+    if not student_id and not class_name:
+        return web.json_response({'success': False, 'error': 'student_id or class_name is required'}, status=400)
+    try:
+        subject_id = request.query.get('subject_id')
+        subject_ids = [int(subject_id)] if subject_id else None
+        days = int(request.query.get('days', 30))
+        student_id = int(student_id) if student_id else None
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': f'Invalid parameter: {e}'}, status=400)
+    
+    try:
+        series = await adb.run(get_subjects_dynamics, student_id, class_name, subject_ids, days)
+        return web.json_response({'success': True, 'data': series})
+    except Exception as e:
+        logger.error(f"Error getting grade dynamics: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+async def api_get_statistics_distribution(request):
+    """Распределение оценок предмета: ?subject_id=..., опционально class_name и student_id"""
+    logger.info(f"API: GET /api/statistics/distribution {dict(request.query)}")
+    try:
+        subject_id = int(request.query['subject_id'])
+        student_id = request.query.get('student_id')
+        student_id = int(student_id) if student_id else None
+    except KeyError:
+        return web.json_response({'success': False, 'error': 'subject_id is required'}, status=400)
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': f'Invalid parameter: {e}'}, status=400)
+    
+    try:
+        distribution = await adb.run(get_grade_distribution, subject_id, request.query.get('class_name'), student_id)
+        return web.json_response({'success': True, 'data': distribution})
+    except Exception as e:
+        logger.error(f"Error getting grade distribution: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+async def api_get_leaderboard(request):
+    """Рейтинг учеников: школы, ?class_name=... или ?subject_id=..."""
+    class_name = request.query.get('class_name')
+    subject_id = request.query.get('subject_id')
+    logger.info(f"API: GET /api/leaderboard class_name={class_name} subject_id={subject_id}")
+    try:
+        if subject_id:
+            scope, key = 'subject', int(subject_id)
+        elif class_name:
+            scope, key = 'class', class_name
+        else:
+            scope, key = 'school', None
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': f'Invalid parameter: {e}'}, status=400)
+    
+    try:
+        board = await adb.run(leaderboards.get, scope, key)
+        return web.json_response({'success': True, 'data': board})
+    except Exception as e:
+        logger.error(f"Error getting leaderboard: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
 async def api_get_parent_students(request):
     """Получение детей родителя"""
     parent_id = int(request.match_info['parent_id'])
     logger.info(f"API: GET /api/parent/{parent_id}/students")
     try:
-        students = await asyncio.to_thread(db.get_parent_students, parent_id)
+        students = await adb.get_parent_students(parent_id)
         return web.json_response({'success': True, 'data': students})
     except Exception as e:
         logger.error(f"Error getting parent students: {e}")
@@ -257,7 +397,7 @@ async def api_delete_subject(request):
     subject_id = int(request.match_info['subject_id'])
     logger.info(f"API: DELETE /api/subjects/{subject_id}")
     try:
-        success = await asyncio.to_thread(db.delete_subject, subject_id)
+        success = await adb.delete_subject(subject_id)
         if success:
             return web.json_response({'success': True})
         else:
@@ -278,7 +418,7 @@ async def api_add_subject(request):
         if not name or not teacher_id:
             return web.json_response({'success': False, 'error': 'Name and teacher_id are required'}, status=400)
         
-        subject_id = await asyncio.to_thread(db.add_subject, name, int(teacher_id), int(max_grade))
+        subject_id = await adb.add_subject(name, int(teacher_id), int(max_grade))
         if subject_id:
             return web.json_response({'success': True, 'data': {'subject_id': subject_id}})
         else:
@@ -300,7 +440,7 @@ async def api_add_student(request):
         if not full_name or not class_name:
             return web.json_response({'success': False, 'error': 'full_name and class_name are required'}, status=400)
         
-        student_id = await asyncio.to_thread(db.add_student, full_name, class_name, user_id)
+        student_id = await adb.add_student(full_name, class_name, user_id)
         if student_id:
             return web.json_response({'success': True, 'data': {'student_id': student_id}})
         else:
@@ -324,8 +464,7 @@ async def api_add_homework(request):
         if not subject_id or not title or not teacher_id:
             return web.json_response({'success': False, 'error': 'subject_id, title, and teacher_id are required'}, status=400)
         
-        homework_id = await asyncio.to_thread(
-            db.add_homework,
+        homework_id = await adb.add_homework(
             int(subject_id),
             title,
             description,
@@ -347,7 +486,7 @@ async def api_get_classes(request):
     """Получение списка классов с количеством учеников"""
     logger.info("API: GET /api/admin/classes")
     try:
-        classes = await asyncio.to_thread(db.get_classes_with_student_count)
+        classes = await adb.get_classes_with_student_count()
         return web.json_response({'success': True, 'data': classes})
     except Exception as e:
         logger.error(f"Error getting classes: {e}")
@@ -363,7 +502,7 @@ async def api_add_class(request):
         if not name:
             return web.json_response({'success': False, 'error': 'Name is required'}, status=400)
         
-        class_id = await asyncio.to_thread(db.create_class, name)
+        class_id = await adb.create_class(name)
         if class_id:
             return web.json_response({'success': True, 'data': {'class_id': class_id}})
         else:
@@ -378,7 +517,7 @@ async def api_delete_class(request):
     class_id = int(request.match_info['class_id'])
     logger.info(f"API: DELETE /api/admin/classes/{class_id}")
     try:
-        success = await asyncio.to_thread(db.delete_class, class_id)
+        success = await adb.delete_class(class_id)
         if success:
             return web.json_response({'success': True})
         else:
@@ -392,7 +531,7 @@ async def api_get_teachers(request):
     """Получение списка учителей"""
     logger.info("API: GET /api/admin/teachers")
     try:
-        teachers = await asyncio.to_thread(db.get_all_teachers)
+        teachers = await adb.get_all_teachers()
         return web.json_response({'success': True, 'data': teachers})
     except Exception as e:
         logger.error(f"Error getting teachers: {e}")
@@ -403,7 +542,7 @@ async def api_get_assignments(request):
     """Получение всех назначений учителей"""
     logger.info("API: GET /api/admin/assignments")
     try:
-        assignments = await asyncio.to_thread(db.get_all_assignments)
+        assignments = await adb.get_all_assignments()
         return web.json_response({'success': True, 'data': assignments})
     except Exception as e:
         logger.error(f"Error getting assignments: {e}")
@@ -422,8 +561,8 @@ async def api_add_assignment(request):
         if not all([teacher_id, class_id, subject_id]):
             return web.json_response({'success': False, 'error': 'All fields required'}, status=400)
         
-        assignment_id = await asyncio.to_thread(
-            db.assign_teacher, int(teacher_id), int(class_id), int(subject_id)
+        assignment_id = await adb.assign_teacher(
+            int(teacher_id), int(class_id), int(subject_id)
         )
         if assignment_id:
             return web.json_response({'success': True, 'data': {'assignment_id': assignment_id}})
@@ -439,7 +578,7 @@ async def api_delete_assignment(request):
     assignment_id = int(request.match_info['assignment_id'])
     logger.info(f"API: DELETE /api/admin/assignments/{assignment_id}")
     try:
-        success = await asyncio.to_thread(db.delete_assignment, assignment_id)
+        success = await adb.delete_assignment(assignment_id)
         if success:
             return web.json_response({'success': True})
         else:
@@ -453,9 +592,14 @@ async def api_get_invites(request):
     """Получение списка приглашений"""
     include_used = request.query.get('include_used', 'false') == 'true'
     logger.info(f"API: GET /api/admin/invites include_used={include_used}")
+    key = PAGE_KEYS['invites']
     try:
-        invites = await asyncio.to_thread(db.get_all_invites, include_used)
-        return web.json_response({'success': True, 'data': invites})
+        limit, after = get_page_params(request, key)
+    except ValueError as e:
+        return bad_page_params(e)
+    try:
+        invites = await adb.get_all_invites(include_used, limit=limit and limit + 1, after=after)
+        return page_response(invites, limit, key)
     except Exception as e:
         logger.error(f"Error getting invites: {e}")
         return web.json_response({'success': False, 'error': str(e)}, status=500)
@@ -474,7 +618,7 @@ async def api_create_invite(request):
         if not all([role, full_name, created_by]):
             return web.json_response({'success': False, 'error': 'role, full_name, created_by required'}, status=400)
         
-        code = await asyncio.to_thread(db.create_invite, role, full_name, int(created_by), target_data)
+        code = await adb.create_invite(role, full_name, int(created_by), target_data)
         if code:
             return web.json_response({'success': True, 'data': {'code': code}})
         else:
@@ -488,7 +632,7 @@ async def api_get_admins(request):
     """Получение списка админов"""
     logger.info("API: GET /api/admin/admins")
     try:
-        admins = await asyncio.to_thread(db.get_all_admins)
+        admins = await adb.get_all_admins()
         return web.json_response({'success': True, 'data': admins})
     except Exception as e:
         logger.error(f"Error getting admins: {e}")
@@ -504,7 +648,7 @@ async def api_make_admin(request):
         if not user_id:
             return web.json_response({'success': False, 'error': 'user_id required'}, status=400)
         
-        success = await asyncio.to_thread(db.make_admin, int(user_id))
+        success = await adb.make_admin(int(user_id))
         if success:
             return web.json_response({'success': True})
         else:
@@ -519,7 +663,7 @@ async def api_remove_admin(request):
     user_id = int(request.match_info['user_id'])
     logger.info(f"API: DELETE /api/admin/admins/{user_id}")
     try:
-        success = await asyncio.to_thread(db.remove_admin, user_id)
+        success = await adb.remove_admin(user_id)
         if success:
             return web.json_response({'success': True})
         else:
@@ -532,20 +676,158 @@ async def api_remove_admin(request):
 async def api_get_users(request):
     """Получение всех пользователей"""
     logger.info("API: GET /api/admin/users")
+    key = PAGE_KEYS['users']
+    try:
+        limit, after = get_page_params(request, key)
+    except ValueError as e:
+        return bad_page_params(e)
     try:
-        users = await asyncio.to_thread(db.get_all_users)
-        return web.json_response({'success': True, 'data': users})
+        users = await adb.get_all_users(limit=limit and limit + 1, after=after)
+        return page_response(users, limit, key)
     except Exception as e:
         logger.error(f"Error getting users: {e}")
         return web.json_response({'success': False, 'error': str(e)}, status=500)
 
 
+async def api_get_metrics(request):
+    """Метрики внутренних кешей"""
+    logger.info("API: GET /api/admin/metrics")
+    try:
+        stats = await adb.get_cache_stats()
+        stats['leaderboards'] = leaderboards.stats()
+        stats['outbox'] = await adb.get_outbox_stats()
+        return web.json_response({'success': True, 'data': stats})
+    except Exception as e:
+        logger.error(f"Error getting metrics: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+
+# Задания генерации табелей: job_id -> состояние (status, done, total, ...)
+_report_jobs = {}
+# Ссылки на выполняющиеся задачи, чтобы их не собрал сборщик мусора
+_report_tasks = set()
+
+
+async def _run_report_job(job: dict):
+    """Генерация табелей в фоне; ход работы записывается в job"""
+    def progress(done: int, total: int):
+        job.update(done=done, total=total)
+    
+    loop = asyncio.get_running_loop()
+    try:
+        summary = await loop.run_in_executor(
+            None, generate_report_cards, job['start'], job['end'], Path(job['out_dir']), REPORT_WORKERS, progress
+        )
+        job.update(status='done', students=summary['students'])
+    except Exception as e:
+        logger.error(f"Error generating report cards: {e}")
+        job.update(status='failed', error=str(e))
+
+
+async def api_start_report_cards(request):
+    """Запуск генерации табелей: {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}"""
+    logger.info("API: POST /api/admin/reports/cards")
+    try:
+        data = await request.json()
+        start, end = data['start'], data['end']
+        datetime.strptime(start, '%Y-%m-%d')
+        datetime.strptime(end, '%Y-%m-%d')
+    except (KeyError, ValueError, TypeError) as e:
+        return web.json_response({'success': False, 'error': f'start and end dates are required: {e}'}, status=400)
+    
+    if any(job['status'] == 'running' for job in _report_jobs.values()):
+        return web.json_response({'success': False, 'error': 'Report generation is already running'}, status=409)
+    
+    job_id = secrets.token_hex(4)
+    job = {
+        'job_id': job_id, 'status': 'running', 'start': start, 'end': end,
+        'out_dir': str(REPORTS_DIR / f'{start}_{end}'), 'done': 0, 'total': None,
+    }
+    _report_jobs[job_id] = job
+    task = asyncio.create_task(_run_report_job(job))
+    _report_tasks.add(task)
+    task.add_done_callback(_report_tasks.discard)
+    return web.json_response({'success': True, 'data': job}, status=202)
+
+
+async def api_get_report_cards_job(request):
+    """Состояние задания генерации табелей"""
+    job = _report_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({'success': False, 'error': 'Job not found'}, status=404)
+    return web.json_response({'success': True, 'data': job})
+
+
+async def api_export_grades(request):
+    """Выгрузка журнала: ?format=csv|arrow и необязательные class_name, start, end (YYYY-MM-DD)
+
+    Файл передаётся частями по мере чтения пачек из базы.
+    """
+    fmt = request.query.get('format', 'csv')
+    class_name = request.query.get('class_name')
+    start, end = request.query.get('start'), request.query.get('end')
+    logger.info(f"API: GET /api/admin/export/grades format={fmt} class_name={class_name} start={start} end={end}")
+    if fmt not in FORMATS:
+        return web.json_response({'success': False, 'error': f'format must be one of {tuple(FORMATS)}'}, status=400)
+    try:
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': f'Invalid date: {e}'}, status=400)
+    
+    content_type, extension = FORMATS[fmt]
+    response = web.StreamResponse(headers={
+        'Content-Type': content_type,
+        'Content-Disposition': f'attachment; filename="grades.{extension}"',
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    chunks = export_chunks(adb.database.iter_grades(class_name, start, end), fmt)
+    try:
+        while True:
+            # Каждая пачка читается в потоке-читателе; генератор держит своё подключение
+            chunk = await adb.run(next, chunks, None)
+            if chunk is None:
+                break
+            await response.write(chunk)
+        await response.write_eof()
+    except Exception as e:
+        logger.error(f"Error exporting grades: {e}")
+    finally:
+        await adb.run(chunks.close)
+    return response
+
+
+async def api_get_grade_report(request):
+    """Отчёт по оценкам школы: ?group_by=student|class|subject|teacher|week
+    и необязательные фильтры class_name, subject_id, days"""
+    group_by = request.query.get('group_by', 'class')
+    logger.info(f"API: GET /api/admin/reports/grades group_by={group_by}")
+    try:
+        class_name = request.query.get('class_name')
+        subject_id = int(request.query['subject_id']) if request.query.get('subject_id') else None
+        days = int(request.query['days']) if request.query.get('days') else None
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': f'Invalid filter: {e}'}, status=400)
+    if group_by not in GROUP_BY:
+        return web.json_response({'success': False, 'error': f'group_by must be one of {GROUP_BY}'}, status=400)
+    
+    try:
+        report = await adb.run(grade_report, group_by, class_name, subject_id, days)
+        return web.json_response({'success': True, 'data': report})
+    except Exception as e:
+        logger.error(f"Error building grade report: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+
 async def api_delete_student(request):
     """Удаление ученика"""
     student_id = int(request.match_info['student_id'])
     logger.info(f"API: DELETE /api/students/{student_id}")
     try:
-        success = await asyncio.to_thread(db.delete_student, student_id)
+        success = await adb.delete_student(student_id)
         if success:
             return web.json_response({'success': True})
         else:
@@ -594,6 +876,10 @@ def create_webapp_server(host='0.0.0.0', port=8080):
         app.router.add_put('/api/grades/{grade_id}', api_update_grade),
         app.router.add_get('/api/homework', api_get_homework),
         app.router.add_get('/api/statistics', api_get_statistics),
+        app.router.add_post('/api/statistics/batch', api_get_statistics_batch),
+        app.router.add_get('/api/statistics/dynamics', api_get_statistics_dynamics),
+        app.router.add_get('/api/statistics/distribution', api_get_statistics_distribution),
+        app.router.add_get('/api/leaderboard', api_get_leaderboard),
         app.router.add_get('/api/parent/{parent_id}/students', api_get_parent_students),
         app.router.add_get('/api/user/{user_id}', api_get_user),
         app.router.add_post('/api/subjects', api_add_subject),
@@ -613,6 +899,11 @@ def create_webapp_server(host='0.0.0.0', port=8080):
         app.router.add_post('/api/admin/admins', api_make_admin),
         app.router.add_delete('/api/admin/admins/{user_id}', api_remove_admin),
         app.router.add_get('/api/admin/users', api_get_users),
+        app.router.add_get('/api/admin/metrics', api_get_metrics),
+        app.router.add_get('/api/admin/reports/grades', api_get_grade_report),
+        app.router.add_get('/api/admin/export/grades', api_export_grades),
+        app.router.add_post('/api/admin/reports/cards', api_start_report_cards),
+        app.router.add_get('/api/admin/reports/cards/{job_id}', api_get_report_cards_job),
     ]
     
     # Применяем CORS к API роутам